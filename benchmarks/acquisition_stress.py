@@ -0,0 +1,203 @@
+# Twitch detection under GUI load: in-process reader thread against the acquisition process
+#
+#   python3 benchmarks/acquisition_stress.py [--seconds 20] [--block-ms 30] [--max-added-ms 5]
+#
+# A child process streams synthetic 1kHz accelerometer data with a twitch every
+# 0.8-2.5s (benchmarks/dsp_detection.py) from a simulated ESP32 in 20ms sample
+# frames, so detection runs on the host as in raw mode. This process plays the GUI:
+# with load on, its main thread holds the GIL for --block-ms at a time (a sort,
+# standing in for a slow repaint or a pyttsx3 call) with 2ms gaps, and drains
+# events only in the gaps. Detection latency is from the simulator writing a sample
+# frame to detection being done with it (every frame, not only the few that end in
+# a twitch); "to GUI" is from a select action coming out of fusion to the main
+# thread having it. The first second is left out: detection loads numpy and its
+# filters on the first frame. Exits with status 1 when the load adds more than --max-added-ms
+# to the acquisition process's p99 detection latency or makes it miss twitches.
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["HOME"] = tempfile.mkdtemp()  # Refinement saves the calibration profile, keep it out of the real one
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from acquisition import AcquisitionClient
+from device import SENSOR_RULES, DevicePipeline
+from event_bus import EventBus
+from latency import now_ns
+from transport import PtyTransport
+
+WARMUP_FRAMES = 50
+
+CHILD = r"""
+import json, struct, sys, time
+sys.path.insert(0, SRC)
+sys.path.insert(0, BENCHMARKS)
+from dsp_detection import synthesize
+from esp32_sim import Esp32Simulator
+from protocol import SAMPLES
+samples, onsets = synthesize(SECONDS)
+sim = Esp32Simulator(binary=True)
+print(sim.port_name, flush=True)
+sys.stdin.readline()
+sent = {}
+start = time.perf_counter()
+for index, frame in enumerate(range(0, len(samples) - 19, 20)):
+    time.sleep(max(0.0, start + (index + 1) * 0.02 - time.perf_counter()))
+    seq = sim.seq & 0xFFFF
+    sent[seq] = sim.send(SAMPLES, struct.pack("<H", 1000) + samples[frame:frame + 20].tobytes(), "")
+time.sleep(0.5)
+print(json.dumps({"sent": sent, "onsets": len(onsets)}), flush=True)
+sys.stdin.readline()
+sim.close()
+"""
+
+
+def start_device(seconds):
+    script = (f"SRC = {SRC!r}\nBENCHMARKS = {os.path.dirname(os.path.abspath(__file__))!r}\n"
+              f"SECONDS = {seconds}\n" + CHILD)
+    child = subprocess.Popen([sys.executable, "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    return child, child.stdout.readline().strip()
+
+
+def calibrate_block(block_ms):
+    """A list whose sort holds the GIL for about block_ms in one C call, as a slow repaint does"""
+    values = [random.random() for _ in range(100_000)]
+    started = time.perf_counter()
+    sorted(values)
+    per_item = (time.perf_counter() - started) / len(values)
+    return [random.random() for _ in range(max(1, int(block_ms / 1000 / per_item)))]
+
+
+class ThreadAcquisition:
+    """The SerialThread arrangement: a reader thread in this process publishing to a bus"""
+
+    def __init__(self, port):
+        self.transport = PtyTransport(port)
+        self.device = DevicePipeline(self.transport.write, SENSOR_RULES,
+                                     on_samples=lambda event, rx_ns: self.bus.publish((event, now_ns())))
+        self.device.load_profile()
+        self.bus = EventBus()
+        self.events = self.bus.subscribe(maxlen=100_000)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            chunk = self.transport.read_chunk()
+            if chunk:
+                rx_ns = now_ns()
+                for event in self.device.feed(chunk, rx_ns):
+                    self.bus.publish((event, now_ns()))
+
+    def drain(self):
+        return self.events.drain()
+
+    def close(self):
+        self.stopped.set()
+        self.transport.cancel()
+        self.thread.join()
+        self.transport.close()
+
+
+class ProcessAcquisition:
+    """main.AcquisitionThread without Qt: the acquisition process and a thread on its doorbell"""
+
+    def __init__(self, port):
+        self.client = AcquisitionClient(f"pty://{port}", rules=SENSOR_RULES)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+        while self.client.process is None:
+            time.sleep(0.01)
+        time.sleep(1.0)  # The process imports numpy and opens the pty
+
+    def run(self):
+        while self.client.wait():
+            pass
+
+    def drain(self):
+        # The ring itself, client.drain() keeps sample frames from the GUI
+        while True:
+            record = self.client.ring.get()
+            if record is None:
+                return
+            yield record[0], record[3]
+
+    def close(self):
+        self.client.stop()
+        self.thread.join()
+        self.client.close()
+
+
+def run(acquisition_type, seconds, block):
+    child, port = start_device(seconds)
+    acquisition = acquisition_type(port)
+    frames, twitches, to_gui = {}, 0, []
+
+    def drain():
+        nonlocal twitches
+        for event, published_ns in acquisition.drain():
+            if event.kind == "samples":
+                frames[event.seq] = published_ns
+            elif event.kind == "select":
+                twitches += 1
+                to_gui.append((now_ns() - published_ns) / 1e6)
+
+    child.stdin.write("go\n")
+    child.stdin.flush()
+    deadline = time.perf_counter() + seconds + 0.5
+    while time.perf_counter() < deadline:
+        if block is not None:
+            sorted(block)
+        time.sleep(0.002)
+        drain()
+    result = json.loads(child.stdout.readline())
+    drain()
+    acquisition.close()
+    child.stdin.write("done\n")
+    child.stdin.close()
+    child.wait()
+    sent = {int(seq): sent_ns for seq, sent_ns in result["sent"].items()}
+    latencies = sorted((done_ns - sent[seq]) / 1e6 for seq, done_ns in frames.items()
+                       if seq in sent and seq >= WARMUP_FRAMES)
+    return result["onsets"], twitches, latencies, sorted(to_gui)
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--block-ms", type=float, default=30.0, help="GIL held per simulated GUI block")
+    parser.add_argument("--max-added-ms", type=float, default=5.0,
+                        help="allowed p99 detection latency added by the load in the acquisition process")
+    args = parser.parse_args()
+
+    block = calibrate_block(args.block_ms)
+    print(f"{'acquisition':<12} {'GUI load':<9} {'twitches':>8} {'missed':>6} {'frames':>6} {'p50':>8} {'p99':>8}"
+          f" {'max':>8} {'to GUI p99':>11}")
+    results = {}
+    for label, acquisition_type in (("thread", ThreadAcquisition), ("process", ProcessAcquisition)):
+        for load in ("idle", f"{args.block_ms:g}ms"):
+            onsets, twitches, latencies, to_gui = run(acquisition_type, args.seconds,
+                                                      None if load == "idle" else block)
+            results[label, load] = twitches, latencies
+            print(f"{label:<12} {load:<9} {onsets:>8} {max(0, onsets - twitches):>6} {len(latencies):>6} "
+                  f"{percentile(latencies, 50):6.2f}ms {percentile(latencies, 99):6.2f}ms {latencies[-1]:6.2f}ms "
+                  f"{percentile(to_gui, 99):9.2f}ms")
+
+    (idle_twitches, idle), (twitches, loaded) = results["process", "idle"], results["process", f"{args.block_ms:g}ms"]
+    added = percentile(loaded, 99) - percentile(idle, 99)
+    print(f"\nGUI load adds {added:.2f}ms to the acquisition process's p99 detection latency "
+          f"(limit {args.max_added_ms}ms)")
+    sys.exit(0 if added <= args.max_added_ms and twitches >= idle_twitches else 1)
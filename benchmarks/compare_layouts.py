@@ -0,0 +1,44 @@
+# Compare scanning layouts on a text corpus before deploying them
+#
+#   python3 benchmarks/compare_layouts.py [corpus] [dwell ms] [reaction ms]
+#
+# The bigram-optimised layout is trained on the first half of the corpus and every
+# layout is scored on the second half.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layouts import (ALPHABETICAL_LAYOUT, build_frequency_layout, optimize_layout, build_huffman_tree,
+                     bigrams_from_text, simulate_grid, simulate_huffman)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_corpus.txt")
+
+
+def show(name, report):
+    print(f"{name:<34} {report['ticks_per_char']:>6.2f} {report['twitches_per_char']:>9.2f} "
+          f"{report['ms_per_char']:>8.0f} {report['chars_per_min']:>9.2f}")
+
+
+if __name__ == "__main__":
+    corpus = open(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS).read()
+    dwell_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    reaction_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 400
+    train, test = corpus[:len(corpus) // 2], corpus[len(corpus) // 2:]
+
+    frequency = build_frequency_layout()
+    optimized = optimize_layout(frequency, bigrams_from_text(train))
+
+    print(f"{'layout':<34} {'ticks':>6} {'twitches':>9} {'ms/char':>8} {'chars/min':>9}")
+    show("alphabetical (current)", simulate_grid(ALPHABETICAL_LAYOUT, test, dwell_ms, reaction_ms))
+    show("frequency, scan resumes at row", simulate_grid(frequency, test, dwell_ms, reaction_ms))
+    show("frequency, scan restarts at top", simulate_grid(frequency, test, dwell_ms, reaction_ms, resume_row=False))
+    show("frequency + bigram swaps", simulate_grid(optimized, test, dwell_ms, reaction_ms))
+    for branching in (2, 3, 4, 6):
+        show(f"huffman {branching}-ary", simulate_huffman(build_huffman_tree(branching=branching), test,
+                                                          dwell_ms, reaction_ms))
+
+    print("\nfrequency + bigram swaps layout:")
+    for row in optimized:
+        print("  " + " ".join(f"{key:>5}" for key in row))
@@ -0,0 +1,96 @@
+# Throughput, accuracy and latency of the host-side twitch detector on synthetic ADXL345 data
+#
+#   python3 benchmarks/dsp_detection.py [seconds] [block size]
+#
+# The firmware baseline is the current interface.ino behaviour: one magnitude
+# reading every 100ms compared against (rest + twitch) / 2.
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from dsp import TwitchDetector, COUNTS_PER_G
+
+RATE = 1000
+
+
+def synthesize(seconds, seed=0):
+    """Rest noise, slow posture drift and damped twitch bursts, as int16 counts"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    xyz = np.zeros((n, 3))
+    xyz[:, 2] = 1.0 + 0.05 * np.sin(2 * np.pi * 0.05 * t)  # Gravity plus slow drift
+    xyz[:, 0] = 0.03 * np.sin(2 * np.pi * 0.1 * t)
+    xyz += rng.normal(0, 0.008, size=xyz.shape)
+
+    onsets = []
+    pos = RATE
+    while pos < n - RATE:
+        onsets.append(pos)
+        length = int(0.06 * RATE)
+        burst_t = np.arange(length) / RATE
+        burst = rng.uniform(0.08, 0.2) * np.exp(-burst_t / 0.02) * np.sin(2 * np.pi * 40 * burst_t)
+        xyz[pos:pos + length, 2] += burst
+        xyz[pos:pos + length, 1] += 0.5 * burst
+        pos += int(rng.uniform(0.8, 2.5) * RATE)
+    return np.round(xyz * COUNTS_PER_G).astype(np.int16), np.array(onsets)
+
+
+def score(detections, onsets, tolerance=int(0.15 * RATE)):
+    detections = np.array(detections, dtype=np.int64)
+    latencies = []
+    hits = 0
+    matched = np.zeros(len(detections), dtype=bool)
+    for onset in onsets:
+        candidates = np.flatnonzero((detections >= onset) & (detections <= onset + tolerance) & ~matched)
+        if len(candidates):
+            matched[candidates[0]] = True
+            hits += 1
+            latencies.append((detections[candidates[0]] - onset) * 1000 / RATE)
+    return hits, int((~matched).sum()), latencies
+
+
+def firmware_baseline(samples, onsets):
+    g = samples / COUNTS_PER_G
+    magnitude = np.sqrt((g ** 2).sum(axis=1))
+    rest = magnitude[:RATE // 2].mean()
+    twitch = np.mean([magnitude[o:o + 60].max() for o in onsets[:5]])
+    threshold = (rest + twitch) / 2
+    detections, active = [], False
+    for i in range(0, len(magnitude), 100):
+        if magnitude[i] > threshold:
+            if not active:
+                detections.append(i)
+            active = True
+        else:
+            active = False
+    return detections
+
+
+def report(name, detections, onsets):
+    hits, false_positives, latencies = score(detections, onsets)
+    latency = f"latency mean {np.mean(latencies):.1f}ms max {np.max(latencies):.1f}ms" if latencies else "no hits"
+    print(f"{name:<18} hits {hits}/{len(onsets)}  false positives {false_positives}  {latency}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 120
+    block = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    samples, onsets = synthesize(seconds)
+
+    detector = TwitchDetector(sample_rate=RATE)
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(samples), block):
+        detections += detector.process(samples[i:i + block])
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(samples)} samples in blocks of {block}: {len(samples) / elapsed:,.0f} samples/s "
+          f"({len(samples) / elapsed / RATE:.0f}x real time at {RATE} Hz)")
+    report("host DSP", detections, onsets)
+    report("firmware 100ms", firmware_baseline(samples, onsets), onsets)
@@ -0,0 +1,88 @@
+# Per-tick highlight cost against grid size, full restyle vs HighlightRenderer
+#
+#   QT_QPA_PLATFORM=offscreen python3 benchmarks/highlight_render.py [ticks]
+#
+# Both run under the Fusion style HighlightRenderer puts on its buttons, so only
+# the way the highlight is applied differs.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from PyQt5.QtWidgets import QApplication, QGridLayout, QPushButton, QStyleFactory, QWidget
+from highlight import HighlightRenderer
+
+GRID_SIZES = [(5, 11), (8, 14), (12, 20), (20, 30)]
+ROW_STYLE = "background-color: yellow;"
+KEY_STYLE = "background-color: orange;"
+
+
+def build_grid(rows, cols):
+    window = QWidget()
+    layout = QGridLayout(window)
+    buttons = []
+    for row_idx in range(rows):
+        button_row = []
+        for col_idx in range(cols):
+            button = QPushButton(f"{row_idx},{col_idx}")
+            layout.addWidget(button, row_idx, col_idx)
+            button_row.append(button)
+        buttons.append(button_row)
+    window.show()
+    return window, buttons
+
+
+def scan_states(rows, cols, ticks):
+    # Alternate a full row scan with a column scan inside the middle row
+    states = []
+    while len(states) < ticks:
+        states += [(r, 0, True) for r in range(rows)]
+        states += [(rows // 2, c, False) for c in range(cols)]
+    return states[:ticks]
+
+
+def full_restyle(buttons, row, col, selecting_row):
+    # The old update_highlight
+    for row_idx, button_row in enumerate(buttons):
+        for col_idx, button in enumerate(button_row):
+            if selecting_row and row_idx == row:
+                button.setStyleSheet(ROW_STYLE)
+            elif not selecting_row and row_idx == row and col_idx == col:
+                button.setStyleSheet(KEY_STYLE)
+            else:
+                button.setStyleSheet("")
+
+
+def time_ticks(app, render, states):
+    """Return (restyle, repaint) cost per tick in microseconds"""
+    restyle = repaint = 0.0
+    for row, col, selecting_row in states:
+        start = time.perf_counter()
+        render(row, col, selecting_row)
+        middle = time.perf_counter()
+        app.processEvents()
+        restyle += middle - start
+        repaint += time.perf_counter() - middle
+    return restyle / len(states) * 1e6, repaint / len(states) * 1e6
+
+
+if __name__ == "__main__":
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    app = QApplication(sys.argv)
+    app.setStyle(QStyleFactory.create("Fusion"))
+    print(f"{'grid':>8} {'full restyle':>14} {'full repaint':>14} {'full total':>12} {'incr. restyle':>14} "
+          f"{'incr. repaint':>14} {'incr. total':>12}  (us/tick)")
+    for rows, cols in GRID_SIZES:
+        window, buttons = build_grid(rows, cols)
+        states = scan_states(rows, cols, ticks)
+        full = time_ticks(app, lambda r, c, s: full_restyle(buttons, r, c, s), states)
+        window.close()
+        window, buttons = build_grid(rows, cols)
+        renderer = HighlightRenderer(buttons)
+        renderer.reset()
+        incremental = time_ticks(app, renderer.render, states)
+        window.close()
+        print(f"{rows:>3}x{cols:<4} {full[0]:>14.1f} {full[1]:>14.1f} {sum(full):>12.1f} {incremental[0]:>14.1f} "
+              f"{incremental[1]:>14.1f} {sum(incremental):>12.1f}")
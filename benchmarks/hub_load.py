@@ -0,0 +1,161 @@
+# Hub load test: CPU and twitch latency as the number of devices grows
+#
+#   python3 benchmarks/hub_load.py [--devices 1,8,32,64] [--seconds 5] [--rate 2] [--raw]
+#
+# A child process runs one Esp32Simulator per device (a pty each) and sends each
+# device --rate twitches per second, jittered but never within the 250ms fusion
+# refractory period; --raw adds a 1kHz sample stream per device in 20ms frames,
+# so twitch detection runs too. This process serves every pty either from one Hub loop or, for comparison, from one
+# reader thread per device like SerialThread. Latency is from the simulator's write
+# to the twitch being handled (both on the same monotonic clock). CPU is this
+# process only, from the moment every device is connected.
+
+import argparse
+import heapq
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from device import SENSOR_RULES, DevicePipeline
+from hub import Hub
+from latency import LatencyHistogram, now_ns
+from transport import PtyTransport
+
+CHILD = r"""
+import json, random, struct, sys, time
+sys.path.insert(0, SRC)
+from esp32_sim import Esp32Simulator
+from protocol import SAMPLES
+sims = [Esp32Simulator(binary=True) for _ in range(DEVICES)]
+print(json.dumps([sim.port_name for sim in sims]), flush=True)
+sys.stdin.readline()
+rng = random.Random(0)
+noise = [struct.pack("<H", 1000) + b"".join(struct.pack("<hhh", rng.randint(-3, 3), rng.randint(-3, 3),
+                                                        256 + rng.randint(-3, 3)) for _ in range(20))
+         for _ in range(16)]
+start = time.perf_counter()
+due = [(start + rng.uniform(0, 1 / RATE), "twitch", index) for index in range(DEVICES)]
+if RAW:
+    due += [(start + rng.uniform(0, 0.02), "samples", index) for index in range(DEVICES)]
+heapq.heapify(due)
+sent = [{} for _ in range(DEVICES)]
+while due[0][0] < start + SECONDS:
+    when, kind, index = heapq.heappop(due)
+    time.sleep(max(0.0, when - time.perf_counter()))
+    sim = sims[index]
+    if kind == "twitch":
+        seq = sim.seq & 0xFFFF
+        sent[index][seq] = sim.twitch()
+        heapq.heappush(due, (when + rng.uniform(0.6, 1.4) / RATE, kind, index))
+    else:
+        sim.send(SAMPLES, rng.choice(noise), "")
+        heapq.heappush(due, (when + 0.02, kind, index))
+time.sleep(0.5)
+print(json.dumps(sent), flush=True)
+sys.stdin.readline()
+"""
+
+
+def start_devices(devices, seconds, rate, raw):
+    script = (f"import heapq\nSRC = {SRC!r}\nDEVICES = {devices}\nSECONDS = {seconds}\nRATE = {rate}\n"
+              f"RAW = {raw}\n" + CHILD)
+    child = subprocess.Popen([sys.executable, "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    return child, json.loads(child.stdout.readline())
+
+
+def serve_hub(ports, go, seconds):
+    handled = {}  # (device, seq) -> ns
+    started = []
+
+    def connected(session, state, detail):
+        if state == "connected" and all(s.transport is not None for s in hub.sessions.values()):
+            started.append((time.process_time(), time.perf_counter()))
+            # Timer lateness without the ticks held up by profile loading at startup
+            hub.call_later(0.5, setattr, hub, "late", LatencyHistogram())
+            go()
+
+    hub = Hub(on_status=connected)
+    for index, port in enumerate(ports):
+        session = hub.add_device(str(index), f"pty://{port}")
+        original = session.handle
+
+        def handle(event, rx_ns, index=index, original=original):
+            if event.kind == "select":
+                handled[(index, event.seq)] = now_ns()
+            original(event, rx_ns)
+        session.handle = handle
+    hub.call_later(seconds + 1.5, hub.stop)
+    hub.run()
+    cpu = (time.process_time() - started[0][0]) / (time.perf_counter() - started[0][1])
+    hub.close()
+    return handled, cpu, hub.late
+
+
+def serve_threads(ports, go, seconds):
+    handled = {}
+    stopped = threading.Event()
+
+    def reader(index, port):
+        transport = PtyTransport(port)
+        device = DevicePipeline(transport.write, SENSOR_RULES)
+        while not stopped.is_set():
+            chunk = transport.read_chunk()
+            if chunk:
+                rx_ns = now_ns()
+                for event in device.feed(chunk, rx_ns):
+                    if event.kind == "select":
+                        handled[(index, event.seq)] = now_ns()
+        transport.close()
+
+    threads = [threading.Thread(target=reader, args=(index, port)) for index, port in enumerate(ports)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)  # Every pty opened
+    cpu = time.process_time()
+    go()
+    time.sleep(seconds + 1.0)
+    cpu = (time.process_time() - cpu) / (seconds + 1.0)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+    return handled, cpu, None
+
+
+def run(serve, devices, seconds, rate, raw):
+    child, ports = start_devices(devices, seconds, rate, raw)
+    handled, cpu, late = serve(ports, lambda: (child.stdin.write("go\n"), child.stdin.flush()), seconds)
+    sent = json.loads(child.stdout.readline())
+    child.stdin.write("done\n")
+    child.stdin.close()
+    child.wait()
+    latencies = sorted((handled[(index, int(seq))] - sent_ns) / 1e6 for index, device in enumerate(sent)
+                       for seq, sent_ns in device.items() if (index, int(seq)) in handled)
+    total = sum(len(device) for device in sent)
+    return total, len(latencies), latencies, cpu, late
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", default="1,8,32,64")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=float, default=2.0, help="twitches per second per device")
+    parser.add_argument("--raw", action="store_true", help="also stream 1kHz samples from every device")
+    args = parser.parse_args()
+
+    print(f"{'devices':>7} {'mode':<8} {'twitches':>9} {'lost':>5} {'CPU':>6} {'p50':>8} {'p99':>8} {'max':>8}"
+          f" {'timer p99':>10}")
+    for devices in [int(count) for count in args.devices.split(",")]:
+        for label, serve in (("hub", serve_hub), ("threads", serve_threads)):
+            total, got, latencies, cpu, late = run(serve, devices, args.seconds, args.rate, args.raw)
+            timer = f"{late.percentile(99):8.2f}ms" if late is not None else f"{'-':>10}"
+            print(f"{devices:>7} {label:<8} {total:>9} {total - got:>5} {cpu:>6.1%} "
+                  f"{statistics.median(latencies):6.2f}ms {latencies[int(len(latencies) * 0.99)]:6.2f}ms "
+                  f"{latencies[-1]:6.2f}ms {timer}")
@@ -0,0 +1,76 @@
+# Time the GUI thread spends injecting keys: synchronous backend calls vs the batching worker
+#
+#   python3 benchmarks/injection_latency.py [keys] [backend call ms] [ms between keys] [backend]
+#
+# The default "recording" backend sleeps for the given time per call, which stands in for
+# pyautogui's 0.1s PAUSE or an X11 round trip. Pass "pyautogui" or "xdotool" as the
+# backend to type into the focused window for real.
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from injection import InjectionWorker, RecordingBackend, create_backend, keys_for
+
+WORDS = ["HELLO ", "PLEASE ", "THANK ", "WATER ", "TODAY "]
+
+
+def session(count, seed=0):
+    """Keys as the GUI would hand them over: mostly single keys, now and then an accepted word"""
+    rng = random.Random(seed)
+    items = []
+    while len(items) < count:
+        if rng.random() < 0.2:
+            items.append(rng.choice(WORDS))
+        else:
+            items.append(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ "))
+    return items
+
+
+def run_sync(backend, items, interval_ms):
+    blocked = []
+    for text in items:
+        started = time.perf_counter_ns()
+        backend.inject(keys_for(text))
+        blocked.append(time.perf_counter_ns() - started)
+        time.sleep(interval_ms / 1000)
+    return np.array(blocked)
+
+
+def run_async(backend, items, interval_ms):
+    worker = InjectionWorker(backend)
+    worker.start()
+    blocked = []
+    try:
+        for text in items:
+            started = time.perf_counter_ns()
+            worker.write(text)
+            blocked.append(time.perf_counter_ns() - started)
+            time.sleep(interval_ms / 1000)
+    finally:
+        worker.stop()
+    return np.array(blocked), worker.batches
+
+
+def show(name, blocked):
+    print(f"{name:<8} GUI thread blocked per item: mean {blocked.mean() / 1e6:8.3f} ms, "
+          f"p99 {np.percentile(blocked, 99) / 1e6:8.3f} ms, total {blocked.sum() / 1e9:6.2f} s")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    call_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    interval_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    name = sys.argv[4] if len(sys.argv) > 4 else "recording"
+    backend = (lambda: RecordingBackend(call_ms)) if name == "recording" else (lambda: create_backend(name))
+    items = session(count)
+
+    show("sync", run_sync(backend(), items, interval_ms))
+    blocked, batches = run_async(backend(), items, interval_ms)
+    show("worker", blocked)
+    print(f"worker sent {sum(len(keys_for(text)) for text in items)} keys in {batches} batches")
@@ -0,0 +1,135 @@
+# Session journal: append cost on the scan thread, group commit, crash recovery and
+# restart time
+#
+#   python3 benchmarks/journal_recovery.py [--crashes N] [--events N]
+#
+# Crash runs start a child that journals a seeded event stream and prints every
+# committed seq, SIGKILL it at a random moment and tear the last record. Recovery
+# must keep every committed event and rebuild exactly the state of that prefix of
+# the stream. Exits with status 1 otherwise.
+
+import argparse
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from journal import Journal, SessionState, recover, segments
+
+KEYS = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ.") + ['␣', '␣', '⌫', '⏎']
+
+
+def event_stream(seed, count):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            events.append(("key", rng.choice(KEYS)))
+        elif roll < 0.55:
+            events.append(("text", rng.choice(["HELLO ", "THANK YOU ", "WATER "])))
+        elif roll < 0.57:
+            events.append(("power", rng.random() < 0.5))
+        elif roll < 0.8:
+            events.append(("twitch", "select"))
+        else:
+            events.append(("select", rng.choice([None, "A", "␣"])))
+    return events
+
+
+def replay(events):
+    state = SessionState()
+    for kind, data in events:
+        state.apply(kind, data)
+    return state.to_dict()
+
+
+CHILD = r"""
+import sys, time
+sys.path.insert(0, SRC)
+sys.path.insert(0, BENCH)
+from journal import Journal
+from journal_recovery import event_stream
+journal = Journal(DIRECTORY, snapshot_every=200, on_commit=lambda seq: print(seq, flush=True))
+for kind, data in event_stream(SEED, COUNT):
+    journal.append(kind, data)
+    time.sleep(0.0002)
+journal.close()
+"""
+
+
+def crash_run(seed, count):
+    directory = tempfile.mkdtemp()
+    code = (f"SRC = {SRC!r}\nBENCH = {os.path.dirname(os.path.abspath(__file__))!r}\n"
+            f"DIRECTORY = {directory!r}\nSEED = {seed}\nCOUNT = {count}\n" + CHILD)
+    child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    time.sleep(random.Random(seed).uniform(0.3, 0.8))
+    child.send_signal(signal.SIGKILL)
+    output, _ = child.communicate()
+    committed = max((int(line) for line in output.split()), default=0)
+    with open(segments(directory)[-1], "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x12\x34")  # Half a record header, as a torn write leaves it
+    started = time.perf_counter()
+    state, seq, _, _, _ = recover(directory)
+    elapsed = time.perf_counter() - started
+    ok = seq >= committed and state.to_dict() == replay(event_stream(seed, count)[:seq])
+    journal = Journal(directory)  # Reopening truncates the torn tail and carries on
+    journal.append("key", "A")
+    journal.close()
+    ok = ok and recover(directory)[1] == seq + 1
+    return ok, committed, seq, elapsed
+
+
+def restart_time(count, snapshot_every):
+    directory = tempfile.mkdtemp()
+    journal = Journal(directory, snapshot_every=snapshot_every)
+    for kind, data in event_stream(1, count):
+        journal.append(kind, data)
+    journal.close()
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        recover(directory)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--crashes", type=int, default=5)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+    failures = 0
+
+    # Append cost on the calling thread while the writer fsyncs behind it
+    directory = tempfile.mkdtemp()
+    journal = Journal(directory)
+    costs = []
+    for kind, data in event_stream(0, args.events):
+        started = time.perf_counter_ns()
+        journal.append(kind, data)
+        costs.append(time.perf_counter_ns() - started)
+    journal.flush()
+    journal.close()
+    costs.sort()
+    print(f"append: median {costs[len(costs) // 2] / 1000:.1f} µs, p99 {costs[int(len(costs) * 0.99)] / 1000:.1f} µs, "
+          f"max {costs[-1] / 1000:.0f} µs on the caller")
+    print(f"group commit: {args.events} events in {journal.commits} fsyncs "
+          f"({args.events / journal.commits:.0f} events per fsync)")
+
+    for seed in range(args.crashes):
+        ok, committed, seq, elapsed = crash_run(seed, 5000)
+        failures += not ok
+        print(f"crash {seed}: {committed} committed before SIGKILL, {seq} recovered in {elapsed * 1000:.1f} ms "
+              f"{'ok' if ok else 'FAILED'}")
+
+    for snapshot_every, label in ((1000, "snapshots every 1000"), (10 ** 9, "no snapshots")):
+        print(f"restart after {args.events} events, {label}: {restart_time(args.events, snapshot_every) * 1000:.1f} ms")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,106 @@
+# Twitch-to-keystroke latency through the host pipeline, driven by the pty ESP32 simulator
+#
+#   python3 benchmarks/latency_pipeline.py [twitches] [csv path] [--binary] [--call-ms MS]
+#
+# The path SerialThread runs: a ReconnectingTransport on the simulator's pty feeds a
+# DevicePipeline (decoding, clock sync, fusion) on a reader thread, and a queue
+# stands in for the EventBus and the queued Qt signal. The consumer plays the GUI:
+# a ScanEngine decides what each select twitch picked, and a key goes to an
+# InjectionWorker whose RecordingBackend takes --call-ms per call, stamping
+# "inject" once the backend typed it. Row selections end at "decision" and are
+# counted in "no_key", apart from the keystrokes in "total". Twitches come
+# FUSION_INTERVAL_S apart, outside the fusion's refractory period.
+
+import argparse
+import os
+import queue
+import sys
+import threading
+from collections import deque
+
+from PyQt5.QtCore import Qt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from device import SENSOR_RULES, DevicePipeline
+from esp32_sim import Esp32Simulator
+from injection import InjectionWorker, RecordingBackend
+from latency import LatencyTracker, now_ns
+from layouts import ALPHABETICAL_LAYOUT
+from scan_engine import ScanEngine
+from transport import ReconnectingTransport
+
+FUSION_INTERVAL_S = 0.3  # SensorFusion drops a twitch within 250ms of the last one
+
+
+def read_loop(link, device, events):
+    while not link.cancelled.is_set():
+        chunk = link.read_chunk()
+        rx_ns = now_ns()
+        for event in device.feed(chunk, rx_ns) if chunk else ():
+            events.put((event, rx_ns))
+
+
+def run(count, seed=0, binary=False, call_ms=0.0):
+    sim = Esp32Simulator(binary=binary)
+    link = ReconnectingTransport(f"pty://{sim.port_name}")
+    device = DevicePipeline(link.write, SENSOR_RULES)
+    link.on_status = lambda state, url: device.connected() if state == "connected" else None
+    engine = ScanEngine(ALPHABETICAL_LAYOUT[1:])  # Letter rows only, every key selection types a letter
+    worker = InjectionWorker(RecordingBackend(call_ms))
+    injected = queue.Queue()
+    worker.injected.connect(injected.put, Qt.DirectConnection)  # No event loop here, finished below
+    events = queue.Queue()
+    sent_times = deque()
+    tracker = LatencyTracker()
+
+    worker.start()
+    thread = threading.Thread(target=read_loop, args=(link, device, events))
+    thread.start()
+    sim.play(count, interval=FUSION_INTERVAL_S, jitter=0.02, seed=seed, on_sent=sent_times.append)
+
+    handled = 0
+    typed = 0
+    try:
+        while handled < count:
+            event, rx_ns = events.get(timeout=5)
+            if event.kind != "select":
+                continue
+            tracker.begin(rx_ns, sent_ns=sent_times.popleft())
+            key = engine.confirm()
+            tracker.mark("decision")
+            if key is None:
+                tracker.finish()
+            else:
+                worker.write(key, tracker.detach())
+                typed += 1
+            handled += 1
+    finally:
+        worker.stop()  # Types whatever is still queued first
+        link.cancel()
+        thread.join()
+        link.close()
+        sim.close()
+    while typed:
+        for record in injected.get(timeout=5):
+            tracker.finish(record)
+            typed -= 1
+    return tracker, device.decoder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("twitches", nargs="?", type=int, default=100)
+    parser.add_argument("csv", nargs="?", help="write every record and the histograms here")
+    parser.add_argument("--binary", action="store_true", help="binary frames instead of text lines")
+    parser.add_argument("--call-ms", type=float, default=0.0, help="time the injection backend takes per call")
+    args = parser.parse_args()
+
+    tracker, decoder = run(args.twitches, binary=args.binary, call_ms=args.call_ms)
+    print(tracker.summary())
+    print(f"  decoder: {decoder.stats()}")
+    for stage, histogram in tracker.histograms.items():
+        print(f"  {stage:<10} p50={histogram.percentile(50):.3f}ms p95={histogram.percentile(95):.3f}ms "
+              f"max={histogram.max_ms:.3f}ms")
+    if args.csv:
+        tracker.dump(args.csv)
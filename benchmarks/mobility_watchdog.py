@@ -0,0 +1,340 @@
+# Wheelchair control: worst-case command latency and watchdog reaction, with and without GUI load
+#
+#   python3 benchmarks/mobility_watchdog.py [--repeats 20] [--block-ms 30] [--max-command-ms 20] [--margin-ms 20]
+#
+# Child processes run a simulated ESP32 sending heartbeats (src/esp32_sim.py) and a
+# simulated drive controller (src/drive_sim.py) that stamps every drive frame as it
+# arrives. This process plays the GUI, with load on its main thread holds the GIL
+# for --block-ms at a time with 2ms gaps and issues drive commands in the gaps. The
+# device is read once on a thread of this process (ACQUISITION = "thread") and once
+# in the acquisition process; either way the control loop runs in the mobility
+# process they start. Measured on the drive controller's side:
+#   command    drive() / stop from the GUI to the first frame with the new motion
+#   back       a back twitch leaving the device to the stop frame
+#   watchdog   stop frame after the device's last heartbeat, beyond HEARTBEAT_TIMEOUT_S
+#   deadman    stop frame after an unrenewed drive(), beyond HOLD_S
+#   gap        longest time between two drive frames as sent (the drive controller stops
+#              after MOTOR_TIMEOUT_S without one, "timeouts" counts how often it had to)
+# Select twitches sent meanwhile must keep a motion going past HOLD_S. "timer" is how
+# late a bare 50Hz sleep loop wakes up on this machine, which every tick pays too.
+# Exits with status 1 when, under load, a command takes longer than --max-command-ms,
+# a frame gap is over half the drive controller's timeout, the drive controller timed
+# out or renewed motion stopped; and when, with the acquisition process, a back stop
+# takes longer than --max-command-ms or a watchdog or deadman stop comes more than
+# one control period plus --margin-ms late.
+
+import argparse
+import bisect
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["HOME"] = tempfile.mkdtemp()  # The acquisition process loads the calibration profile
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from acquisition import AcquisitionClient
+from device import SENSOR_RULES, DevicePipeline
+from drive_sim import MOTOR_TIMEOUT_S
+from latency import now_ns
+from mobility import CONTROL_HZ, HEARTBEAT_TIMEOUT_S, HOLD_S, MobilityClient
+from transport import PtyTransport
+
+RULES = SENSOR_RULES + [("back", {"ir": 1.0})]  # The back stop comes from the IR sensor
+
+CHILD = r"""
+import json, sys
+sys.path.insert(0, SRC)
+from esp32_sim import Esp32Simulator
+from protocol import SENSOR_IR
+sim = Esp32Simulator(binary=True)
+sim.power(True)
+sim.heartbeats()
+print(sim.port_name, flush=True)
+for line in sys.stdin:
+    command = line.strip()
+    if command == "select":
+        print(sim.twitch(), flush=True)
+    elif command == "back":
+        print(sim.twitch(sensor=SENSOR_IR), flush=True)
+    elif command == "silence":
+        print(sim.stop_heartbeats(), flush=True)
+    elif command == "beat":
+        sim.heartbeats()
+        print(0, flush=True)
+    else:
+        break
+sim.close()
+"""
+
+# The drive controller is a microcontroller of its own: real-time priority where granted, and
+# no GIL shared with the ESP32's threads, so a frame is stamped when it arrives, not when
+# a Python thread next got to run
+DRIVE_CHILD = r"""
+import json, sys
+sys.path.insert(0, SRC)
+from drive_sim import DriveSimulator
+from mobility import raise_priority
+raise_priority()
+drive = DriveSimulator()
+print(drive.port_name, flush=True)
+sys.stdin.read()
+drive.close()
+print(json.dumps({"frames": drive.frames, "changes": drive.changes}), flush=True)
+"""
+
+
+class Devices:
+    """The child processes with the simulators"""
+
+    def __init__(self):
+        self.child = subprocess.Popen([sys.executable, "-c", f"SRC = {SRC!r}\n" + CHILD], stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, text=True)
+        self.drive_child = subprocess.Popen([sys.executable, "-c", f"SRC = {SRC!r}\n" + DRIVE_CHILD],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.port = self.child.stdout.readline().strip()
+        self.drive_port = self.drive_child.stdout.readline().strip()
+
+    def command(self, name):
+        """Send a twitch or change the heartbeats, returns the host time the device sent it"""
+        self.child.stdin.write(name + "\n")
+        self.child.stdin.flush()
+        return int(self.child.stdout.readline())
+
+    def finish(self):
+        self.child.stdin.write("done\n")
+        self.child.stdin.close()
+        self.child.wait()
+        self.drive_child.stdin.close()
+        result = json.loads(self.drive_child.stdout.readline())
+        self.drive_child.wait()
+        return result
+
+
+class ThreadHost:
+    """SerialThread's arrangement: the reader thread in this process feeding the mobility process"""
+
+    def __init__(self, devices):
+        self.transport = PtyTransport(devices.port)
+        self.mobility = MobilityClient(f"pty://{devices.drive_port}")
+        self.device = DevicePipeline(self.transport.write, RULES, on_samples=self.mobility.observe)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+        self.mobility.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            chunk = self.transport.read_chunk()
+            rx_ns = now_ns()
+            for event in self.device.feed(chunk, rx_ns) if chunk else ():
+                self.mobility.observe(event, rx_ns, self.device.clock.host_ns(event.device_ms, rx_ns))
+
+    def drive(self, motion):
+        self.mobility.drive(motion)
+
+    def stats(self):
+        return self.mobility.stats()
+
+    def close(self):
+        self.stopped.set()
+        self.transport.cancel()
+        self.thread.join()
+        self.mobility.close()
+        self.transport.close()
+
+
+class ProcessHost:
+    """main.AcquisitionThread without Qt: the acquisition process feeds the mobility process"""
+
+    def __init__(self, devices):
+        self.client = AcquisitionClient(f"pty://{devices.port}", rules=RULES,
+                                        drive_url=f"pty://{devices.drive_port}")
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+        while self.client.process is None:
+            time.sleep(0.01)
+
+    def run(self):
+        while self.client.wait():
+            for _ in self.client.drain():
+                pass
+
+    def drive(self, motion):
+        self.client.drive(motion)
+
+    def stats(self):
+        return self.client.stats().get("mobility", {})
+
+    def close(self):
+        self.client.stop()
+        self.thread.join()
+        self.client.close()
+
+
+def scenario(host, devices, repeats, log):
+    """Drive the host, logging (what, ns) to measure from. Yields seconds to wait after each step"""
+    yield 1.5  # Connected and heartbeats flowing, the acquisition process has started
+    for _ in range(repeats):
+        log.append(("start", now_ns()))
+        host.drive("forward")
+        yield 0.15
+        log.append(("stop", now_ns()))
+        host.drive("stop")
+        yield 0.1
+    for _ in range(repeats):
+        host.drive("forward")
+        yield 0.15
+        log.append(("back", devices.command("back")))
+        yield 0.3  # Past the fusion refractory period
+    for _ in range(max(2, repeats // 4)):
+        host.drive("forward")
+        yield 0.15
+        log.append(("watchdog", devices.command("silence")))
+        yield HEARTBEAT_TIMEOUT_S + 0.2
+        devices.command("beat")
+        yield 0.3
+    for _ in range(2):
+        log.append(("deadman", now_ns()))
+        host.drive("forward")
+        yield HOLD_S + 0.2
+    log.append(("renew", now_ns()))
+    host.drive("forward")
+    for _ in range(3):
+        yield HOLD_S / 2
+        devices.command("select")
+    yield HOLD_S / 2
+    log.append(("renewed", now_ns()))
+    host.drive("stop")
+    yield 0.2
+
+
+def calibrate_block(block_ms):
+    """A list whose sort holds the GIL for about block_ms in one C call, as a slow repaint does"""
+    values = [random.random() for _ in range(100_000)]
+    started = time.perf_counter()
+    sorted(values)
+    per_item = (time.perf_counter() - started) / len(values)
+    return [random.random() for _ in range(max(1, int(block_ms / 1000 / per_item)))]
+
+
+def timer_lateness(seconds=2.0):
+    """Worst lateness of a bare sleep loop at the control rate, in ms"""
+    period_ns = int(1e9 / CONTROL_HZ)
+    worst = 0
+    next_ns = now_ns()
+    for _ in range(int(seconds * CONTROL_HZ)):
+        next_ns += period_ns
+        time.sleep(max(0, next_ns - now_ns()) / 1e9)
+        worst = max(worst, now_ns() - next_ns)
+    return worst / 1e6
+
+
+def run(host_type, repeats, block):
+    devices = Devices()
+    host = host_type(devices)
+    log = []
+    for wait_s in scenario(host, devices, repeats, log):
+        deadline = time.perf_counter() + wait_s
+        while time.perf_counter() < deadline:
+            if block is not None:
+                sorted(block)
+            time.sleep(0.002)
+    stats = host.stats()
+    host.close()  # Its last stop frame goes out before the drive controller closes
+    result = devices.finish()
+    return measure(log, result["frames"], result["changes"]), stats
+
+
+def measure(log, frames, changes):
+    times = [frame[0] for frame in frames]
+
+    def first(after_ns, moving):
+        """Arrival of the first frame from after_ns on that moves (or stops)"""
+        for rx_ns, linear, angular, _ in frames[bisect.bisect_left(times, after_ns):]:
+            if ((linear, angular) != (0, 0)) == moving:
+                return rx_ns
+        return None
+
+    period_ms = 1000 / CONTROL_HZ
+    results = {"command": [], "back": [], "watchdog": [], "deadman": [], "missing": 0}
+    renew_ns = None
+    for what, ns in log:
+        if what == "renew":
+            renew_ns = ns
+            continue
+        if what == "renewed":
+            stopped = first(renew_ns, False)
+            results["renewed"] = stopped is not None and stopped >= ns
+            continue
+        arrived = first(ns, what == "start")
+        if arrived is None:
+            results["missing"] += 1
+            continue
+        ms = (arrived - ns) / 1e6
+        if what in ("start", "stop"):
+            results["command"].append(ms)
+        elif what == "back":
+            results["back"].append(ms)
+        else:
+            results[what].append(ms - (HEARTBEAT_TIMEOUT_S if what == "watchdog" else HOLD_S) * 1000)
+    # Gaps as sent (a frame carries the mobility process's clock, in ms): a pty adds up to ~10ms
+    # of its own before the drive controller reads a frame, a serial line does not
+    sent = [frame[3] for frame in frames]
+    results["gap"] = max((later - earlier for earlier, later in zip(sent, sent[1:])), default=period_ms)
+    results["timeouts"] = sum(1 for _, _, cause in changes if cause == "timeout")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--block-ms", type=float, default=30.0, help="GIL held per simulated GUI block")
+    parser.add_argument("--max-command-ms", type=float, default=20.0,
+                        help="allowed command and back stop latency, one control period by default")
+    parser.add_argument("--margin-ms", type=float, default=20.0,
+                        help="allowed on top of one control period for watchdog and deadman stops")
+    args = parser.parse_args()
+
+    period_ms = 1000 / CONTROL_HZ
+    block = calibrate_block(args.block_ms)
+    print(f"Control loop {CONTROL_HZ}Hz, heartbeat timeout {HEARTBEAT_TIMEOUT_S * 1000:.0f}ms, "
+          f"deadman {HOLD_S:g}s, timer up to {timer_lateness():.1f}ms late. "
+          f"Worst case over {args.repeats} commands and back twitches:")
+    print(f"{'controller':<12} {'GUI load':<9} {'command':>14} {'back':>8} {'watchdog':>9} {'deadman':>8} "
+          f"{'gap':>8} {'timeouts':>8} {'renewed':>8} {'realtime':>8}")
+    failures = []
+    for label, host_type in (("thread", ThreadHost), ("process", ProcessHost)):
+        for load in ("idle", f"{args.block_ms:g}ms"):
+            results, stats = run(host_type, args.repeats, None if load == "idle" else block)
+            command = sorted(results["command"])
+            print(f"{label:<12} {load:<9} {command[len(command) // 2]:5.2f} / {command[-1]:5.2f}ms "
+                  f"{max(results['back']):6.2f}ms {max(results['watchdog']):+7.2f}ms "
+                  f"{max(results['deadman']):+6.2f}ms {results['gap']:6.2f}ms {results['timeouts']:>8} "
+                  f"{'yes' if results.get('renewed') else 'NO':>8} {'yes' if stats.get('realtime') else 'no':>8}")
+            if load == "idle":
+                continue
+            late_ms = period_ms + args.margin_ms
+            checks = [
+                ("command latency", max(results["command"]) <= args.max_command_ms),
+                # The thread host's reader waits out the GUI's hold on the GIL before it passes a twitch or
+                # a heartbeat on, so only the acquisition process is held to these two
+                ("back stop latency", label == "thread" or max(results["back"]) <= args.max_command_ms),
+                ("watchdog reaction", label == "thread" or max(results["watchdog"]) <= late_ms),
+                ("deadman reaction", max(results["deadman"]) <= late_ms),
+                ("frame gap", results["gap"] <= MOTOR_TIMEOUT_S * 1000 / 2),
+                ("drive controller timeouts", results["timeouts"] == 0),
+                ("commands answered", results["missing"] == 0),
+                ("select twitches renew motion", results.get("renewed")),
+            ]
+            failures += [f"{label} {name}" for name, ok in checks if not ok]
+    print("\ncommand is median / max. watchdog and deadman are past their timeout; both fire within "
+          f"one {period_ms:.0f}ms tick plus scheduling")
+    if failures:
+        print("FAILED (under load): " + ", ".join(failures))
+    sys.exit(1 if failures else 0)
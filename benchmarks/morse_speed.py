@@ -0,0 +1,91 @@
+# Morse mode against scanning: synthetic users type the same corpus both ways in
+# virtual time
+#
+#   python3 benchmarks/morse_speed.py [corpus] [--sentences N] [--seed S]
+#
+# Morse users key at several rhythms, one of them slowing down as they tire, and
+# the decoder starts from its default unit every time. The last line times the
+# decoder itself per twitch.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layouts import ALPHABETICAL_LAYOUT, SKIP, build_frequency_layout, build_huffman_tree
+from morse import MORSE_CODE, MorseDecoder
+from prediction import PREDICTION_KEYS, load_index
+from simulator import FixedTiming, MorseSimulator, MorseUser, Simulator, SyntheticUser
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_corpus.txt")
+PREDICTION_ROW = [list(PREDICTION_KEYS) + [SKIP]]
+
+MORSE_USERS = {
+    "morse 150 ms": dict(unit_ms=150),
+    "morse 250 ms": dict(unit_ms=250),
+    "morse 400 ms": dict(unit_ms=400),
+    "morse 250 ms, slowing": dict(unit_ms=250, drift=0.0001),
+    "morse 250 ms, no misses": dict(unit_ms=250, miss_rate=0, false_twitches_per_min=0),
+}
+
+
+def scanners(index):
+    """name -> (keyboard, tree, restart_at_top, prediction index), scanned at a fixed 1000 ms"""
+    return {
+        "scan alphabetical+prediction": (PREDICTION_ROW + ALPHABETICAL_LAYOUT, None, False, index),
+        "scan frequency+prediction": (PREDICTION_ROW + build_frequency_layout(), None, True, index),
+        "scan huffman-4": ([[''] * 5], build_huffman_tree(branching=4), False, None),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--sentences", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lines = [line for line in open(args.corpus).read().splitlines() if line.strip()]
+    texts = [lines[i % len(lines)] for i in range(args.sentences)]
+    index = load_index(os.path.join(tempfile.mkdtemp(), "prediction.idx"))
+
+    print(f"{'configuration':<32} {'chars/min':>9} {'ms/char':>8} {'twitches':>8} {'errors':>7} {'gave up':>7} "
+          f"{'unit':>11}")
+    for name, options in MORSE_USERS.items():
+        simulator = MorseSimulator(MorseUser(seed=args.seed, **options))
+        report = simulator.run(texts)
+        unit = f"{report['unit_ms']:.0f}/{simulator.user.unit_ms:.0f}"
+        print(f"{name:<32} {report['chars_per_min']:>9.2f} {report['ms_per_char']:>8.0f} "
+              f"{report['twitches_per_char']:>8.2f} {report['error_rate']:>7.1%} {report['gave_up']:>7} {unit:>11}")
+    for name, (keyboard, tree, restart_at_top, prediction_index) in scanners(index).items():
+        simulator = Simulator(keyboard, SyntheticUser(seed=args.seed), FixedTiming(1000), tree, restart_at_top,
+                              prediction_index)
+        report = simulator.run(texts)
+        print(f"{name:<32} {report['chars_per_min']:>9.2f} {report['ms_per_char']:>8.0f} "
+              f"{report['twitches_per_char']:>8.2f} {report['error_rate']:>7.1%} {report['gave_up']:>7}")
+    print("(unit: decoder estimate / user's actual unit at the end, ms)")
+
+    # Decoder cost per twitch on a clean stream
+    stream = []
+    now = 0.0
+    for char in "".join(texts).upper():
+        code = MORSE_CODE.get(char)
+        if code is None:
+            now += 15 * 250
+            continue
+        for element in code:
+            stream.append(now)
+            if element == '-':
+                stream.append(now + 250)
+            now += (250 if element == '-' else 0) + 3 * 250
+        now += 4 * 250
+    decoded = []
+    decoder = MorseDecoder(decoded.append, unit_ms=250)
+    started = time.perf_counter_ns()
+    for moment in stream:
+        decoder.twitch(moment)
+    elapsed = (time.perf_counter_ns() - started) / len(stream)
+    print(f"\ndecoder: {elapsed / 1000:.2f} µs per twitch over {len(stream)} twitches, {len(decoded)} keys")
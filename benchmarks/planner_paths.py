@@ -0,0 +1,144 @@
+# Check the scan planner against a brute-force search and time the key index
+#
+#   python3 benchmarks/planner_paths.py [corpus]
+#
+# For every highlight state of every layout and every key, the planner's tick count
+# must equal a 0-1 BFS over the real ScanEngine (advance costs a tick, a twitch is
+# free). Exits with status 1 on any mismatch.
+
+import os
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layouts import ALPHABETICAL_LAYOUT, SKIP, build_frequency_layout, build_huffman_tree
+from planner import ScanPlanner
+from prediction import PREDICTION_KEYS
+from scan_engine import ScanEngine
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_corpus.txt")
+PREDICTION_ROW = [list(PREDICTION_KEYS) + [SKIP]]
+
+LAYOUTS = {
+    "alphabetical": (ALPHABETICAL_LAYOUT, None, False),
+    "alphabetical+prediction": (PREDICTION_ROW + ALPHABETICAL_LAYOUT, None, False),
+    "frequency": (build_frequency_layout(), None, True),
+    "huffman-3": ([[''] * 4], build_huffman_tree(branching=3), False),
+    "huffman-4": ([[''] * 5], build_huffman_tree(branching=4), False),
+}
+
+
+def find_char_position(keyboard, char):
+    """The old autotype lookup: scan the whole grid for every character"""
+    char = '␣' if char == ' ' else char.upper()
+    for row_idx, row in enumerate(keyboard):
+        for col_idx, key in enumerate(row):
+            if key == char:
+                return row_idx, col_idx
+    return None, None
+
+
+def set_state(engine, state):
+    if engine.tree is not None:
+        engine.tree.node, engine.tree.index = state
+        engine.sync_tree()
+    else:
+        engine.current_row, engine.current_col, engine.selecting_row = state
+
+
+def states(planner):
+    if planner.tree is None:
+        for row, keys in enumerate(planner.keyboard):
+            yield row, 0, True
+            for col in range(len(keys)):
+                yield row, col, False
+    else:
+        stack = [planner.tree]
+        while stack:
+            node = stack.pop()
+            if node.is_leaf:
+                continue
+            stack.extend(node.children)
+            for index in range(len(node.children) + (0 if node is planner.tree else 1)):
+                yield node, index
+
+
+def search(engine, planner, keyboard, start, key):
+    """Fewest ticks from start until key is typed, by 0-1 BFS over the engine"""
+    queue = deque([(0, start)])
+    seen = {}
+    while queue:
+        ticks, state = queue.popleft()
+        if seen.get(state, ticks + 1) <= ticks:
+            continue
+        seen[state] = ticks
+        set_state(engine, state)
+        no_exit = engine.tree is None and not engine.selecting_row and SKIP not in keyboard[engine.current_row]
+        selected = engine.confirm()
+        if selected == key:
+            return ticks
+        if selected in (None, SKIP) or (no_exit and state == start):
+            queue.appendleft((ticks, planner.state(engine)))
+        set_state(engine, state)
+        engine.advance()
+        queue.append((ticks + 1, planner.state(engine)))
+    return None
+
+
+if __name__ == "__main__":
+    corpus = open(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS).read()
+    mismatches = 0
+    for name, (keyboard, tree, restart_at_top) in LAYOUTS.items():
+        planner = ScanPlanner(keyboard, tree, restart_at_top)
+        engine = ScanEngine(keyboard, tree, restart_at_top)
+        keys = sorted(set(planner.char_keys.values()) | ({'Speak', 'SOS'} if tree is None else set()))
+        checked = 0
+        for state in list(states(planner)):
+            for key in keys:
+                set_state(engine, state)
+                planned = planner.ticks(engine, key)
+                searched = search(engine, planner, keyboard, state, key)
+                checked += 1
+                if planned != searched:
+                    mismatches += 1
+                    print(f"MISMATCH {name} {state} {key}: planned {planned}, search {searched}")
+
+        # Execute the corpus the way autotype does and compare with the plan
+        engine = ScanEngine(keyboard, tree, restart_at_top)
+        plan = planner.plan_text(engine, corpus)
+        typed = []
+        ticks = 0
+        for key, _ in plan:
+            while not planner.on_path(engine, key):
+                engine.advance()
+                ticks += 1
+            while True:
+                selected = engine.confirm()
+                if selected is not None:
+                    break
+                while not planner.on_path(engine, key):
+                    engine.advance()
+                    ticks += 1
+            typed.append(selected)
+        planned = sum(sum(legs) for _, legs in plan)
+        ok = typed == [key for key, _ in plan] and ticks == planned
+        mismatches += not ok
+        print(f"{name:<26} {checked:>6} state/key pairs match the search, corpus: {ticks / len(plan):.2f} ticks/char "
+              f"{'as planned' if ok else f'MISMATCH (planned {planned})'}")
+
+    chars = [char for char in corpus if char != '\n']
+    planner = ScanPlanner(ALPHABETICAL_LAYOUT)
+    started = time.perf_counter_ns()
+    for char in chars:
+        find_char_position(ALPHABETICAL_LAYOUT, char)
+    linear = (time.perf_counter_ns() - started) / len(chars)
+    started = time.perf_counter_ns()
+    for char in chars:
+        key = planner.char_keys.get(char)
+        if key is not None:
+            planner.positions[key]
+    indexed = (time.perf_counter_ns() - started) / len(chars)
+    print(f"\nchar lookup: linear scan {linear:.0f} ns, index {indexed:.0f} ns")
+    sys.exit(1 if mismatches else 0)
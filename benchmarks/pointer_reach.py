@@ -0,0 +1,128 @@
+# Pointer mode: selections and scan ticks to put the pointer on any pixel, and overlay repaint cost
+#
+#   python3 benchmarks/pointer_reach.py [--targets 2000] [--grids 2,3,4]
+#
+# An ideal user selects the cell holding a random target every time. "exact" goes
+# down to the single pixel, "16px" stops once the region fits a 16px control and
+# selects Act. The baseline is the linear row/column scan of a cursor grid the
+# keyboard layout would give, at 20px spacing. Repaint cost runs PointerOverlay
+# offscreen and adds up the area of every paint event. Exits with status 1 when a
+# target is missed, needs more than ceil(log_grid(screen side)) selections, or a
+# tick repaints more than 5% of the screen.
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from pointer import ACT, PointerScanner
+
+SCREENS = [(0, 0, 1920, 1080), (0, 0, 3840, 2160)]
+TARGET_PX = 16
+BASELINE_STEP_PX = 20
+MAX_TICK_REPAINT = 0.05
+
+
+def reach(scanner, target, stop_px=1, on_step=None):
+    """Select the cell holding target until the region is down to stop_px, then Act.
+    Returns (selections, ticks)"""
+    selections = ticks = 0
+    while not scanner.acting:
+        region = scanner.regions[-1]
+        if region[2] <= stop_px and region[3] <= stop_px and scanner.point is not None:
+            index = next(index for index, (label, _) in enumerate(scanner.items) if label == ACT)
+        else:
+            index = next(index for index, (label, (x, y, width, height)) in enumerate(scanner.items)
+                         if not label and x <= target[0] < x + width and y <= target[1] < y + height)
+        while scanner.index != index:
+            scanner.advance()
+            ticks += 1
+            if on_step is not None:
+                on_step("tick")
+        scanner.confirm()
+        selections += 1
+        if on_step is not None:
+            on_step("select")
+    return selections, ticks
+
+
+def baseline(target):
+    """Row then column scan of a cursor grid: (selections, ticks) down to the target's row, then across"""
+    return 2, target[1] // BASELINE_STEP_PX + target[0] // BASELINE_STEP_PX
+
+
+def repaint_cost(screen, grid, targets):
+    from PyQt5.QtWidgets import QApplication
+    from highlight import PointerOverlay
+    app = QApplication.instance() or QApplication([])
+    overlay = PointerOverlay(screen)
+    overlay.show()
+    area = screen[2] * screen[3]
+    costs = {"tick": [], "select": []}
+    scanner = PointerScanner(screen, grid)
+    overlay.render(scanner)
+    app.processEvents()
+
+    def on_step(kind):
+        before = overlay.repainted_px
+        started = time.perf_counter()
+        overlay.render(scanner)
+        app.processEvents()
+        costs[kind].append(((overlay.repainted_px - before) / area, (time.perf_counter() - started) * 1000))
+
+    for target in targets:
+        reach(scanner, target, TARGET_PX, on_step)
+        scanner.confirm()  # Click, the first action, which starts over on the whole screen
+        on_step("select")
+    overlay.close()
+    return costs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", type=int, default=2000)
+    parser.add_argument("--grids", default="2,3,4")
+    args = parser.parse_args()
+
+    ok = True
+    rng = random.Random(0)
+    for screen in SCREENS:
+        targets = [(rng.randrange(screen[2]), rng.randrange(screen[3])) for _ in range(args.targets)]
+        print(f"{screen[2]}x{screen[3]}, {args.targets} random targets: selections max / mean, ticks mean / max")
+        rows = [("row/column 20px", [baseline(target) for target in targets], None)]
+        for grid in [int(grid) for grid in args.grids.split(",")]:
+            exact, near = [], []
+            for target in targets:
+                scanner = PointerScanner(screen, grid)
+                exact.append(reach(scanner, target))
+                if scanner.point != target:
+                    print(f"  grid {grid}: ended on {scanner.point}, not {target}")
+                    ok = False
+                near.append(reach(PointerScanner(screen, grid), target, TARGET_PX))
+            bound = math.ceil(math.log(max(screen[2], screen[3]), grid))
+            ok &= max(selections for selections, _ in exact) <= bound
+            rows.append((f"{grid}x{grid} exact", exact, bound))
+            rows.append((f"{grid}x{grid} {TARGET_PX}px", near, None))
+        for label, results, bound in rows:
+            selections = [selections for selections, _ in results]
+            ticks = [ticks for _, ticks in results]
+            limit = f"  (log bound {bound})" if bound is not None else ""
+            print(f"  {label:<16} selections {max(selections):>2} / {statistics.mean(selections):4.1f}   "
+                  f"ticks {statistics.mean(ticks):6.1f} / {max(ticks):>4}{limit}")
+
+    screen = SCREENS[0]
+    costs = repaint_cost(screen, 3, [(rng.randrange(screen[2]), rng.randrange(screen[3])) for _ in range(50)])
+    print(f"\nOverlay repaints on {screen[2]}x{screen[3]}, 3x3 grid:")
+    for kind, values in costs.items():
+        share = [share for share, _ in values]
+        ms = [ms for _, ms in values]
+        print(f"  per {kind:<6} {statistics.mean(share):6.2%} of the screen (max {max(share):6.2%}), "
+              f"render + paint {statistics.mean(ms):.2f}ms (max {max(ms):.2f}ms)")
+    ok &= max(share for share, _ in costs["tick"]) <= MAX_TICK_REPAINT
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,97 @@
+# Keystroke and scan-tick savings of the word prediction row on a text corpus
+#
+#   python3 benchmarks/prediction_savings.py [corpus] [dwell ms] [reaction ms]
+#
+# A simulated user picks a prediction as soon as the word they are typing shows up in
+# the row and the word is followed by a space, otherwise they type the next key. The
+# index is built from src/data into a temporary file, the corpus is not part of it.
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layouts import (ALPHABETICAL_LAYOUT, SKIP, build_frequency_layout, grid_ticks, key_positions, keys_for_text,
+                     simulate_grid, simulation_report)
+from prediction import PREDICTION_KEYS, Predictor, build_index, load_index
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_corpus.txt")
+
+
+def simulate(index, keyboard, text, dwell_ms, reaction_ms, resume_row):
+    """Type text with predictions on row 0 of keyboard, returns (report, selections, lookup times in ns)"""
+    predictor = Predictor(index)
+    positions = key_positions(keyboard)
+    keys = keys_for_text(text)
+    selections = ticks = 0
+    row = 0
+    lookups = []
+    i = 0
+    while i < len(keys):
+        if keys[i] == '␣' or keys[i] not in positions:
+            word = ""
+        else:
+            start = i - len(predictor.prefix)
+            end = start
+            while end < len(keys) and keys[end].isalpha() and len(keys[end]) == 1:
+                end += 1
+            word = "".join(keys[start:end])
+        followed_by_space = word and (end == len(keys) or keys[end] == '␣')
+        predictions = predictor.predictions()
+        if followed_by_space and word in predictions:
+            target = (0, predictions.index(word))
+            predictor.accept(target[1])
+            i = end + 1
+        else:
+            target = positions.get(keys[i])
+            started = time.perf_counter_ns()
+            predictor.type_key(keys[i])
+            predictor.predictions()
+            lookups.append(time.perf_counter_ns() - started)
+            i += 1
+            if target is None:
+                continue
+        ticks += grid_ticks(keyboard, row, target, resume_row)
+        row = target[0] if resume_row else 0
+        selections += 1
+    report = simulation_report(len(keys), ticks, 2 * selections, dwell_ms, reaction_ms)
+    return report, selections, np.array(lookups)
+
+
+def show(name, report):
+    print(f"{name:<44} {report['ticks_per_char']:>6.2f} {report['ms_per_char']:>8.0f} {report['chars_per_min']:>9.2f}")
+
+
+if __name__ == "__main__":
+    corpus = open(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS).read()
+    dwell_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    reaction_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 400
+
+    path = os.path.join(tempfile.mkdtemp(), "prediction.idx")
+    started = time.perf_counter()
+    build_index(path)
+    built = time.perf_counter()
+    index = load_index(path)
+    loaded = time.perf_counter()
+    print(f"index: {index.word_count} words, {len(index.mm)} bytes, "
+          f"built in {(built - started) * 1e3:.1f} ms, mapped in {(loaded - built) * 1e3:.2f} ms\n")
+
+    prediction_row = [list(PREDICTION_KEYS) + [SKIP]]
+    chars = len(keys_for_text(corpus))
+    print(f"{'layout':<44} {'ticks':>6} {'ms/char':>8} {'chars/min':>9}")
+    lookups = None
+    for name, keyboard, resume_row in (("alphabetical", ALPHABETICAL_LAYOUT, True),
+                                       ("frequency", build_frequency_layout(), False)):
+        show(name, simulate_grid(keyboard, corpus, dwell_ms, reaction_ms, resume_row))
+        report, selections, times = simulate(index, prediction_row + keyboard, corpus, dwell_ms, reaction_ms,
+                                             resume_row)
+        show(f"{name} + prediction row", report)
+        print(f"{'':<4}keystroke savings {1 - selections / chars:.1%} ({selections} selections for {chars} chars)")
+        lookups = times if lookups is None else np.concatenate([lookups, times])
+
+    print(f"\nper-key update + lookup: mean {lookups.mean() / 1e3:.1f} us, "
+          f"p99 {np.percentile(lookups, 99) / 1e3:.1f} us, max {lookups.max() / 1e3:.1f} us")
@@ -0,0 +1,138 @@
+# Scan timing jitter and twitch attribution
+#
+#   python3 benchmarks/scan_jitter.py [--items N] [--dwell-ms MS] [--seed S]
+#
+# Dwell: runs a Qt event loop (offscreen) with random GUI stalls of up to 40ms and
+# measures how long each item really stays highlighted, for a repeating and a
+# re-armed coarse QTimer and for ScanScheduler. Drift is the total lag behind
+# items x dwell, short items were on screen over 5ms less than their dwell.
+#
+# Attribution: a simulated user twitches within each item, the event reaches the
+# GUI after USB transfer and queueing delays. Counts how often the selected item is
+# not the one on screen at the twitch when it is looked up at handling time, at
+# serial receive time, or at the device timestamp mapped through ClockSync.
+# Exits with status 1 when the device timestamp does worse than receive time.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+from latency import now_ns
+from scan_scheduler import ClockSync, HighlightHistory, ScanScheduler
+
+MAX_STALL_MS = 40
+STALLS_PER_S = 4
+
+
+def busy(ms):
+    until = now_ns() + ms * 1_000_000
+    while now_ns() < until:
+        pass
+
+
+def run_dwell(app, mode, items, dwell_ms, seed):
+    """Highlight times in ms of items scanned at dwell_ms while the GUI thread stalls now and then"""
+    rng = random.Random(seed)
+    shown = []
+
+    def tick():
+        busy(rng.uniform(0, 3))  # Advancing and restyling buttons
+        shown.append(now_ns() / 1e6)
+        if len(shown) > items:
+            app.quit()
+            timer.stop()
+        elif mode == "scheduler":
+            scheduler.start(dwell_ms, now_ns())
+        elif mode == "re-armed":
+            timer.start(dwell_ms)
+
+    def stall():
+        busy(rng.uniform(0, MAX_STALL_MS))
+        stall_timer.start(int(rng.expovariate(STALLS_PER_S) * 1000))
+
+    scheduler = ScanScheduler(tick)
+    timer = QTimer()
+    timer.setSingleShot(mode == "re-armed")
+    timer.timeout.connect(tick)
+    if mode == "repeating":
+        timer.start(dwell_ms)
+    stall_timer = QTimer()
+    stall_timer.setSingleShot(True)
+    stall_timer.timeout.connect(stall)
+    stall_timer.start(int(rng.expovariate(STALLS_PER_S) * 1000))
+    if mode != "repeating":
+        QTimer.singleShot(0, tick)
+    app.exec_()
+    stall_timer.stop()
+    return shown
+
+
+def report_dwell(label, shown, dwell_ms):
+    durations = [b - a for a, b in zip(shown, shown[1:])]
+    errors = sorted(abs(duration - dwell_ms) for duration in durations)
+    short = sum(duration < dwell_ms - 5 for duration in durations)
+    drift = shown[-1] - shown[0] - dwell_ms * len(durations)
+    print(f"  {label:<18} |error| median {statistics.median(errors):5.1f}ms  "
+          f"p95 {errors[int(len(errors) * 0.95)]:5.1f}ms  max {errors[-1]:5.1f}ms  "
+          f"short {short / len(durations):4.0%}  drift {drift:+5.0f}ms")
+
+
+def run_attribution(items, dwell_ms, seed):
+    """Wrong items out of items twitches for (handling time, receive time, device time) lookups"""
+    rng = random.Random(seed)
+    offset_ns = 5_000_000_000  # Host clock minus device clock
+    drift = 40e-6  # Device crystal error
+    clock = ClockSync()
+    history = HighlightHistory(maxlen=items)
+    lookups = []  # (item, handling time, receive time, device time)
+
+    def device_ms(host_ns):
+        return int((host_ns - offset_ns) * (1 + drift) / 1_000_000) & 0xFFFFFFFF
+
+    t = 0
+    next_frame = 0
+    for item in range(items):
+        history.shown(t, item)
+        # Reaction anywhere in the later part of the item, where delays matter
+        twitch = t + int(rng.uniform(0.3, 1.0) * dwell_ms * 1_000_000)
+        end = t + dwell_ms * 1_000_000
+        # Power and sample frames keep the clock in sync, every ~50ms
+        while next_frame < end:
+            clock.observe(device_ms(next_frame), next_frame + int(rng.uniform(1, 15) * 1e6))
+            next_frame += int(rng.uniform(30, 70) * 1e6)
+        rx = twitch + int(rng.uniform(1, 15) * 1e6)  # USB frame and read latency
+        handled = rx + int(rng.expovariate(1 / 20) * 1e6)  # Waiting behind other GUI work
+        clock.observe(device_ms(twitch), rx)
+        lookups.append((item, handled, rx, clock.host_ns(device_ms(twitch), rx)))
+        t = end
+    # Looked up once the whole scan is known, the highlight may have moved on by then
+    return [sum(history.at(times[index], (0, None))[1] != item for item, *times in lookups) for index in range(3)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--dwell-ms", type=int, default=250)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    print(f"Highlight time of {args.items} items at {args.dwell_ms}ms with GUI stalls up to {MAX_STALL_MS}ms:")
+    for mode, label in (("repeating", "repeating QTimer"), ("re-armed", "re-armed QTimer"),
+                        ("scheduler", "ScanScheduler")):
+        report_dwell(label, run_dwell(app, mode, args.items, args.dwell_ms, args.seed), args.dwell_ms)
+
+    twitches = 20000
+    handled, received, device = run_attribution(twitches, args.dwell_ms, args.seed)
+    print(f"\nTwitches attributed to the wrong item ({twitches} twitches):")
+    print(f"  at handling time   {handled / twitches:6.2%}")
+    print(f"  at receive time    {received / twitches:6.2%}")
+    print(f"  at device time     {device / twitches:6.2%}")
+    sys.exit(1 if device > received else 0)
@@ -0,0 +1,104 @@
+# Headless regression suite: a synthetic user types a corpus through every layout and
+# timing configuration in virtual time
+#
+#   python3 benchmarks/scan_simulation.py [corpus] [--sentences N] [--seed S]
+#                                         [--save results.json] [--compare results.json] [--tolerance 0.05]
+#
+# Runs are deterministic for a given seed. --compare exits with status 1 when a
+# configuration types slower or makes more errors than the saved results allow.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from layouts import ALPHABETICAL_LAYOUT, SKIP, build_frequency_layout, build_huffman_tree
+from prediction import PREDICTION_KEYS, load_index
+from scan_timing import AdaptiveScanTiming
+from simulator import FixedTiming, Simulator, SyntheticUser
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sample_corpus.txt")
+PREDICTION_ROW = [list(PREDICTION_KEYS) + [SKIP]]
+
+
+def layouts(index):
+    """name -> (keyboard, tree, restart_at_top, prediction index)"""
+    return {
+        "alphabetical": (ALPHABETICAL_LAYOUT, None, False, None),
+        "alphabetical+prediction": (PREDICTION_ROW + ALPHABETICAL_LAYOUT, None, False, index),
+        "frequency+prediction": (PREDICTION_ROW + build_frequency_layout(), None, True, index),
+        "huffman-3": ([[''] * 4], build_huffman_tree(branching=3), False, None),
+        "huffman-4": ([[''] * 5], build_huffman_tree(branching=4), False, None),
+    }
+
+
+TIMINGS = {
+    "fixed-1000": lambda: FixedTiming(1000),
+    "fixed-800/1200": lambda: FixedTiming(800, 1200),
+    "adaptive": lambda: AdaptiveScanTiming(log_path=None),
+}
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is None:
+            continue
+        if new["chars_per_min"] < old["chars_per_min"] * (1 - tolerance):
+            failures.append(f"{name}: {new['chars_per_min']:.2f} chars/min, was {old['chars_per_min']:.2f}")
+        if new["error_rate"] > old["error_rate"] + tolerance:
+            failures.append(f"{name}: error rate {new['error_rate']:.1%}, was {old['error_rate']:.1%}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    lines = [line for line in open(args.corpus).read().splitlines() if line.strip()]
+    texts = [lines[i % len(lines)] for i in range(args.sentences)]
+    index = load_index(os.path.join(tempfile.mkdtemp(), "prediction.idx"))
+
+    print(f"{'configuration':<40} {'chars/min':>9} {'ms/char':>8} {'steps':>6} {'twitches':>8} "
+          f"{'errors':>7} {'stray':>5} {'gave up':>7}")
+    results = {}
+    started = time.perf_counter()
+    for layout, (keyboard, tree, restart_at_top, prediction_index) in layouts(index).items():
+        for timing, make_timing in TIMINGS.items():
+            simulator = Simulator(keyboard, SyntheticUser(seed=args.seed), make_timing(), tree, restart_at_top,
+                                  prediction_index)
+            report = simulator.run(texts)
+            name = f"{layout} {timing}"
+            results[name] = report
+            print(f"{name:<40} {report['chars_per_min']:>9.2f} {report['ms_per_char']:>8.0f} "
+                  f"{report['steps_per_char']:>6.2f} {report['twitches_per_char']:>8.2f} "
+                  f"{report['error_rate']:>7.1%} {report['stray_actions']:>5} {report['gave_up']:>7}")
+    print()
+    for layout in layouts(index):
+        fixed = max(results[f"{layout} {timing}"]["chars_per_min"] for timing in TIMINGS if timing != "adaptive")
+        print(f"{layout:<40} adaptive {results[f'{layout} adaptive']['chars_per_min'] / fixed - 1:+.1%} "
+              "chars/min against the best fixed timing")
+    elapsed = time.perf_counter() - started
+    simulated = sum(report["time_ms"] for report in results.values()) / 3.6e6
+    print(f"\n{len(results) * len(texts)} sentences, {simulated:.1f} simulated hours in {elapsed:.1f} s")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,50 @@
+# Summarise the adaptive scan statistics log into chars/min, error rate and dwell per period
+#
+#   python3 benchmarks/scan_stats.py [log path] [minutes per bucket]
+
+import csv
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from scan_timing import SCAN_STATS_LOG
+
+TEXT_KEYS = {"space", "enter"}
+
+
+def summarise(path, bucket_minutes):
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        print("empty log")
+        return
+    start = float(rows[0]["time"])
+    buckets = defaultdict(lambda: {"chars": 0, "selections": 0, "corrections": 0, "dwell": defaultdict(list)})
+    for row in rows:
+        bucket = buckets[int((float(row["time"]) - start) / 60 // bucket_minutes)]
+        if row["event"] == "correction":
+            bucket["corrections"] += 1
+            continue
+        bucket["selections"] += 1
+        bucket["dwell"][row["mode"]].append(float(row["dwell_ms"]))
+        key = row["key"]
+        if key == "backspace":
+            bucket["chars"] -= 1
+        elif key and (len(key) == 1 or key in TEXT_KEYS or key == "comma"):
+            bucket["chars"] += 1
+
+    print(f"{'minutes':>9} {'chars/min':>10} {'errors':>7} {'row ms':>7} {'col ms':>7} {'first ms':>8}")
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        dwell = {mode: sum(values) / len(values) if values else 0 for mode, values in bucket["dwell"].items()}
+        errors = bucket["corrections"] / max(1, bucket["selections"])
+        print(f"{index * bucket_minutes:>4g}-{(index + 1) * bucket_minutes:<4g} "
+              f"{max(0, bucket['chars']) / bucket_minutes:>10.2f} {errors:>7.1%} "
+              f"{dwell.get('row', 0):>7.0f} {dwell.get('col', 0):>7.0f} {dwell.get('first', 0):>8.0f}")
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SCAN_STATS_LOG
+    summarise(path, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,139 @@
+# Sensor fusion rules on synthetic multi-channel twitch streams, and event bus fan-out
+# with a slow consumer
+#
+#   python3 benchmarks/sensor_fusion.py [minutes] [--seed S]
+#
+# Every real twitch reaches each sensor with its own hit rate and detection delay,
+# and every sensor also fires on its own at random. A rule's action counts as a hit
+# when it fires within 300ms of a real twitch. Latency is from the twitch onset.
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from event_bus import EventBus, FusionRule, SensorFusion
+
+# channel -> (hit rate, detection delay ms, delay sigma ms, false twitches per minute)
+SENSORS = {
+    "accel": (0.95, 40, 10, 1.0),
+    "ir": (0.90, 25, 8, 3.0),  # Ambient light changes make the IR sensor noisier
+    "emg": (0.85, 30, 12, 2.0),  # Stand-in for a future sensor
+}
+RULES = {
+    "accel only": {"accel": 1.0},
+    "ir only": {"ir": 1.0},
+    "accel or ir": {"accel": 1.0, "ir": 1.0},
+    "accel and ir": {"accel": 0.5, "ir": 0.5},
+    "2 of 3 vote": {"accel": 0.5, "ir": 0.5, "emg": 0.5},
+    "weighted 3": {"accel": 0.6, "ir": 0.4, "emg": 0.4},
+}
+TWITCHES_PER_MIN = 20
+HIT_WINDOW_MS = 300
+
+
+def synthetic_streams(minutes, seed):
+    """Sorted [(time ms, channel)] and the true twitch onsets"""
+    rng = random.Random(seed)
+    duration = minutes * 60000
+    onsets = []
+    now = rng.expovariate(TWITCHES_PER_MIN / 60000)
+    while now < duration:
+        onsets.append(now)
+        now += 500 + rng.expovariate(TWITCHES_PER_MIN / 60000)
+    twitches = []
+    for channel, (hit_rate, delay, sigma, false_per_min) in SENSORS.items():
+        for onset in onsets:
+            if rng.random() < hit_rate:
+                twitches.append((onset + max(0.0, rng.gauss(delay, sigma)), channel))
+        now = rng.expovariate(false_per_min / 60000)
+        while now < duration:
+            twitches.append((now, channel))
+            now += rng.expovariate(false_per_min / 60000)
+    twitches.sort()
+    return twitches, onsets
+
+
+def score(fired, onsets, minutes):
+    hits, latencies, false = 0, [], 0
+    position = 0
+    for moment in fired:
+        while position < len(onsets) and onsets[position] + HIT_WINDOW_MS < moment:
+            position += 1
+        if position < len(onsets) and onsets[position] <= moment:
+            hits += 1
+            latencies.append(moment - onsets[position])
+            position += 1
+        else:
+            false += 1
+    latencies.sort()
+    mean = sum(latencies) / len(latencies) if latencies else 0.0
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+    return hits / len(onsets), false / minutes, mean, p95
+
+
+def fan_out(count, slow_ms):
+    """Publish count events to a fast and a slow consumer, returns publish times and drops"""
+    bus = EventBus()
+    wake = {name: threading.Event() for name in ("fast", "slow")}
+    subs = {name: bus.subscribe(notify=wake[name].set) for name in wake}
+    received = {name: 0 for name in wake}
+    done = threading.Event()
+
+    def consume(name, delay):
+        while not done.is_set() or subs[name].queue:
+            wake[name].wait(0.05)
+            wake[name].clear()
+            for _ in subs[name].drain():
+                received[name] += 1
+                if delay:
+                    time.sleep(delay / 1000)
+
+    threads = [threading.Thread(target=consume, args=(name, slow_ms if name == "slow" else 0)) for name in wake]
+    for thread in threads:
+        thread.start()
+    publish_ns = []
+    for index in range(count):
+        started = time.perf_counter_ns()
+        bus.publish(index)
+        publish_ns.append(time.perf_counter_ns() - started)
+        time.sleep(0.0002)  # ~5k events/s, faster than any sensor
+    done.set()
+    for thread in threads:
+        thread.join()
+    publish_ns.sort()
+    return publish_ns, received, {name: sub.dropped for name, sub in subs.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("minutes", nargs="?", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    twitches, onsets = synthetic_streams(args.minutes, args.seed)
+    print(f"{len(onsets)} real twitches, {len(twitches)} sensor twitches in {args.minutes:.0f} simulated minutes\n")
+    print(f"{'rule':<14} {'hit rate':>8} {'false/min':>9} {'latency':>8} {'p95':>6}")
+    for name, weights in RULES.items():
+        fusion = SensorFusion([FusionRule("select", weights)])
+        fired = [moment for moment, channel in twitches if fusion.observe(channel, moment) is not None]
+        hit_rate, false_per_min, mean, p95 = score(fired, onsets, args.minutes)
+        print(f"{name:<14} {hit_rate:>8.1%} {false_per_min:>9.2f} {mean:>6.1f}ms {p95:>4.0f}ms")
+
+    fusion = SensorFusion([FusionRule("select", RULES["2 of 3 vote"])])
+    started = time.perf_counter_ns()
+    for moment, channel in twitches:
+        fusion.observe(channel, moment)
+    per_twitch = (time.perf_counter_ns() - started) / len(twitches)
+    print(f"\nfusion: {per_twitch / 1000:.2f} µs per twitch")
+
+    count = 5000
+    publish_ns, received, dropped = fan_out(count, slow_ms=5)
+    print(f"bus: {count} events to a fast and a 5ms-per-event consumer, publish median "
+          f"{publish_ns[len(publish_ns) // 2] / 1000:.1f} µs, max {publish_ns[-1] / 1000:.0f} µs")
+    for name in received:
+        print(f"  {name}: received {received[name]}, dropped {dropped[name]}")
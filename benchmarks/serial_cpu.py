@@ -0,0 +1,90 @@
+# CPU usage of the serial reader against a pty standing in for the ESP32
+#
+#   python3 benchmarks/serial_cpu.py [seconds]
+#
+# The ESP32 side writes "1\n" every 100ms into the pty master while a reader
+# thread consumes the slave end. CPU time is measured for the whole process.
+
+import os
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from serial_reader import LineReader, FdLineReader
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+
+def fake_esp32(master_fd, stop_event, interval=0.1):
+    while not stop_event.is_set():
+        os.write(master_fd, b"1\n")
+        time.sleep(interval)
+
+
+def busy_poll(port, stop_event, counter):
+    # The old SerialThread.run loop
+    while not stop_event.is_set():
+        if port.in_waiting:
+            port.readline().decode().strip()
+            counter[0] += 1
+
+
+def blocking_read(reader, stop_event, counter):
+    while not stop_event.is_set():
+        counter[0] += len(reader.read_lines())
+
+
+def measure(name, make_reader_loop, seconds):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    stop_event = threading.Event()
+    counter = [0]
+    target, args, wake, close = make_reader_loop(slave, stop_event, counter)
+
+    writer = threading.Thread(target=fake_esp32, args=(master, stop_event))
+    reader = threading.Thread(target=target, args=args)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    writer.start()
+    reader.start()
+    time.sleep(seconds)
+    stop_event.set()
+    wake()
+    reader.join()
+    close()
+    writer.join()
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    os.close(master)
+    os.close(slave)
+    print(f"{name:<16} lines={counter[0]:<5} cpu={cpu:.3f}s  ({100 * cpu / wall:.1f}% of one core)")
+
+
+def serial_busy(slave, stop_event, counter):
+    port = serial.Serial(os.ttyname(slave), timeout=1)
+    return busy_poll, (port, stop_event, counter), lambda: None, port.close
+
+
+def serial_blocking(slave, stop_event, counter):
+    port = serial.Serial(os.ttyname(slave))
+    reader = LineReader(port)
+    return blocking_read, (reader, stop_event, counter), reader.cancel, port.close
+
+
+def fd_blocking(slave, stop_event, counter):
+    reader = FdLineReader(slave)
+    return blocking_read, (reader, stop_event, counter), reader.cancel, reader.close
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    if serial is not None:
+        measure("busy in_waiting", serial_busy, seconds)
+        measure("LineReader", serial_blocking, seconds)
+    else:
+        print("pyserial not installed, only measuring the fd reader")
+    measure("FdLineReader", fd_blocking, seconds)
@@ -0,0 +1,178 @@
+# SOS dispatcher: trigger cost on the GUI thread, trigger-to-first-alert latency and
+# delivery through retries, against local stand-ins for the webhook and e-mail
+#
+#   python3 benchmarks/sos_dispatch.py [--alerts N]
+#   python3 benchmarks/sos_dispatch.py --serve    # stand-ins for main.py on ports 8025 and 8026
+#
+# Sounds are "played" by /bin/true so no speaker is needed. The faulty run makes the
+# webhook answer 500 to the first two attempts of every alert and the mail server
+# stall past the channel timeout once. Exits with status 1 when the first alert of
+# any trigger is over sos.FIRST_ALERT_BUDGET_MS or a channel never delivers.
+
+import argparse
+import http.server
+import os
+import shutil
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from latency import now_ns
+from sos import FIRST_ALERT_BUDGET_MS, AlarmChannel, EmailChannel, SosDispatcher, SpokenChannel, WebhookChannel, \
+    write_alarm
+
+WEBHOOK_PORT = 8025
+SMTP_PORT = 8026
+
+
+class Faults:
+    def __init__(self, webhook_failures=0, smtp_stalls=0, stall_s=0.0):
+        self.webhook_failures = webhook_failures  # Per alert
+        self.smtp_stalls = smtp_stalls  # In total
+        self.stall_s = stall_s
+        self.attempts = {}  # alert id -> webhook attempts
+        self.received = []  # (channel, when, text)
+
+
+def webhook_server(port, faults):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+            alert_id = body.split('"id": ')[-1].rstrip("}")
+            attempt = faults.attempts[alert_id] = faults.attempts.get(alert_id, 0) + 1
+            if attempt <= faults.webhook_failures:
+                self.send_response(500)
+                self.end_headers()
+                return
+            faults.received.append(("webhook", now_ns(), body))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def smtp_server(port, faults):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            if faults.smtp_stalls > 0:
+                faults.smtp_stalls -= 1
+                time.sleep(faults.stall_s)
+                return
+            self.wfile.write(b"220 stand-in\r\n")
+            data = None
+            for line in self.rfile:
+                if data is not None:
+                    if line == b".\r\n":
+                        faults.received.append(("email", now_ns(), b"".join(data).decode()))
+                        data = None
+                        self.wfile.write(b"250 queued\r\n")
+                    else:
+                        data.append(line)
+                    continue
+                command = line[:4].upper()
+                if command == b"DATA":
+                    data = []
+                    self.wfile.write(b"354 go ahead\r\n")
+                elif command == b"QUIT":
+                    self.wfile.write(b"221 bye\r\n")
+                    return
+                else:
+                    self.wfile.write(b"250 ok\r\n")
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(alerts, faults, timeout):
+    directory = tempfile.mkdtemp()
+    player = [shutil.which("true")]
+    spoken = SpokenChannel("Help", directory, player=player)
+    write_alarm(spoken.path, seconds=0.2)  # Stands in for the rendered speech
+    webhook, smtp = webhook_server(0, faults), smtp_server(0, faults)
+    channels = [AlarmChannel(directory, player=player), spoken,
+                WebhookChannel(f"http://127.0.0.1:{webhook.server_address[1]}/sos", timeout=timeout),
+                EmailChannel("127.0.0.1", smtp.server_address[1], "liberate@localhost", ["caregiver@localhost"],
+                             timeout=timeout)]
+    gave_up = []
+    dispatcher = SosDispatcher(channels, on_update=lambda name, state, detail: state == "gave up" and
+                               gave_up.append(name), backoff_s=0.05)
+    time.sleep(0.2)  # Channels prepare on their threads at startup
+    trigger_us, first_ms, channel_ms, failures = [], [], {channel.name: [] for channel in channels}, 0
+    for _ in range(alerts):
+        started = now_ns()
+        alert = dispatcher.trigger("SOS - EMERGENCY HELP NEEDED")
+        trigger_us.append((now_ns() - started) / 1000)
+        deadline = time.time() + 10
+        while len(alert.delivered) + len(gave_up) < len(channels) and time.time() < deadline:
+            time.sleep(0.002)
+        first_ms.append(alert.first_alert_ms())
+        for name, sent_ns in alert.first_ns.items():
+            channel_ms[name].append((sent_ns - alert.triggered_ns) / 1e6)
+        failures += sum(alert.failures.values())
+        if len(alert.delivered) < len(channels):
+            print(f"  alert {alert.id}: only {sorted(alert.delivered)} delivered")
+        dispatcher.acknowledge()
+        gave_up.clear()
+    dispatcher.close()
+    webhook.shutdown()
+    smtp.shutdown()
+    return trigger_us, first_ms, channel_ms, failures
+
+
+def report(label, alerts, results):
+    trigger_us, first_ms, channel_ms, failures = results
+    print(f"{label}: {alerts} alerts, {failures} failed attempts retried")
+    print(f"  trigger() on the caller: median {statistics.median(trigger_us):.0f} µs, max {max(trigger_us):.0f} µs")
+    missing = first_ms.count(None)
+    first = sorted(ms for ms in first_ms if ms is not None)
+    print(f"  first alert: median {statistics.median(first):.1f}ms, max {first[-1]:.1f}ms "
+          f"(budget {FIRST_ALERT_BUDGET_MS}ms)")
+    for name, times in channel_ms.items():
+        if times:
+            print(f"  {name:<8} out after median {statistics.median(times):7.1f}ms, max {max(times):7.1f}ms, "
+                  f"{len(times)}/{alerts} alerts")
+        else:
+            print(f"  {name:<8} never out")
+    delivered = all(len(times) == alerts for times in channel_ms.values())
+    return not missing and first[-1] <= FIRST_ALERT_BUDGET_MS and delivered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=20)
+    parser.add_argument("--serve", action="store_true", help="run the stand-ins on ports 8025 and 8026 until Ctrl+C")
+    args = parser.parse_args()
+
+    if args.serve:
+        faults = Faults()
+        webhook_server(WEBHOOK_PORT, faults)
+        smtp_server(SMTP_PORT, faults)
+        print(f"Webhook on :{WEBHOOK_PORT}, SMTP on :{SMTP_PORT}, Ctrl+C to stop")
+        seen = 0
+        try:
+            while True:
+                time.sleep(0.2)
+                for channel, _, text in faults.received[seen:]:
+                    print(f"[{time.strftime('%H:%M:%S')}] {channel}: {text.strip()}")
+                seen = len(faults.received)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+    ok = report("Healthy channels", args.alerts, run(args.alerts, Faults(), timeout=2.0))
+    print()
+    faulty = Faults(webhook_failures=2, smtp_stalls=1, stall_s=1.0)
+    ok &= report("Faulty webhook and mail server", args.alerts, run(args.alerts, faulty, timeout=0.3))
+    sys.exit(0 if ok else 1)
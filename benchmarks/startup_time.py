@@ -0,0 +1,87 @@
+# Time from launch to a scanning window, and until every subsystem has reported in
+#
+#   python3 benchmarks/startup_time.py [runs] [--budget-ms 1500]
+#
+# Each run starts a fresh interpreter (offscreen Qt, loopback device, null key
+# injection, a temporary home) that imports main, shows the window and reports:
+#   imports  - main and its imports loaded
+#   window   - MuscleKeyboard built, scan timer running
+#   scanning - first event loop pass with the window shown (time-to-first-scan)
+#   ready    - device, speech, keys and predictions all settled
+# Exits with status 1 when the median time-to-first-scan is over the budget.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+CHILD = r"""
+import json, sys, time
+marks = {}
+sys.path.insert(0, SRC)
+import main
+marks["imports"] = time.time()
+main.DEVICE = "loopback://"
+main.INJECTION_BACKEND = "null"
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = main.MuscleKeyboard()
+marks["window"] = time.time()
+window.show()
+
+def scanning():
+    marks["scanning"] = time.time()
+
+def check_ready():
+    if all(state not in ("connecting", "starting", "loading") for state in window.readiness.values()):
+        marks["ready"] = time.time()
+        window.close()
+        print(json.dumps(marks))
+        app.quit()
+    else:
+        QTimer.singleShot(5, check_ready)
+
+QTimer.singleShot(0, scanning)
+QTimer.singleShot(0, check_ready)
+QTimer.singleShot(10000, app.quit)
+app.exec_()
+"""
+
+MARKS = ("imports", "window", "scanning", "ready")
+
+
+def run_once(home):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", HOME=home, PYTHONDONTWRITEBYTECODE="1")
+    started = time.time()
+    result = subprocess.run([sys.executable, "-c", f"SRC = {SRC!r}\n" + CHILD], env=env,
+                            capture_output=True, text=True, timeout=30)
+    for line in result.stdout.splitlines():
+        if line.startswith("{"):
+            marks = json.loads(line)
+            return {name: (marks[name] - started) * 1000 for name in MARKS if name in marks}
+    raise RuntimeError(f"startup run failed:\n{result.stdout}\n{result.stderr}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", nargs="?", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp()
+    run_once(home)  # Warm the disk cache and build the prediction index once
+    runs = [run_once(home) for _ in range(args.runs)]
+    for name in MARKS:
+        values = [run[name] for run in runs if name in run]
+        print(f"{name:<9} median {statistics.median(values):7.0f} ms   min {min(values):7.0f} ms   "
+              f"max {max(values):7.0f} ms")
+    scanning = statistics.median(run["scanning"] for run in runs)
+    print(f"\ntime-to-first-scan {scanning:.0f} ms, budget {args.budget_ms:.0f} ms")
+    sys.exit(0 if scanning <= args.budget_ms else 1)
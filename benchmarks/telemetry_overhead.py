@@ -0,0 +1,88 @@
+# Telemetry cost: what timed() adds to a call with stats off and on, and how much
+# the two profilers slow down a CPU-bound loop
+#
+#   python3 benchmarks/telemetry_overhead.py [--calls N] [--max-disabled-ns NS]
+#
+# Exits with status 1 when a timed() call with stats off costs more than
+# --max-disabled-ns over a plain call, the instrumentation lives in the scan loop.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from telemetry import PROFILERS, STATS, timed
+
+
+class Scanner:
+    """Stand-in for the GUI methods, a few attribute updates per call"""
+    def __init__(self):
+        self.col = 0
+
+    def move(self):
+        self.col = (self.col + 1) % 10
+
+    @timed("move")
+    def timed_move(self):
+        self.col = (self.col + 1) % 10
+
+
+def per_call_ns(fn, calls):
+    return min(timeit.repeat(fn, number=calls, repeat=5)) / calls * 1e9
+
+
+def work(n=30000):
+    total = 0
+    for i in range(n):
+        total += sum(divmod(i, 7))
+    return total
+
+
+def loop_seconds(rounds=40):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        work()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--max-disabled-ns", type=float, default=300)
+    args = parser.parse_args()
+
+    scanner = Scanner()
+    plain = per_call_ns(scanner.move, args.calls)
+    STATS.enabled = False
+    disabled = per_call_ns(scanner.timed_move, args.calls)
+    count_disabled = per_call_ns(lambda: STATS.count("keys"), args.calls)
+    STATS.enabled = True
+    enabled = per_call_ns(scanner.timed_move, args.calls)
+    count_enabled = per_call_ns(lambda: STATS.count("keys"), args.calls)
+    STATS.enabled = False
+    print(f"plain call:            {plain:7.0f} ns")
+    print(f"timed(), stats off:    {disabled:7.0f} ns  (+{disabled - plain:.0f} ns)")
+    print(f"timed(), stats on:     {enabled:7.0f} ns  (+{enabled - plain:.0f} ns)")
+    print(f"STATS.count off / on:  {count_disabled:7.0f} / {count_enabled:.0f} ns")
+
+    baseline = loop_seconds()
+    print(f"\nCPU loop: {baseline * 1000:.0f} ms unprofiled")
+    directory = tempfile.mkdtemp()
+    for name, profiler_class in PROFILERS.items():
+        profiler = profiler_class()
+        profiler.start()
+        elapsed = loop_seconds()
+        path = os.path.join(directory, f"profile.{name}")
+        profiler.stop(path)
+        extra = f", {profiler.samples} samples" if hasattr(profiler, "samples") else ""
+        print(f"  {name:<9} {elapsed * 1000:5.0f} ms ({elapsed / baseline - 1:+.0%}), "
+              f"{os.path.getsize(path)} byte file{extra}")
+
+    if disabled - plain > args.max_disabled_ns:
+        print(f"\nFAILED: disabled timed() adds {disabled - plain:.0f} ns, budget {args.max_disabled_ns:.0f} ns")
+        sys.exit(1)
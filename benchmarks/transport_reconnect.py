@@ -0,0 +1,145 @@
+# Device transports without hardware: loopback, pty and a TCP device that drops out
+# and comes back
+#
+#   python3 benchmarks/transport_reconnect.py
+#
+# Prints how long the link takes to notice a lost device and to attach again once
+# it is back, and exits with status 1 if any check fails.
+
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from esp32_sim import Esp32Simulator
+from protocol import TWITCH, FrameDecoder, encode_frame
+from transport import MAX_BACKOFF, ReconnectingTransport, open_transport
+
+
+def read_events(link, decoder, count, timeout=5.0):
+    events = []
+    deadline = time.perf_counter() + timeout
+    while len(events) < count and time.perf_counter() < deadline:
+        events += [event for event in decoder.feed(link.read_chunk()) if event.kind == "twitch"]
+    return events
+
+
+class TcpDevice:
+    """Listens on a local port and sends a twitch frame every interval to whoever connects"""
+
+    def __init__(self, port=0, interval=0.02):
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.port = self.server.getsockname()[1]
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        with conn:
+            seq = 0
+            while not self.stopped.wait(self.interval):
+                try:
+                    conn.sendall(encode_frame(TWITCH, seq, seq))
+                except OSError:
+                    return
+                seq += 1
+
+    def close(self):
+        self.stopped.set()
+        self.server.close()
+        self.thread.join()
+
+
+def check(name, ok, detail=""):
+    print(f"{name:<44} {'ok' if ok else 'FAILED'} {detail}")
+    return ok
+
+
+if __name__ == "__main__":
+    results = []
+
+    # No device at all: the link must never hold its thread for long
+    link = ReconnectingTransport("tcp://127.0.0.1:9")
+    started = time.perf_counter()
+    longest = 0.0
+    while time.perf_counter() - started < 2:
+        call = time.perf_counter()
+        link.read_chunk()
+        longest = max(longest, time.perf_counter() - call)
+    link.close()
+    results.append(check("no device: read_chunk never blocks long", longest < MAX_BACKOFF + 1, f"(longest call {longest * 1000:.0f} ms)"))
+
+    # Loopback: the in-process simulator
+    transport = open_transport("loopback://")
+    for _ in range(10):
+        transport.device.twitch()
+    events = read_events(transport, FrameDecoder(), 10)
+    transport.close()
+    results.append(check("loopback: 10 twitches", len(events) == 10))
+
+    # Pty by path, then the simulator goes away
+    sim = Esp32Simulator(binary=True)
+    states = []
+    link = ReconnectingTransport(f"pty://{sim.port_name}", on_status=lambda state, url: states.append(state))
+    decoder = FrameDecoder()
+    for _ in range(10):
+        sim.twitch()
+    events = read_events(link, decoder, 10)
+    sim.close()
+    deadline = time.perf_counter() + 5
+    while "lost" not in states and time.perf_counter() < deadline:
+        link.read_chunk()
+    link.close()
+    results.append(check("pty: 10 twitches then the device is lost", len(events) == 10 and "lost" in states,
+                         str(states)))
+
+    # TCP device that drops the connection and comes back on the same port, read the
+    # way SerialThread does it: one thread calling read_chunk() in a loop
+    device = TcpDevice()
+    states = []
+    received = []
+    link = ReconnectingTransport(f"tcp://127.0.0.1:{device.port}",
+                                 on_status=lambda state, url: states.append((state, time.perf_counter())))
+    stop = threading.Event()
+
+    def reader():
+        decoder = FrameDecoder()
+        while not stop.is_set():
+            chunk = link.read_chunk()
+            if link.transport is None:
+                decoder = FrameDecoder()
+            received.extend(time.perf_counter() for event in decoder.feed(chunk) if event.kind == "twitch")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    time.sleep(0.5)
+    before = len(received)
+    dropped_at = time.perf_counter()
+    device.close()
+    time.sleep(2.0)  # Device away, the link keeps retrying with backoff
+    device = TcpDevice(device.port)
+    returned_at = time.perf_counter()
+    time.sleep(MAX_BACKOFF + 1)
+    stop.set()
+    link.cancel()
+    thread.join()
+    link.close()
+    device.close()
+    lost = [at for state, at in states if state == "lost" and at >= dropped_at]
+    connected = [at for state, at in states if state == "connected" and at >= returned_at]
+    after = [at for at in received if at >= returned_at]
+    results.append(check("tcp: events before the drop", before > 10, f"({before})"))
+    results.append(check("tcp: loss noticed", bool(lost), f"({(lost[0] - dropped_at) * 1000:.0f} ms)" if lost else ""))
+    results.append(check("tcp: attached again after the device returned", bool(connected) and len(after) > 10,
+                         f"({(connected[0] - returned_at) * 1000:.0f} ms, first event after "
+                         f"{(after[0] - returned_at) * 1000:.0f} ms)" if connected and after else ""))
+
+    sys.exit(0 if all(results) else 1)
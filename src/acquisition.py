@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+from multiprocessing import shared_memory
+
+from device import DevicePipeline
+from latency import now_ns
+from protocol import Event
+from transport import BAUD_RATE, ReconnectingTransport
+
+RING_SIZE = 1 << 20  # Bytes, about two minutes of raw samples if the GUI stops draining
+STATS_INTERVAL_S = 1.0  # How often the acquisition process publishes its decoder and fusion stats
+RESTART_BACKOFF_S = 1.0  # Before starting a crashed acquisition process again
+
+# Ring layout: head and tail on cache lines of their own, then the records
+HEAD = 0  # Bytes ever written, only the producer stores it
+DROPPED = 8  # Records the producer could not fit
+TAIL = 64  # Bytes ever read, only the consumer stores it
+DATA = 128
+# length, kind, seq, device_ms, rx_ns (bytes arrived), event_ns (when it happened, host clock),
+# published_ns (detection done), then the payload, padded to 8 bytes. seq and device_ms
+# are -1 for None
+RECORD = struct.Struct("<I12sqqqqq")
+WRAP = 0xFFFFFFFF  # In the length field: the rest of the buffer is padding, go on at the start
+COUNTER = struct.Struct("<Q")
+FENCE = threading.Lock()  # Never contended, see fence()
+
+
+def fence():
+    """Memory barrier between the ring's data and its counters
+
+    Python has no fence of its own. Taking and releasing a lock does the job:
+    CPython's locks are POSIX semaphores or mutexes, and POSIX has sem_wait,
+    sem_post and the mutex calls synchronize memory.
+    """
+    with FENCE:
+        pass
+
+
+# Single-producer, single-consumer ring of records in shared memory
+#
+# No lock between the two sides: the producer writes a record and only then moves
+# head, the consumer copies a record out and only then moves tail, and each counter
+# has one writer. Aligned 8-byte counter stores land whole, but a weakly ordered CPU
+# (ARM) may make them visible before the record stores or loads next to them, so
+# fence() separates the two: after a record is written and before head moves, after
+# head is read and before the record is, and after it is copied and before tail
+# moves. x86 keeps that order by itself. A full ring drops the new record rather
+# than ever blocking the producer.
+class SharedRing:
+    def __init__(self, name=None, size=RING_SIZE):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=DATA + size)
+            self.shm.buf[:DATA] = bytes(DATA)
+            self.owner = True
+        else:
+            self.shm = attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.capacity = (self.shm.size - DATA) & ~7
+        # Each side caches its own counter, a restarted producer carries on from the shared one
+        self.head = COUNTER.unpack_from(self.buf, HEAD)[0]
+        self.tail = COUNTER.unpack_from(self.buf, TAIL)[0]
+
+    def put(self, event, rx_ns, event_ns, published_ns=None):
+        """Append one record, producer only. False when the ring is full"""
+        payload = event.payload or b""
+        length = RECORD.size + len(payload)
+        size = (length + 7) & ~7
+        if size > self.capacity:
+            raise ValueError(f"{size} byte record does not fit a {self.capacity} byte ring")
+        head = self.head
+        offset = head % self.capacity
+        pad = self.capacity - offset if self.capacity - offset < size else 0
+        if head + pad + size - COUNTER.unpack_from(self.buf, TAIL)[0] > self.capacity:
+            COUNTER.pack_into(self.buf, DROPPED, COUNTER.unpack_from(self.buf, DROPPED)[0] + 1)
+            return False
+        if pad:
+            struct.pack_into("<I", self.buf, DATA + offset, WRAP)
+            head += pad
+            offset = 0
+        start = DATA + offset
+        RECORD.pack_into(self.buf, start, length, str(event.kind).encode(), -1 if event.seq is None else event.seq,
+                         -1 if event.device_ms is None else event.device_ms, rx_ns, event_ns,
+                         now_ns() if published_ns is None else published_ns)
+        self.buf[start + RECORD.size:start + RECORD.size + len(payload)] = payload
+        self.head = head + size
+        fence()  # The record before head
+        COUNTER.pack_into(self.buf, HEAD, self.head)  # Publishes the record
+        return True
+
+    def get(self):
+        """Next (Event, rx_ns, event_ns, published_ns) or None when empty, consumer only"""
+        head = COUNTER.unpack_from(self.buf, HEAD)[0]
+        if self.tail == head:
+            return None
+        fence()  # Head before the records under it
+        while self.tail != head:
+            offset = self.tail % self.capacity
+            if struct.unpack_from("<I", self.buf, DATA + offset)[0] == WRAP:
+                self.tail += self.capacity - offset
+                continue
+            start = DATA + offset
+            length, kind, seq, device_ms, rx_ns, event_ns, published_ns = RECORD.unpack_from(self.buf, start)
+            payload = bytes(self.buf[start + RECORD.size:start + length])
+            event = Event(kind.rstrip(b"\0").decode(), None if seq < 0 else seq,
+                          None if device_ms < 0 else device_ms, payload)
+            self.tail += (length + 7) & ~7
+            fence()  # The copy before tail frees its space
+            COUNTER.pack_into(self.buf, TAIL, self.tail)
+            return event, rx_ns, event_ns, published_ns
+        return None
+
+    def backlog(self):
+        """Bytes written and not read yet, 0 once closed"""
+        if self.buf is None:
+            return 0  # The GUI can still ask while it shuts down
+        return COUNTER.unpack_from(self.buf, HEAD)[0] - COUNTER.unpack_from(self.buf, TAIL)[0]
+
+    @property
+    def dropped(self):
+        if self.buf is None:
+            return 0
+        return COUNTER.unpack_from(self.buf, DROPPED)[0]
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def attach(name):
+    """Open an existing segment without this process's resource tracker unlinking it at exit"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# The acquisition process: owns the device link, detection and fusion
+#
+# Runs the same DevicePipeline as SerialThread, but in an interpreter of its own so
+# nothing the GUI does (a slow repaint, pyttsx3, a GC pause) holds the GIL it needs.
+# Events and raw sample frames go into the ring; the doorbell (a byte on stdout)
+# rings for everything but samples. Commands come in on stdin, one per line, and
+# stdin closing (the GUI exited or crashed) ends the process. With a drive_url the
+# wheelchair's mobility process is started from here, next to the device it watches.
+def acquire(ring_name, url, baud_rate, rules, offsets_ms, profile_name, drive_url=None):
+    ring = SharedRing(ring_name)
+    doorbell = sys.stdout.fileno()
+    sys.stdout = sys.stderr  # Warnings printed on the way must not ring it
+    link = ReconnectingTransport(url, baud_rate)
+    pending = []  # Published since the last doorbell
+    lock = threading.Lock()  # Mobility changes are published from the MobilityClient's thread
+
+    def publish(event, rx_ns, event_ns=None):
+        with lock:
+            if ring.put(event, rx_ns, rx_ns if event_ns is None else event_ns) and event.kind != "samples":
+                pending.append(event.kind)
+
+    def ring_doorbell():
+        with lock:
+            if not pending:
+                return
+            pending.clear()
+        os.write(doorbell, b"\n")
+
+    mobility = None
+    if drive_url:
+        from mobility import MobilityClient, mobility_event
+
+        def mobility_changed(motion, reason):
+            publish(mobility_event(motion, reason), now_ns())
+            ring_doorbell()
+
+        mobility = MobilityClient(drive_url, mobility_changed)
+        mobility.start()
+
+    def calibrated(params):
+        publish(Event("calibrated", None, None, json.dumps(params).encode()), now_ns())
+
+    def link_status(state, link_url):
+        if state == "connected":
+            device.connected()
+        event = Event("link", None, None, f"{state} {link_url}".encode())
+        if mobility is not None:
+            mobility.observe(event, now_ns())
+        publish(event, now_ns())
+
+    def samples(event, rx_ns):
+        if mobility is not None:
+            mobility.observe(event, rx_ns)
+        publish(event, rx_ns)
+
+    device = DevicePipeline(link.write, rules, offsets_ms, profile_name, on_calibrated=calibrated,
+                            on_samples=samples)
+    link.on_status = link_status
+
+    def commands():
+        for line in sys.stdin:
+            command, _, argument = line.strip().partition(" ")
+            if command == "send":
+                link.write(bytes.fromhex(argument))
+            elif command == "calibrate":
+                device.request_calibration(argument)
+            elif command == "drive" and mobility is not None:
+                mobility.drive(argument)
+        link.cancel()  # stdin closed
+
+    threading.Thread(target=commands, daemon=True).start()
+    device.load_profile()
+    next_stats_ns = now_ns()
+    while not link.cancelled.is_set():
+        chunk = link.read_chunk()
+        rx_ns = now_ns()
+        for event in device.feed(chunk, rx_ns) if chunk else ():
+            event_ns = device.clock.host_ns(event.device_ms, rx_ns)
+            if mobility is not None:
+                mobility.observe(event, rx_ns, event_ns)
+            if event.kind != "heartbeat":  # Only the watchdog wants those
+                publish(event, rx_ns, event_ns)
+        if rx_ns >= next_stats_ns:
+            next_stats_ns = rx_ns + int(STATS_INTERVAL_S * 1e9)
+            stats = {"frames": device.decoder.stats(), "fusion": device.fusion.stats()}
+            if mobility is not None:
+                stats["mobility"] = mobility.stats()
+            publish(Event("stats", None, None, json.dumps(stats).encode()), rx_ns)
+        ring_doorbell()
+    if mobility is not None:
+        mobility.close()
+    link.close()
+    ring.close()
+
+
+# The GUI's end: starts and restarts the acquisition process and reads its ring
+#
+# wait() blocks on the doorbell and is meant for a thread of its own, drain() and
+# the commands are for the GUI thread. Both processes stamp times with
+# perf_counter_ns, which is one system-wide monotonic clock on Linux, macOS and
+# Windows, so rx_ns and event_ns compare directly with the GUI's now_ns().
+class AcquisitionClient:
+    def __init__(self, url, baud_rate=BAUD_RATE, rules=(), offsets_ms=None, profile_name="default",
+                 ring_size=RING_SIZE, drive_url=None):
+        self.args = [url, str(baud_rate), json.dumps(list(rules)), json.dumps(offsets_ms or {}), profile_name]
+        if drive_url:
+            self.args += ["--drive", drive_url]
+        self.ring = SharedRing(size=ring_size)
+        self.process = None
+        self.stopped = threading.Event()
+        self.restarts = 0
+        self.samples = 0
+        self.last_stats = {}
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.ring.name] + self.args,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        os.set_blocking(self.process.stdin.fileno(), False)  # A hung process must not block command()
+
+    def wait(self):
+        """Block until the doorbell rings, restarting the process if it died. False once stopped"""
+        while not self.stopped.is_set():
+            if self.process is None:
+                self.start()
+            if os.read(self.process.stdout.fileno(), 4096):
+                return True
+            if self.stopped.is_set():
+                break
+            code = self.process.wait()
+            print(f"[WARN] Acquisition process exited with {code}, restarting")
+            self.restarts += 1
+            self.process = None
+            self.stopped.wait(RESTART_BACKOFF_S)
+        return False
+
+    def drain(self):
+        """Yield (Event, rx_ns, event_ns, published_ns) for everything but samples and stats"""
+        while True:
+            record = self.ring.get()
+            if record is None:
+                return
+            kind = record[0].kind
+            if kind == "samples":
+                self.samples += 1
+            elif kind == "stats":
+                self.last_stats = json.loads(record[0].payload)
+            else:
+                yield record
+
+    def command(self, line):
+        process = self.process
+        if process is None:
+            return False
+        try:
+            # Lines are far below PIPE_BUF, each goes in whole or fails with BlockingIOError
+            os.write(process.stdin.fileno(), line.encode() + b"\n")
+        except OSError:
+            return False  # Restarting, or the process stopped reading and its pipe is full
+        return True
+
+    def send_command(self, command):
+        return self.command(f"send {command.hex()}")
+
+    def request_calibration(self, action):
+        self.command(f"calibrate {action}")
+
+    def drive(self, motion):
+        """A mobility.MOTIONS name, for the mobility process the acquisition process started"""
+        self.command(f"drive {motion}")
+
+    def stats(self):
+        return dict(self.last_stats, ring={"backlog": self.ring.backlog(), "dropped": self.ring.dropped,
+                                           "samples": self.samples, "restarts": self.restarts})
+
+    def stop(self):
+        self.stopped.set()
+        process = self.process
+        if process is not None:
+            process.stdin.close()  # The process ends at its next read timeout
+            try:
+                process.wait(2.0)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def close(self):
+        self.ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ring")
+    parser.add_argument("url")
+    parser.add_argument("baud_rate", type=int)
+    parser.add_argument("rules", type=json.loads)
+    parser.add_argument("offsets_ms", type=json.loads)
+    parser.add_argument("profile_name")
+    parser.add_argument("--drive", help="drive controller URL, starts the mobility process")
+    args = parser.parse_args()
+    acquire(args.ring, args.url, args.baud_rate, args.rules, args.offsets_ms, args.profile_name, args.drive)
@@ -0,0 +1,200 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# Per-user detector profiles
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".liberate", "profiles")
+
+# Feature values are binned on a log scale so fitting stays O(bins) however long we record
+BIN_EDGES = np.logspace(-4, 1, 257)  # g
+
+WINDOW_MS = 250  # Rest and normal-use windows, one max value per window
+CUE_WINDOW_MS = 1200  # After a "twitch now" cue the twitch has to land within this window
+REFIT_WINDOWS = 120  # Refit every 30s of normal use
+HISTOGRAM_DECAY = 0.999  # Per refined window, so recent behaviour outweighs old sessions
+MIN_WINDOWS = 5  # Per class before a fit is attempted
+
+FEATURES = ("rms", "magnitude")
+
+
+# Log-binned histogram of window maxima for one class (rest or twitch)
+class FeatureHistogram:
+    def __init__(self, counts=None):
+        self.counts = np.zeros(len(BIN_EDGES) - 1) if counts is None else np.asarray(counts, dtype=np.float64)
+
+    def add(self, values):
+        self.counts += np.histogram(np.clip(values, BIN_EDGES[0], BIN_EDGES[-1]), BIN_EDGES)[0]
+
+    def decay(self, factor):
+        self.counts *= factor
+
+    @property
+    def total(self):
+        return self.counts.sum()
+
+    def fraction_above(self):
+        """Fraction of windows above each upper bin edge"""
+        return 1.0 - np.cumsum(self.counts) / max(self.total, 1e-12)
+
+    def percentile(self, pct):
+        cumulative = np.cumsum(self.counts) / max(self.total, 1e-12)
+        return BIN_EDGES[1:][min(len(cumulative) - 1, np.searchsorted(cumulative, pct / 100))]
+
+
+def fit_threshold(rest, twitch):
+    """Pick the threshold maximising TPR - FPR (Youden's J) and a release level below it"""
+    tpr = twitch.fraction_above()
+    fpr = rest.fraction_above()
+    j = tpr - fpr
+    # Several edges usually tie when the classes separate cleanly, take the middle one for margin
+    ties = np.flatnonzero(j >= j.max() - 1e-9)
+    best = int(ties[len(ties) // 2])
+    threshold = BIN_EDGES[best + 1]
+    # Hysteresis: re-arm halfway (on the log scale) between the rest tail and the threshold,
+    # or at the typical rest level when the classes overlap
+    rest_tail = rest.percentile(99)
+    release = np.sqrt(threshold * rest_tail) if rest_tail < threshold else min(rest.percentile(50), threshold)
+    return float(threshold), float(release), float(tpr[best]), float(fpr[best])
+
+
+# Collects rest/twitch feature windows, fits the detector and refines it during normal use
+class Calibrator:
+    def __init__(self, sample_rate, profile=None):
+        self.sample_rate = sample_rate
+        self.window = int(sample_rate * WINDOW_MS / 1000)
+        self.cue_window = int(sample_rate * CUE_WINDOW_MS / 1000)
+        self.rest = {name: FeatureHistogram() for name in FEATURES}
+        self.twitch = {name: FeatureHistogram() for name in FEATURES}
+        if profile is not None and "histograms" in profile:
+            for name in FEATURES:
+                self.rest[name] = FeatureHistogram(profile["histograms"]["rest"][name])
+                self.twitch[name] = FeatureHistogram(profile["histograms"]["twitch"][name])
+        self.phase = None  # "rest", "twitch" or "refine"
+        self.pending = {name: np.zeros(0) for name in FEATURES}
+        self.pending_start = 0  # Sample index of pending[...][0]
+        self.cues = []
+        self.refined_windows = 0
+        self.recent_detections = []
+
+    def begin_phase(self, phase):
+        self.phase = phase
+        self.pending = {name: np.zeros(0) for name in FEATURES}
+        self.cues = []
+        self.refined_windows = 0
+        if phase in ("rest", "twitch"):
+            # A fresh calibration replaces whatever was learnt before
+            histograms = self.rest if phase == "rest" else self.twitch
+            for name in FEATURES:
+                histograms[name] = FeatureHistogram()
+
+    def cue(self, sample_index):
+        """The user was just told to twitch"""
+        self.cues.append(sample_index)
+
+    def observe(self, start_index, rms, magnitude, detections):
+        """Feed the detector features for one block, returns True when a refit is due"""
+        if self.phase is None:
+            return False
+        features = {"rms": rms, "magnitude": magnitude}
+        if not len(self.pending["rms"]):
+            self.pending_start = start_index
+        for name in FEATURES:
+            self.pending[name] = np.concatenate((self.pending[name], features[name]))
+        self.recent_detections += detections
+
+        if self.phase == "twitch":
+            return self.take_cue_windows()
+        return self.take_windows()
+
+    def take_cue_windows(self):
+        end = self.pending_start + len(self.pending["rms"])
+        while self.cues and self.cues[0] + self.cue_window <= end:
+            cue = self.cues.pop(0) - self.pending_start
+            for name in FEATURES:
+                values = self.pending[name][max(0, cue):cue + self.cue_window]
+                if len(values):
+                    self.twitch[name].add(values.max(keepdims=True))
+        keep_from = (self.cues[0] - self.pending_start) if self.cues else len(self.pending["rms"])
+        self.drop_pending(max(0, keep_from))
+        return False
+
+    def take_windows(self):
+        # The newest full window is held back so a detection landing just after it still marks it
+        count = len(self.pending["rms"]) // self.window - (self.phase == "refine")
+        if count <= 0:
+            return False
+        used = count * self.window
+        maxima = {name: self.pending[name][:used].reshape(count, self.window).max(axis=1) for name in FEATURES}
+        if self.phase == "rest":
+            for name in FEATURES:
+                self.rest[name].add(maxima[name])
+        else:
+            # Normal use: the window after each detection is a twitch, windows well clear of one are rest
+            near = np.zeros(count, dtype=bool)
+            for index in self.recent_detections:
+                w = (index - self.pending_start) // self.window
+                near[max(0, w - 1):max(0, w + 2)] = True
+            starts = [index - self.pending_start for index in self.recent_detections
+                      if self.pending_start <= index < self.pending_start + used]
+            for name in FEATURES:
+                self.rest[name].decay(HISTOGRAM_DECAY ** count)
+                self.twitch[name].decay(HISTOGRAM_DECAY ** count)
+                if starts:
+                    self.twitch[name].add([self.pending[name][start:start + self.window].max() for start in starts])
+                self.rest[name].add(maxima[name][~near])
+            self.refined_windows += count
+        self.recent_detections = [i for i in self.recent_detections if i >= self.pending_start + used]
+        self.drop_pending(used)
+        if self.phase == "refine" and self.refined_windows >= REFIT_WINDOWS:
+            self.refined_windows = 0
+            return True
+        return False
+
+    def drop_pending(self, count):
+        for name in FEATURES:
+            self.pending[name] = self.pending[name][count:]
+        self.pending_start += count
+
+    def fit(self):
+        """Detector parameters for both host (rms) and device (magnitude) detection, or None"""
+        if self.rest["rms"].total < MIN_WINDOWS or self.twitch["rms"].total < MIN_WINDOWS:
+            return None
+        params = {"sample_rate": self.sample_rate}
+        for name in FEATURES:
+            threshold, release, tpr, fpr = fit_threshold(self.rest[name], self.twitch[name])
+            params[f"{name}_threshold"] = threshold
+            params[f"{name}_release"] = release
+            params[f"{name}_tpr"] = tpr
+            params[f"{name}_fpr"] = fpr
+        return params
+
+    def profile(self, params):
+        profile = dict(params, updated=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        profile["histograms"] = {
+            "rest": {name: self.rest[name].counts.tolist() for name in FEATURES},
+            "twitch": {name: self.twitch[name].counts.tolist() for name in FEATURES},
+        }
+        return profile
+
+
+def profile_path(user):
+    return os.path.join(PROFILE_DIR, f"{user}.json")
+
+
+def load_profile(user):
+    try:
+        with open(profile_path(user)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_profile(user, profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(user)
+    # Write then rename so a crash never leaves a half-written profile
+    with open(path + ".tmp", "w") as f:
+        json.dump(profile, f)
+    os.replace(path + ".tmp", path)
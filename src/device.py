@@ -0,0 +1,137 @@
+import queue
+
+from protocol import FrameDecoder, Event, command_raw_mode, command_set_threshold, command_status, twitch_sensor
+from event_bus import FusionRule, SensorFusion
+from scan_scheduler import ClockSync
+
+SENSOR_RULES = [("select", {"accel": 1.0})]  # Default sensor rules, as in main.py: no IR sensor
+
+
+# Everything between one device's bytes and the actions they mean
+#
+# Decodes frames, keeps the device clock in sync, runs twitch detection and
+# calibration on raw sample frames and fuses sensor twitches into actions. feed()
+# and everything it calls run on one thread (the SerialThread, the acquisition
+# process or the hub loop), other threads only queue calibration requests.
+class DevicePipeline:
+    def __init__(self, send_command, rules, offsets_ms=None, profile_name="default", on_calibrated=None,
+                 on_samples=None):
+        self.send_command = send_command  # Dropped while there is no device
+        self.profile_name = profile_name
+        self.on_calibrated = on_calibrated  # Called with the fitted parameters, None if there was too little data
+        self.on_samples = on_samples  # Called with (event, rx_ns) for every raw sample frame once detection ran
+        self.fusion = SensorFusion([FusionRule(action, weights) for action, weights in rules], offsets_ms)
+        self.decoder = FrameDecoder()  # Binary frames, falls back to text lines from old firmware
+        self.clock = ClockSync()  # Device timestamps -> host time, read by the GUI for twitches
+        self.awaiting_device = False  # Connected but nothing received yet
+        self.detector = None  # Created on the first raw sample frame
+        self.calibrator = None
+        self.calibration_requests = queue.Queue()  # Handled between sample blocks
+        self.profile = None
+
+    def load_profile(self):
+        # Calibration pulls in numpy, so this is called on the device thread and not at import
+        from calibration import load_profile
+        self.profile = load_profile(self.profile_name)
+
+    def connected(self):
+        self.decoder = FrameDecoder()  # A new connection restarts the sequence numbers
+        self.clock = ClockSync()  # And maybe the device clock
+        self.awaiting_device = True
+        self.device_ready()
+
+    def device_ready(self):
+        self.send_command(command_status())  # The device may have been switched on before we connected
+        if self.profile is not None:
+            # A calibrated user gets host-side detection with their own thresholds
+            self.send_command(command_raw_mode(True))
+
+    def feed(self, chunk, rx_ns):
+        """Events for the bytes received at rx_ns, twitches already turned into actions"""
+        if self.awaiting_device:
+            # Opening a USB port resets the ESP32 and it misses commands until it
+            # prints its boot banner, so repeat them once it talks
+            self.awaiting_device = False
+            self.device_ready()
+        events = []
+        dropped = self.decoder.sequence.dropped
+        for event in self.decoder.feed(chunk):
+            if event.device_ms is not None:
+                self.clock.observe(event.device_ms, rx_ns)
+            if event.kind == "samples":
+                events += filter(None, (self.fuse(twitch, rx_ns) for twitch in self.detect(event)))
+                if self.on_samples is not None:
+                    self.on_samples(event, rx_ns)
+            else:
+                event = self.fuse(event, rx_ns)
+                if event is not None:
+                    events.append(event)
+        if self.decoder.sequence.dropped != dropped:
+            print(f"[WARN] {self.decoder.sequence.dropped - dropped} frame(s) lost, stats: {self.decoder.stats()}")
+        return events
+
+    def fuse(self, event, rx_ns):
+        if event.kind != "twitch":
+            return event
+        # Channels are aligned on the device clock, text events only have the host's
+        time_ms = event.device_ms if event.device_ms is not None else rx_ns / 1e6
+        action = self.fusion.observe(twitch_sensor(event), time_ms)
+        return None if action is None else event._replace(kind=action)
+
+    def detect(self, event):
+        # Raw sample mode: run twitch detection here and hand on plain twitch events
+        from dsp import decode_samples
+        period_us, samples = decode_samples(event.payload)
+        if self.detector is None:
+            self.create_detector(1_000_000 // period_us)
+        self.handle_calibration_requests()
+        start_index = self.detector.samples_seen
+        detections = self.detector.process(samples)
+        if self.calibrator.observe(start_index, self.detector.last_rms, self.detector.last_magnitude, detections):
+            # Periodic refinement from normal use, runs here so the GUI never waits on it
+            self.apply_calibration(self.calibrator.fit(), push=False)
+        last_index = start_index + len(samples) - 1
+        return [Event("twitch", event.seq, event.device_ms - (last_index - index) * period_us // 1000, b"")
+                for index in detections]
+
+    def create_detector(self, sample_rate):
+        from calibration import Calibrator
+        from dsp import TwitchDetector
+        self.detector = TwitchDetector(sample_rate=sample_rate)
+        self.calibrator = Calibrator(sample_rate, self.profile)
+        if self.profile is not None:
+            self.detector.configure(self.profile["rms_threshold"], self.profile["rms_release"])
+            self.calibrator.begin_phase("refine")
+
+    def request_calibration(self, action):
+        """Queue a calibration step from any thread: "rest", "twitch", "cue" or "fit\""""
+        self.calibration_requests.put(action)
+
+    def handle_calibration_requests(self):
+        while True:
+            try:
+                action = self.calibration_requests.get_nowait()
+            except queue.Empty:
+                return
+            if action == "cue":
+                self.calibrator.cue(self.detector.samples_seen)
+            elif action == "fit":
+                params = self.calibrator.fit()
+                self.apply_calibration(params)
+                self.calibrator.begin_phase("refine")
+                if self.on_calibrated is not None:
+                    self.on_calibrated(params)
+            else:
+                self.calibrator.begin_phase(action)
+
+    def apply_calibration(self, params, push=True):
+        if params is None:
+            return
+        self.detector.configure(params["rms_threshold"], params["rms_release"])
+        if push:
+            # The device keeps its own magnitude threshold in NVS for when raw mode is off,
+            # refinements are not pushed so the flash is not rewritten every few seconds
+            self.send_command(command_set_threshold(params["magnitude_threshold"], params["magnitude_release"]))
+        from calibration import save_profile
+        self.profile = self.calibrator.profile(params)
+        save_profile(self.profile_name, self.profile)
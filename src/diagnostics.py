@@ -0,0 +1,78 @@
+import time
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import QComboBox, QLabel, QPlainTextEdit, QPushButton, QTabWidget, QVBoxLayout, QWidget
+
+from telemetry import PROFILERS, STATS
+
+REFRESH_MS = 500
+
+
+# Live stats and a profiler switch for whoever looks after the setup, opened with
+# Ctrl+D. It is a separate window so the scan never walks into it.
+class DiagnosticsPanel(QTabWidget):
+    def __init__(self, sources=None):
+        super().__init__()
+        self.setWindowTitle("Liberate - Diagnostics")
+        self.resize(640, 480)
+        self.sources = sources or {}  # title -> callable returning a line of extra state
+        self.profiler = None
+
+        stats_tab = QWidget()
+        layout = QVBoxLayout(stats_tab)
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(self.stats_view)
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(STATS.reset)
+        layout.addWidget(reset_button)
+        self.addTab(stats_tab, "Stats")
+
+        profiler_tab = QWidget()
+        layout = QVBoxLayout(profiler_tab)
+        self.profiler_kind = QComboBox()
+        self.profiler_kind.addItems(list(PROFILERS))
+        layout.addWidget(self.profiler_kind)
+        self.profiler_button = QPushButton("Start profiling")
+        self.profiler_button.clicked.connect(self.toggle_profiler)
+        layout.addWidget(self.profiler_button)
+        self.profiler_label = QLabel("cprofile: GUI thread, pstats file. sampling: every thread, collapsed stacks.")
+        self.profiler_label.setWordWrap(True)
+        layout.addWidget(self.profiler_label)
+        layout.addStretch()
+        self.addTab(profiler_tab, "Profiler")
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        STATS.enabled = True  # Collecting from now on, Reset starts over
+        self.refresh()
+        self.timer.start(REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        lines = [f"{title}: {source()}" for title, source in self.sources.items()]
+        self.stats_view.setPlainText("\n".join(lines) + "\n\n" + STATS.report())
+
+    def toggle_profiler(self):
+        if self.profiler is None:
+            kind = self.profiler_kind.currentText()
+            self.profiler = PROFILERS[kind]()
+            self.profiler.start()
+            self.profiler_path = time.strftime(f"profile-%Y%m%d-%H%M%S.{'prof' if kind == 'cprofile' else 'txt'}")
+            self.profiler_button.setText("Stop and save")
+            self.profiler_kind.setEnabled(False)
+            self.profiler_label.setText(f"Profiling ({kind})...")
+        else:
+            self.profiler.stop(self.profiler_path)
+            self.profiler = None
+            self.profiler_button.setText("Start profiling")
+            self.profiler_kind.setEnabled(True)
+            self.profiler_label.setText(f"Profile written to {self.profiler_path}")
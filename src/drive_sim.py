@@ -0,0 +1,73 @@
+import os
+import selectors
+import sys
+import threading
+import tty
+
+from latency import now_ns
+from mobility import DRIVE_PAYLOAD
+from protocol import FrameDecoder
+
+MOTOR_TIMEOUT_S = 0.1  # The motors stop when no drive frame came for this long
+
+
+# Pty stand-in for the wheelchair's drive controller
+#
+# Decodes the drive frames mobility.MobilityController sends and keeps every one with the
+# host time it arrived, and stops the motors by itself when frames stop coming, as
+# the real controller must: that is what stops the chair when the host hangs.
+class DriveSimulator:
+    def __init__(self, timeout_s=MOTOR_TIMEOUT_S):
+        self.timeout_ns = int(timeout_s * 1e9)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.decoder = FrameDecoder()
+        self.frames = []  # (arrival ns, linear mm/s, angular mrad/s, sent ms by the sender's clock)
+        self.motion = (0, 0)
+        self.changes = []  # (ns, (linear, angular), "frame" or "timeout") whenever the motors change
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.master, selectors.EVENT_READ)
+        while not self.stopped.is_set():
+            ready = selector.select(self.timeout_ns / 4e9)
+            rx_ns = now_ns()
+            if ready:
+                for event in self.decoder.feed(os.read(self.master, 4096)):
+                    if event.kind == "drive":
+                        motion = DRIVE_PAYLOAD.unpack(event.payload)
+                        self.frames.append((rx_ns, *motion, event.device_ms))
+                        self.set_motion(motion, rx_ns, "frame")
+            elif self.motion != (0, 0) and self.frames and rx_ns - self.frames[-1][0] > self.timeout_ns:
+                self.set_motion((0, 0), rx_ns, "timeout")
+        selector.close()
+
+    def set_motion(self, motion, ns, cause):
+        if motion != self.motion:
+            self.motion = motion
+            self.changes.append((ns, motion, cause))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+if __name__ == "__main__":
+    # Manual use: point MOBILITY_DEVICE in main.py at the printed device
+    sim = DriveSimulator()
+    print(f"Simulated drive controller on {sim.port_name}, Ctrl+C to quit")
+    shown = 0
+    try:
+        while True:
+            sim.stopped.wait(0.1)
+            for ns, (linear, angular), cause in sim.changes[shown:]:
+                print(f"{ns / 1e9:10.3f}s  linear {linear:>5}mm/s  angular {angular:>5}mrad/s  ({cause})")
+            shown = len(sim.changes)
+    except KeyboardInterrupt:
+        sim.close()
@@ -0,0 +1,168 @@
+import numpy as np
+
+# ADXL345 in full resolution mode reports 256 counts per g
+COUNTS_PER_G = 256.0
+
+DEFAULT_SAMPLE_RATE = 1000  # Hz, matches RAW_SAMPLE_RATE in interface.ino
+
+
+def decode_samples(payload):
+    """Unpack a samples frame: u16 sample period in us, then int16 x/y/z triples"""
+    period_us = int.from_bytes(payload[:2], "little")
+    samples = np.frombuffer(payload, dtype="<i2", offset=2).reshape(-1, 3)
+    return period_us, samples
+
+
+# Fixed-size ring buffer of the most recent samples, used to keep filter state across blocks
+class RingBuffer:
+    def __init__(self, size, columns=None, dtype=np.float64):
+        shape = (size,) if columns is None else (size, columns)
+        self.data = np.zeros(shape, dtype=dtype)
+        self.size = size
+        self.count = 0  # Total samples ever written
+        self.pos = 0
+
+    def extend(self, block):
+        n = len(block)
+        if n >= self.size:
+            self.data[:] = block[-self.size:]
+            self.pos = 0
+        else:
+            first = min(n, self.size - self.pos)
+            self.data[self.pos:self.pos + first] = block[:first]
+            self.data[:n - first] = block[first:]
+            self.pos = (self.pos + n) % self.size
+        self.count += n
+
+    def latest(self, n):
+        """Return the last n samples in time order"""
+        n = min(n, self.count, self.size)
+        idx = (self.pos - n + np.arange(n)) % self.size
+        return self.data[idx]
+
+
+def moving_sum(values, window):
+    # Sum of each full window ending at every position, via a cumulative sum
+    csum = np.cumsum(values)
+    out = csum[window - 1:].copy()
+    out[1:] -= csum[:-window]
+    return out
+
+
+def with_history(tail, block, n, fill):
+    """Prepend the last n samples from a ring buffer, padding with fill during warm-up"""
+    history = tail.latest(n)
+    pad = n - len(history)
+    if pad:
+        history = np.concatenate((np.full(pad, fill), history))
+    return np.concatenate((history, block))
+
+
+# Block-wise twitch detector over raw accelerometer samples
+#
+# magnitude -> high-pass (minus moving average) -> rolling RMS -> adaptive
+# threshold (noise mean + k * std) -> debounce -> hysteresis -> refractory period
+class TwitchDetector:
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, highpass_ms=200, rms_ms=20,
+                 k=6.0, min_threshold=0.02, debounce_ms=3, refractory_ms=250,
+                 noise_alpha=0.01, threshold=None, release=None):
+        self.sample_rate = sample_rate
+        self.highpass_len = max(2, int(sample_rate * highpass_ms / 1000))
+        self.rms_len = max(2, int(sample_rate * rms_ms / 1000))
+        self.debounce_len = max(1, int(sample_rate * debounce_ms / 1000))
+        self.refractory = int(sample_rate * refractory_ms / 1000)
+        self.k = k
+        self.min_threshold = min_threshold
+        self.noise_alpha = noise_alpha
+        self.fixed_threshold = threshold  # Set by calibration, disables the adaptive threshold
+        self.release = release  # Hysteresis: the RMS must fall below this before the next twitch
+        self.armed = True
+        self.noise_mean = None
+        self.noise_var = 0.0
+        # Tails of the previous block so the rolling windows are continuous
+        self.magnitude_tail = RingBuffer(self.highpass_len - 1)
+        self.hp_sq_tail = RingBuffer(self.rms_len - 1)
+        self.samples_seen = 0
+        self.last_detection = -self.refractory - 1
+        self.above_run = 0
+        self.last_rms = np.zeros(0)
+        self.last_magnitude = np.zeros(0)
+
+    def configure(self, threshold=None, release=None):
+        """Apply calibrated parameters, None returns to the adaptive threshold"""
+        self.fixed_threshold = threshold
+        self.release = release if threshold is not None else None
+
+    @property
+    def threshold(self):
+        if self.fixed_threshold is not None:
+            return self.fixed_threshold
+        if self.noise_mean is None:
+            return np.inf
+        return max(self.min_threshold, self.noise_mean + self.k * np.sqrt(self.noise_var))
+
+    def features(self, samples):
+        """Rolling RMS of the high-passed magnitude for a block of int16 x/y/z samples"""
+        g = samples.astype(np.float64) / COUNTS_PER_G
+        magnitude = np.sqrt(np.einsum("ij,ij->i", g, g))
+        self.last_magnitude = magnitude
+        n = len(magnitude)
+
+        # Warm-up pretends the signal sat at its first value before we started
+        history = with_history(self.magnitude_tail, magnitude, self.highpass_len - 1, magnitude[0])
+        baseline = moving_sum(history, self.highpass_len) / self.highpass_len
+        highpassed_sq = (magnitude - baseline) ** 2
+        self.magnitude_tail.extend(magnitude)
+
+        history = with_history(self.hp_sq_tail, highpassed_sq, self.rms_len - 1, 0.0)
+        rms = np.sqrt(np.maximum(moving_sum(history, self.rms_len), 0.0) / self.rms_len)
+        self.hp_sq_tail.extend(highpassed_sq)
+        return rms[-n:]
+
+    def update_noise(self, rms, threshold):
+        # Only samples below the threshold describe the resting noise floor
+        quiet = rms[rms < threshold]
+        if not len(quiet):
+            return
+        mean, var = quiet.mean(), quiet.var()
+        if self.noise_mean is None:
+            self.noise_mean, self.noise_var = mean, var
+            return
+        a = min(1.0, self.noise_alpha * len(quiet) / 16)
+        self.noise_mean += a * (mean - self.noise_mean)
+        self.noise_var += a * (var - self.noise_var)
+
+    def process(self, samples):
+        """Feed a block of raw samples, return the sample indices where twitches were detected"""
+        if not len(samples):
+            return []
+        rms = self.features(samples)
+        self.last_rms = rms
+        threshold = self.threshold
+        above = rms > threshold
+
+        # Length of the current run of samples above threshold at every position,
+        # a twitch is confirmed when a run reaches debounce_len
+        idx = np.arange(1, len(above) + 1)
+        runs = idx - np.maximum.accumulate(np.where(above, 0, idx))
+        first_below = len(above) if above.all() else int(np.argmin(above))
+        runs[:first_below] += self.above_run
+        self.above_run = int(runs[-1])
+
+        # Without a calibrated release level any dip below the threshold re-arms
+        below = rms < (self.release if self.release is not None else threshold)
+        detections = []
+        last = -1
+        for i in np.flatnonzero(runs == self.debounce_len):
+            index = self.samples_seen + int(i)
+            armed = self.armed or below[last + 1:i].any()
+            if armed and index - self.last_detection > self.refractory:
+                detections.append(index)
+                self.last_detection = index
+                self.armed = False
+                last = i
+        self.armed = self.armed or bool(below[last + 1:].any())
+
+        self.update_noise(rms, threshold)
+        self.samples_seen += len(samples)
+        return detections
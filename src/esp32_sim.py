@@ -0,0 +1,121 @@
+import os
+import random
+import sys
+import threading
+import time
+import tty
+
+from latency import now_ns
+from protocol import encode_frame, TWITCH, POWER, INFO, HEARTBEAT, SENSOR_ACCEL, SENSOR_IR
+
+HEARTBEAT_INTERVAL = 0.1  # Seconds, HEARTBEAT_MS in interface.ino
+
+
+# Pty stand-in for the ESP32 interface, speaks the same text lines or binary frames as interface.ino
+class Esp32Simulator:
+    def __init__(self, binary=False):
+        self.binary = binary
+        self.seq = 0
+        self.boot_ns = now_ns()
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.heartbeat_thread = None
+        self.heartbeat_stopped = threading.Event()
+        self.last_heartbeat_ns = None
+
+    def send(self, frame_type, payload, text, on_sent=None):
+        """Send one event as a frame or text line and return the host time it was written"""
+        with self.lock:
+            sent_ns = now_ns()
+            if self.binary:
+                data = encode_frame(frame_type, self.seq, (sent_ns - self.boot_ns) // 1_000_000, payload)
+                self.seq += 1
+            else:
+                data = (text + "\n").encode()
+            # Report the send time before the bytes can reach the reader
+            if on_sent is not None:
+                on_sent(sent_ns)
+            os.write(self.master, data)
+        return sent_ns
+
+    def skip_seq(self, count=1):
+        """Pretend count frames were lost on the wire"""
+        with self.lock:
+            self.seq += count
+
+    def power(self, on):
+        return self.send(POWER, b"\x01" if on else b"\x00", "ON" if on else "OFF")
+
+    def twitch(self, on_sent=None, sensor=SENSOR_ACCEL):
+        if sensor == SENSOR_ACCEL:
+            return self.send(TWITCH, b"", "1", on_sent)
+        return self.send(TWITCH, bytes([sensor]), "IR" if sensor == SENSOR_IR else "1", on_sent)
+
+    def info(self, text):
+        return self.send(INFO, text.encode(), text)
+
+    def heartbeats(self, interval=HEARTBEAT_INTERVAL):
+        """Send heartbeat frames in the background until stop_heartbeats(), binary protocol only"""
+        if not self.binary or self.heartbeat_thread is not None:
+            return
+        self.heartbeat_stopped.clear()
+
+        def beat():
+            while not self.heartbeat_stopped.wait(interval):
+                self.last_heartbeat_ns = self.send(HEARTBEAT, b"", "")
+
+        self.heartbeat_thread = threading.Thread(target=beat, daemon=True)
+        self.heartbeat_thread.start()
+
+    def stop_heartbeats(self):
+        """Go silent like a hung device, returns when the last heartbeat was sent"""
+        if self.heartbeat_thread is not None:
+            self.heartbeat_stopped.set()
+            self.heartbeat_thread.join()
+            self.heartbeat_thread = None
+        return self.last_heartbeat_ns
+
+    def play(self, count, interval=0.1, jitter=0.0, seed=0, on_sent=None, loss=0.0):
+        """Send count twitches in the background with seeded, reproducible spacing and frame loss"""
+        rng = random.Random(seed)
+
+        def script():
+            self.power(True)
+            for _ in range(count):
+                if self.stopped.wait(max(0.0, interval + rng.uniform(-jitter, jitter))):
+                    return
+                if loss and rng.random() < loss:
+                    self.skip_seq()
+                    continue
+                self.twitch(on_sent)
+            self.power(False)
+
+        self.thread = threading.Thread(target=script, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.stop_heartbeats()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+if __name__ == "__main__":
+    # Manual use: set DEVICE = "pty://<printed device>" in main.py
+    sim = Esp32Simulator(binary="--binary" in sys.argv)
+    print(f"Simulated ESP32 on {sim.port_name}, press Enter to twitch (i + Enter for the IR sensor), "
+          f"Ctrl+C to quit")
+    sim.power(True)
+    sim.heartbeats()
+    try:
+        while True:
+            sim.twitch(sensor=SENSOR_IR if input().strip() == "i" else SENSOR_ACCEL)
+    except (KeyboardInterrupt, EOFError):
+        sim.close()
@@ -0,0 +1,119 @@
+from collections import deque
+
+EVENT_QUEUE_LEN = 256
+
+
+# Fuses twitches from several sensor channels into actions
+#
+# A rule fires as soon as the weights of its channels that twitched within window_ms
+# of each other reach the threshold, so agreeing sensors cost no extra wait: the
+# action goes out with the twitch that completes the evidence. The twin twitches of
+# the same movement that arrive after that fall in the refractory period.
+class FusionRule:
+    def __init__(self, action, weights, threshold=1.0, window_ms=100, refractory_ms=250):
+        self.action = action
+        self.weights = weights  # channel -> weight
+        self.threshold = threshold - 1e-9  # Weights like 0.7 + 0.3 must still reach 1.0
+        self.window_ms = window_ms
+        self.refractory_ms = refractory_ms
+        self.last_ms = {channel: float("-inf") for channel in weights}
+        self.quiet_until = float("-inf")
+        self.fired = 0
+        self.suppressed = 0
+
+    def observe(self, channel, time_ms):
+        """Record a twitch on one of the rule's channels, True when the rule fires"""
+        if time_ms < self.quiet_until:
+            self.suppressed += 1
+            return False
+        self.last_ms[channel] = time_ms
+        score = 0.0
+        for other, weight in self.weights.items():
+            if time_ms - self.last_ms[other] <= self.window_ms:
+                score += weight
+        if score < self.threshold:
+            return False
+        self.quiet_until = time_ms + self.refractory_ms
+        self.fired += 1
+        return True
+
+
+class SensorFusion:
+    def __init__(self, rules, offsets_ms=None):
+        self.rules = rules
+        self.offsets_ms = offsets_ms or {}  # channel -> ms added to line its twitches up with the others
+        self.by_channel = {}  # channel -> rules listening to it, in priority order
+        for rule in rules:
+            for channel in rule.weights:
+                self.by_channel.setdefault(channel, []).append(rule)
+        self.twitches = {channel: 0 for channel in self.by_channel}
+
+    def observe(self, channel, time_ms):
+        """Feed a twitch, returns the action of the first rule it makes fire or None"""
+        rules = self.by_channel.get(channel)
+        if rules is None:
+            return None
+        self.twitches[channel] += 1
+        time_ms += self.offsets_ms.get(channel, 0)
+        for rule in rules:
+            if rule.observe(channel, time_ms):
+                return rule.action
+        return None
+
+    def stats(self):
+        return {
+            "twitches": dict(self.twitches),
+            "fired": {rule.action: rule.fired for rule in self.rules},
+            "suppressed": {rule.action: rule.suppressed for rule in self.rules},
+        }
+
+
+# One consumer's view of the bus: a bounded deque that drops its oldest item when full
+#
+# notify() is called from the publishing thread when the consumer has to wake up,
+# at most once per drain(), so a consumer behind a Qt queued signal never has more
+# than one wakeup queued however fast events come in.
+class Subscription:
+    def __init__(self, maxlen=EVENT_QUEUE_LEN, notify=None):
+        self.queue = deque(maxlen=maxlen)
+        self.notify = notify
+        self.armed = True  # The consumer is waiting for a notify
+        self.dropped = 0
+
+    def drain(self):
+        """Yield every queued item, call from the consuming thread only"""
+        self.armed = True  # Before looking, so an item published during the loop notifies again
+        queue = self.queue
+        while queue:
+            yield queue.popleft()
+
+    def backlog(self):
+        return len(self.queue)
+
+
+# Fan-out from one producer (the serial thread) to any number of consumers
+#
+# publish() never blocks and takes no lock: deque appends are atomic and the
+# subscriber tuple is replaced rather than changed, so a slow consumer only loses
+# its own oldest events.
+class EventBus:
+    def __init__(self):
+        self.subscribers = ()
+
+    def subscribe(self, maxlen=EVENT_QUEUE_LEN, notify=None):
+        subscription = Subscription(maxlen, notify)
+        self.subscribers = self.subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers = tuple(sub for sub in self.subscribers if sub is not subscription)
+
+    def publish(self, item):
+        for sub in self.subscribers:
+            queue = sub.queue
+            if len(queue) == queue.maxlen:
+                sub.dropped += 1
+            queue.append(item)
+            if sub.armed and sub.notify is not None:
+                sub.armed = False
+                sub.notify()
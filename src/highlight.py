@@ -0,0 +1,143 @@
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QColor, QPainter, QPalette, QPen, QRegion
+from PyQt5.QtWidgets import QStyleFactory, QWidget
+
+ROW_COLOR = "yellow"
+KEY_COLOR = "orange"
+GRID_COLOR = QColor(0, 0, 0, 160)
+BOX_COLOR = QColor("lightblue")
+LINE_WIDTH = 3
+
+
+# Scan highlight renderer for a grid of QPushButtons
+#
+# Highlights are palette swaps instead of setStyleSheet() calls: a palette change
+# only repaints the button while a stylesheet is re-parsed and re-polished. The
+# palettes are built once and only cells whose state changed are touched.
+class HighlightRenderer:
+    def __init__(self, buttons, base_colors=None):
+        self.buttons = buttons
+        self.base_colors = base_colors or {}  # (row, col) -> resting colour name
+        self.applied = {}  # (row, col) -> highlight palette currently on the button
+        # Fusion honours palette colours for push buttons on every platform
+        self.style = QStyleFactory.create("Fusion")
+        self.default_palette = self.style.standardPalette()
+        self.palettes = {}
+
+    def palette(self, color):
+        if color not in self.palettes:
+            palette = QPalette(self.default_palette)
+            if color is not None:
+                palette.setColor(QPalette.Button, QColor(color))
+            self.palettes[color] = palette
+        return self.palettes[color]
+
+    def wanted_palettes(self, row, col, selecting_row):
+        if selecting_row:
+            row_palette = self.palette(ROW_COLOR)
+            return {(row, c): row_palette for c in range(len(self.buttons[row]))}
+        return {(row, col): self.palette(KEY_COLOR)}
+
+    def render(self, row, col, selecting_row):
+        """Repaint only the cells leaving or entering the highlight"""
+        wanted = self.wanted_palettes(row, col, selecting_row)
+        for cell in self.applied:
+            if cell not in wanted:
+                self.set_palette(cell, self.palette(self.base_colors.get(cell)))
+        for cell, palette in wanted.items():
+            if self.applied.get(cell) is not palette:
+                self.set_palette(cell, palette)
+        self.applied = wanted
+
+    def reset(self, buttons=None):
+        """Forget applied state and repaint every cell, e.g. after the grid was rebuilt"""
+        if buttons is not None:
+            self.buttons = buttons
+        self.applied = {}
+        self.default_palette = self.style.standardPalette()
+        self.palettes = {}
+        for row_idx, row in enumerate(self.buttons):
+            for col_idx, button in enumerate(row):
+                button.setStyle(self.style)
+                self.set_palette((row_idx, col_idx), self.palette(self.base_colors.get((row_idx, col_idx))))
+
+    def set_palette(self, cell, palette):
+        row, col = cell
+        if row < len(self.buttons) and col < len(self.buttons[row]):
+            self.buttons[row][col].setPalette(palette)
+
+
+# See-through, click-through window over the screen for pointer mode
+#
+# Draws the cells of a PointerScanner as outlines and its action boxes as labelled
+# boxes. Each render() asks for one repaint of only what changed: the outlines of
+# the cells leaving and entering the highlight on a tick, the old and new grid
+# lines on a selection. Nothing fills a cell, so no tick repaints a cell's area.
+class PointerOverlay(QWidget):
+    def __init__(self, geometry):
+        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool |
+                         Qt.WindowTransparentForInput | Qt.WindowDoesNotAcceptFocus)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        self.setGeometry(*geometry)  # Screen coordinates of the scanner
+        self.items = []
+        self.index = None
+        self.point = None
+        self.repaints = 0
+        self.repainted_px = 0
+
+    def local(self, rect):
+        x, y, width, height = rect
+        return QRect(x - self.x(), y - self.y(), width, height)
+
+    def dirty(self, items, index, point):
+        """Region to repaint for these items, or just the highlighted one"""
+        region = QRegion()
+        for label, rect in (items if index is None else [items[index]]):
+            rect = self.local(rect)
+            if label:
+                region += rect.adjusted(-LINE_WIDTH, -LINE_WIDTH, LINE_WIDTH, LINE_WIDTH)
+                continue
+            # Only the outline, as four strips
+            outer = rect.adjusted(-LINE_WIDTH, -LINE_WIDTH, LINE_WIDTH, LINE_WIDTH)
+            region += QRegion(outer).subtracted(QRegion(rect.adjusted(LINE_WIDTH, LINE_WIDTH, -LINE_WIDTH,
+                                                                      -LINE_WIDTH)))
+        if index is None and point is not None:
+            x, y = point
+            region += QRect(x - self.x() - 12, y - self.y() - 12, 25, 25)
+        return region
+
+    def render(self, scanner):
+        """Show the scanner's items and highlight, repainting only what changed"""
+        if scanner.items is not self.items:
+            region = self.dirty(self.items, None, self.point) + self.dirty(scanner.items, None, scanner.point)
+        else:
+            region = self.dirty(self.items, self.index, None) + self.dirty(scanner.items, scanner.index, None)
+        self.items, self.index, self.point = scanner.items, scanner.index, scanner.point
+        self.update(region)
+
+    def paintEvent(self, event):
+        self.repaints += 1
+        self.repainted_px += sum(rect.width() * rect.height() for rect in event.region().rects())
+        painter = QPainter(self)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(event.rect(), Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        for index, (label, rect) in enumerate(self.items):
+            rect = self.local(rect)
+            highlighted = index == self.index
+            if label:
+                painter.fillRect(rect, QColor(KEY_COLOR) if highlighted else BOX_COLOR)
+                painter.setPen(QPen(GRID_COLOR, 1))
+                painter.drawRect(rect.adjusted(0, 0, -1, -1))
+                painter.drawText(rect, Qt.AlignCenter, label)
+            else:
+                painter.setPen(QPen(QColor(KEY_COLOR) if highlighted else GRID_COLOR, LINE_WIDTH * 2 if highlighted
+                                    else 1))
+                painter.drawRect(rect)
+        if self.point is not None:
+            x, y = self.point[0] - self.x(), self.point[1] - self.y()
+            painter.setPen(QPen(QColor(ROW_COLOR), 2))
+            painter.drawLine(x - 10, y, x + 10, y)
+            painter.drawLine(x, y - 10, x, y + 10)
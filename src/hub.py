@@ -0,0 +1,264 @@
+import heapq
+import itertools
+import selectors
+import socket
+import sys
+import threading
+from collections import deque
+
+from device import SENSOR_RULES, DevicePipeline
+from latency import LatencyHistogram, now_ns
+from layouts import ALPHABETICAL_LAYOUT, SKIP
+from scan_engine import ScanEngine
+from scan_scheduler import MAX_CATCHUP_MS, HighlightHistory
+from scan_timing import AdaptiveScanTiming
+from transport import MIN_BACKOFF, MAX_BACKOFF, open_transport
+
+
+# One bed: a device connection with its own pipeline, scan state and calibration profile
+#
+# Lives on the hub loop, nothing here blocks: reads happen only when the selector
+# says the device is readable, scan ticks and reconnects are hub timers. Opening the
+# link (a TCP or RFCOMM connect can take seconds) runs on a helper thread, which
+# hands the result back to the loop with call_soon().
+class DeviceSession:
+    def __init__(self, hub, name, url, profile_name="default", keyboard=ALPHABETICAL_LAYOUT, rules=SENSOR_RULES):
+        self.hub = hub
+        self.name = name
+        self.url = url
+        self.transport = None
+        self.device = DevicePipeline(self.send_command, rules, profile_name=profile_name)
+        self.engine = ScanEngine(keyboard)
+        self.scan_timing = AdaptiveScanTiming(log_path=None)
+        self.highlights = HighlightHistory()
+        self.message = ""
+        self.backoff = MIN_BACKOFF
+        self.tick_token = 0  # Bumped to cancel the pending scan tick
+        self.latency = LatencyHistogram()  # Receive to handled, in ms
+        self.selections = 0
+        self.closed = False
+
+    def start(self):
+        self.device.load_profile()
+        self.connect()
+        self.show(now_ns())
+
+    def connect(self):
+        threading.Thread(target=self.open, daemon=True).start()
+
+    def open(self):
+        """Helper thread: the only place that waits for the device"""
+        try:
+            transport = open_transport(self.url)
+        except OSError as error:
+            self.hub.call_soon(self.failed, error)
+            return
+        self.hub.call_soon(self.opened, transport)
+
+    def failed(self, error):
+        if self.closed:
+            return
+        self.hub.status(self, "waiting", str(error))
+        self.hub.call_later(self.backoff, self.connect)
+        self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+
+    def opened(self, transport):
+        if self.closed:
+            transport.close()  # Closed while it connected
+            return
+        self.transport = transport
+        self.backoff = MIN_BACKOFF
+        self.hub.selector.register(self.transport.fileno(), selectors.EVENT_READ, self)
+        self.device.connected()
+        self.hub.status(self, "connected", self.url)
+
+    def lost(self, reason):
+        self.hub.selector.unregister(self.transport.fileno())
+        try:
+            self.transport.close()
+        except OSError:
+            pass
+        self.transport = None
+        self.hub.status(self, "lost", reason)
+        self.hub.call_later(self.backoff, self.connect)
+
+    def send_command(self, command):
+        if self.transport is not None:
+            try:
+                self.transport.write(command)
+            except OSError:
+                pass  # The next read notices the loss
+
+    def readable(self):
+        try:
+            chunk = self.transport.read_nowait()
+        except OSError as error:
+            self.lost(str(error))
+            return
+        if not chunk:
+            return
+        rx_ns = now_ns()
+        for event in self.device.feed(chunk, rx_ns):
+            self.handle(event, rx_ns)
+
+    def handle(self, event, rx_ns):
+        if event.kind == "select":
+            # As in the GUI: the item on screen at the device time of the twitch
+            twitch_ns = self.device.clock.host_ns(event.device_ms, rx_ns)
+            shown_ns, position = self.highlights.at(twitch_ns, (twitch_ns, self.engine.position()))
+            if position != self.engine.position():
+                self.engine.rewind(position)
+            selecting_row, first_item = self.engine.selecting_row, self.engine.first_item
+            key = self.engine.confirm()
+            self.scan_timing.record_selection(selecting_row, first_item, (twitch_ns - shown_ns) / 1e6, key)
+            self.selections += 1
+            if key is not None and key != SKIP:
+                self.type_key(key)
+            self.highlights.clear()
+            self.show(now_ns())
+            self.latency.add((now_ns() - rx_ns) / 1e6)
+        elif event.kind == "back":
+            self.engine.back()
+            self.highlights.clear()
+            self.show(now_ns())
+        else:
+            self.hub.event(self, event)
+
+    def type_key(self, key):
+        if key == '␣':
+            self.message += ' '
+        elif key == '⌫':
+            self.message = self.message[:-1]
+        elif key == '⏎':
+            self.message += '\n'
+        elif key not in ('Speak', 'SOS'):
+            self.message += key
+        self.hub.key(self, key)
+
+    def show(self, shown_ns, deadline_ns=None):
+        """The highlight moved at shown_ns, schedule the next tick"""
+        self.highlights.shown(shown_ns, self.engine.position())
+        # Drift-free like ScanScheduler: a slightly late tick counts from when it was due
+        anchor = shown_ns if deadline_ns is None else max(deadline_ns, shown_ns - MAX_CATCHUP_MS * 1_000_000)
+        dwell_ms = self.scan_timing.dwell(self.engine.selecting_row, self.engine.first_item)
+        self.tick_token += 1
+        deadline_ns = anchor + dwell_ms * 1_000_000
+        self.hub.call_at(deadline_ns, self.tick, self.tick_token, deadline_ns)
+
+    def tick(self, token, deadline_ns):
+        if token != self.tick_token:
+            return  # A selection restarted the dwell
+        self.engine.advance()
+        self.show(now_ns(), deadline_ns)
+
+    def close(self):
+        self.closed = True
+        self.tick_token += 1
+        if self.transport is not None:
+            self.hub.selector.unregister(self.transport.fileno())
+            self.transport.close()
+            self.transport = None
+
+
+# Many devices in one process on one thread
+#
+# A selector waits on every device at once and a timer heap holds all scan ticks
+# and reconnects, so a bed costs a file descriptor and a few objects rather than a
+# thread. Device I/O, detection and scanning all run here in turn; nothing may
+# block. Other threads talk to the loop through call_soon().
+class Hub:
+    def __init__(self, on_key=None, on_event=None, on_status=None):
+        self.on_key = on_key  # (session, key)
+        self.on_event = on_event  # (session, protocol.Event) for power, speak, info...
+        self.on_status = on_status  # (session, "connected" / "lost" / "waiting", detail)
+        self.selector = selectors.DefaultSelector()
+        self.sessions = {}
+        self.timers = []  # Heap of (deadline ns, order, callback, args)
+        self.order = itertools.count()
+        self.calls = deque()  # From other threads
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.running = False
+        self.late = LatencyHistogram()  # How late timers ran, in ms
+
+    def add_device(self, name, url, profile_name="default", keyboard=ALPHABETICAL_LAYOUT):
+        session = DeviceSession(self, name, url, profile_name, keyboard)
+        self.sessions[name] = session
+        self.call_soon(session.start)
+        return session
+
+    def call_soon(self, callback, *args):
+        """Run callback on the loop, safe from any thread"""
+        self.calls.append((callback, args))
+        try:
+            self.wake_w.send(b"x")
+        except BlockingIOError:
+            pass  # Already woken
+
+    def call_later(self, delay_s, callback, *args):
+        self.call_at(now_ns() + int(delay_s * 1e9), callback, *args)
+
+    def call_at(self, deadline_ns, callback, *args):
+        """Run callback(*args) once deadline_ns has passed, loop thread only"""
+        heapq.heappush(self.timers, (deadline_ns, next(self.order), callback, args))
+
+    def run(self):
+        self.running = True
+        while self.running:
+            timeout = None
+            if self.calls:
+                timeout = 0
+            elif self.timers:
+                timeout = max(0.0, (self.timers[0][0] - now_ns()) / 1e9)
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self.wake_r.recv(4096)
+                else:
+                    key.data.readable()
+            while self.calls:
+                callback, args = self.calls.popleft()
+                callback(*args)
+            now = now_ns()
+            while self.timers and self.timers[0][0] <= now:
+                deadline_ns, _, callback, args = heapq.heappop(self.timers)
+                self.late.add((now - deadline_ns) / 1e6)
+                callback(*args)
+
+    def stop(self):
+        self.call_soon(setattr, self, "running", False)
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.selector.close()
+        self.wake_r.close()
+        self.wake_w.close()
+
+    def status(self, session, state, detail):
+        if self.on_status is not None:
+            self.on_status(session, state, detail)
+
+    def key(self, session, key):
+        if self.on_key is not None:
+            self.on_key(session, key)
+
+    def event(self, session, event):
+        if self.on_event is not None:
+            self.on_event(session, event)
+
+
+if __name__ == "__main__":
+    # Manual use: python3 src/hub.py bed1=pty:///dev/pts/5 bed2=serial:///dev/ttyUSB1@alice ...
+    # (name=url, optionally @calibration profile), prints every key and status change
+    hub = Hub(on_key=lambda session, key: print(f"{session.name}: {key!r}  -> {session.message!r}"),
+              on_status=lambda session, state, detail: print(f"{session.name}: {state} {detail}"))
+    for arg in sys.argv[1:]:
+        name, _, url = arg.partition("=")
+        url, _, profile = url.partition("@")
+        hub.add_device(name, url, profile or "default")
+    try:
+        hub.run()
+    except KeyboardInterrupt:
+        hub.close()
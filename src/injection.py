@@ -0,0 +1,231 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from telemetry import STATS
+
+# Key names follow pyautogui: single characters are typed as text, anything
+# longer ("space", "backspace", "enter", ...) is a key press. Pointer operations
+# are tuples (see pointer.py) queued in between the keys.
+SPECIAL_CHARS = {' ': 'space', '\n': 'enter', '\b': 'backspace'}
+
+
+def keys_for(text):
+    return [SPECIAL_CHARS.get(char, char) for char in text]
+
+
+def runs(keys):
+    """Split keys into (is_text, keys) runs so each run is one backend call"""
+    batch = []
+    for key in keys:
+        is_text = len(key) == 1
+        if batch and batch[-1][0] == is_text:
+            batch[-1][1].append(key)
+        else:
+            batch.append((is_text, [key]))
+    return batch
+
+
+def operations(actions):
+    """Split queued actions into key batches and pointer operations, in order. A move
+    followed by another move is skipped: only where the pointer ends up matters"""
+    keys = []
+    for index, action in enumerate(actions):
+        if isinstance(action, str):
+            keys.append(action)
+            continue
+        if keys:
+            yield "keys", keys
+            keys = []
+        following = actions[index + 1] if index + 1 < len(actions) else None
+        if action[0] == "move" and isinstance(following, tuple) and following[0] == "move":
+            continue
+        yield "pointer", action
+    if keys:
+        yield "keys", keys
+
+
+# Backends get whole batches of keys and may take as long as they like, they
+# only ever run on the injection worker thread. pointer() takes one operation.
+class PyAutoGuiBackend:
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+        # The default 0.1s pause after every call is what made typing stall the scan
+        pyautogui.PAUSE = 0
+
+    def inject(self, keys):
+        for is_text, run in runs(keys):
+            if is_text:
+                self.pyautogui.write("".join(run))
+            else:
+                self.pyautogui.press(run)
+
+    def pointer(self, operation):
+        name, *args = operation
+        if name == "move":
+            self.pyautogui.moveTo(*args)
+        elif name == "click":
+            button, count = args
+            self.pyautogui.click(button=button, clicks=count, interval=0.05)
+        elif name == "down":
+            self.pyautogui.mouseDown(button=args[0])
+        elif name == "up":
+            self.pyautogui.mouseUp(button=args[0])
+        elif name == "scroll":
+            self.pyautogui.scroll(args[0])
+
+
+XDOTOOL_KEYS = {'enter': 'Return', 'backspace': 'BackSpace'}
+XDOTOOL_BUTTONS = {'left': '1', 'middle': '2', 'right': '3'}
+
+
+# One xdotool process per run instead of one X11 round trip per key
+class XdotoolBackend:
+    def __init__(self):
+        self.xdotool = shutil.which("xdotool")
+        if self.xdotool is None:
+            raise RuntimeError("xdotool is not installed")
+
+    def inject(self, keys):
+        for is_text, run in runs(keys):
+            if is_text:
+                command = [self.xdotool, "type", "--delay", "0", "--", "".join(run)]
+            else:
+                command = [self.xdotool, "key", "--delay", "0"] + [XDOTOOL_KEYS.get(key, key) for key in run]
+            subprocess.run(command, check=False)
+
+    def pointer(self, operation):
+        name, *args = operation
+        if name == "move":
+            command = ["mousemove", str(args[0]), str(args[1])]
+        elif name == "click":
+            command = ["click", "--repeat", str(args[1]), "--delay", "50", XDOTOOL_BUTTONS[args[0]]]
+        elif name in ("down", "up"):
+            command = ["mouse" + name, XDOTOOL_BUTTONS[args[0]]]
+        else:
+            # Buttons 4 and 5 are the wheel
+            command = ["click", "--repeat", str(abs(args[0])), "--delay", "0", "4" if args[0] > 0 else "5"]
+        subprocess.run([self.xdotool] + command, check=False)
+
+
+class NullBackend:
+    def inject(self, keys):
+        pass
+
+    def pointer(self, operation):
+        pass
+
+
+# Keeps every batch for headless runs, call_delay_ms stands in for a slow OS
+class RecordingBackend:
+    def __init__(self, call_delay_ms=0):
+        self.call_delay_ms = call_delay_ms
+        self.batches = []  # (perf_counter_ns when injected, keys)
+        self.operations = []  # (perf_counter_ns when injected, pointer operation)
+
+    def inject(self, keys):
+        for _ in runs(keys):
+            if self.call_delay_ms:
+                time.sleep(self.call_delay_ms / 1000)
+        self.batches.append((time.perf_counter_ns(), list(keys)))
+
+    def pointer(self, operation):
+        if self.call_delay_ms:
+            time.sleep(self.call_delay_ms / 1000)
+        self.operations.append((time.perf_counter_ns(), operation))
+
+    @property
+    def keys(self):
+        return [key for _, batch in self.batches for key in batch]
+
+
+def create_backend(name="auto"):
+    """Backend by name, "auto" picks xdotool on X11 when it is installed and pyautogui otherwise"""
+    if name == "auto":
+        x11 = sys.platform.startswith("linux") and os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY")
+        name = "xdotool" if x11 and shutil.which("xdotool") else "pyautogui"
+    backends = {"pyautogui": PyAutoGuiBackend, "xdotool": XdotoolBackend, "null": NullBackend,
+                "recording": RecordingBackend}
+    return backends[name]()
+
+
+# Key and pointer injection worker thread, the GUI thread only ever queues them
+#
+# Keys that pile up while the backend is busy are sent as one batch, so a slow
+# backend costs one call per batch instead of one per key, and of the pointer
+# moves that pile up only the last is made.
+class InjectionWorker(QThread):
+    ready = pyqtSignal(str)  # Name of the backend in use, once it is created
+    injected = pyqtSignal(object)  # LatencyTracker records handed in with keys, "inject" stamped once typed
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend  # Or a create_backend() name, created on the worker thread
+        self.queue = queue.Queue()  # Never bounded, typed keys must not be dropped
+        self.batches = 0
+
+    def press(self, key, latency=None):
+        self.queue.put_nowait(([key], latency))
+
+    def write(self, text, latency=None):
+        self.queue.put_nowait((keys_for(text), latency))
+
+    def pointer(self, operations):
+        """Queue pointer operations from PointerScanner.confirm()"""
+        if operations:
+            self.queue.put_nowait((list(operations), None))
+
+    def run(self):
+        if isinstance(self.backend, str):
+            # Keys typed meanwhile wait in the queue
+            try:
+                self.backend = create_backend(self.backend)
+            except Exception as error:
+                print(f"[WARN] Key injection unavailable: {error}")
+                self.backend = NullBackend()
+        self.ready.emit(type(self.backend).__name__)
+        while True:
+            queued = self.queue.get()
+            if queued is None:
+                break
+            actions, latency = queued
+            records = [] if latency is None else [latency]
+            stop = False
+            while True:
+                try:
+                    more = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                actions += more[0]
+                if more[1] is not None:
+                    records.append(more[1])
+            started = injected_ns = time.perf_counter_ns()
+            for kind, item in operations(actions):
+                if kind == "keys":
+                    self.backend.inject(item)
+                    injected_ns = time.perf_counter_ns()
+                    STATS.count("injected_keys", len(item))
+                else:
+                    self.backend.pointer(item)
+                    STATS.count("pointer_operations")
+            STATS.record("inject_batch", (time.perf_counter_ns() - started) / 1e6)
+            self.batches += 1
+            if records:
+                for record in records:
+                    record["inject"] = injected_ns  # The batch's last keys are in
+                self.injected.emit(records)
+            if stop:
+                break
+
+    def stop(self):
+        """Inject whatever is still queued, then end the thread"""
+        self.queue.put(None)
+        self.wait()
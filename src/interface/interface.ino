@@ -1,4 +1,4 @@
-// has to impliment serial/bluetooth toggle comm, also accelerometer/IR sensor toggle signal fns 
+// has to impliment serial/bluetooth toggle comm
 
 #include <Wire.h>
 #include <Preferences.h>
@@ -6,11 +6,52 @@
 #define ADXL345_ADDR 0x53
 #define BUTTON_PIN 15  // Push button to start/stop scanning
 
+// Host protocol: 1 = binary frames (see src/protocol.py), 0 = old text lines
+#define BINARY_PROTOCOL 1
+#define FRAME_SYNC 0xA5
+#define FRAME_VERSION 1
+#define FRAME_TWITCH 0x01
+#define FRAME_POWER 0x02
+#define FRAME_INFO 0x03
+#define FRAME_HEARTBEAT 0x04
+#define FRAME_SAMPLES 0x10
+// While measuring, so the host's mobility watchdog (src/mobility.py) knows we are alive
+#define HEARTBEAT_MS 100
+
+// Twitch frames carry the sensor that fired, the host fuses the channels (src/event_bus.py)
+#define SENSOR_ACCEL 0
+#define SENSOR_IR 1
+
+// TCRT5000 IR sensor: a twitch is a jump of the reflected light away from its slow baseline.
+// Set to 1 only with the module wired to IR_PIN, a floating pin reads noise that fires
+// random twitches; IR_SENSOR in src/main.py turns on the host's "ir" rule to match.
+#define IR_ENABLED 0
+#define IR_PIN 34  // Analog output of the TCRT5000 module
+#define IR_THRESHOLD 150  // ADC counts, re-arms below half of it
+#define IR_BASELINE_ALPHA 0.01
+
+// Raw mode: stream x/y/z samples and leave twitch detection to the host (src/dsp.py).
+// 16 samples per frame at 1kHz is ~7kB/s, within the 115200 baud link.
+// RAW_SAMPLE_MODE is the boot default, the host switches it with "RAW 1" / "RAW 0".
+#define RAW_SAMPLE_MODE 0
+#define RAW_SAMPLE_RATE 1000
+#define SAMPLES_PER_FRAME 16
+
 float restBaseline = 0, twitchBaseline = 0, threshold = 0;
+float releaseThreshold = 0;  // Hysteresis: re-arm below this, equals threshold unless the host sets it
+bool rawMode = RAW_SAMPLE_MODE;
+String commandLine = "";
 volatile bool buttonPressed = false;  // Flag for button press
 bool isMeasuring = false;  // Toggle state
 bool twitchActive = false;  // Edge detection for twitch
 unsigned long lastPressTime = 0;  // For debounce
+unsigned long lastHeartbeat = 0;
+uint16_t frameSeq = 0;  // Lets the host detect dropped or repeated frames
+uint8_t samplePayload[2 + SAMPLES_PER_FRAME * 6];  // Sample period (us) then int16 x/y/z triples
+int sampleCount = 0;
+unsigned long nextSampleMicros = 0;
+float irBaseline = -1;  // Set from the first reading
+bool irActive = false;
 Preferences preferences;
 
 // Interrupt Service Routine (ISR) - Avoid heavy tasks inside ISR
@@ -31,6 +72,12 @@ void setup() {
     Wire.write(8); // Enable measurement mode
     Wire.endTransmission();
 
+    Wire.setClock(400000);  // Fast I2C so a 6 byte read fits well inside 1ms in raw mode
+    Wire.beginTransmission(ADXL345_ADDR);
+    Wire.write(0x2C);
+    Wire.write(0x0E); // 1600Hz output data rate
+    Wire.endTransmission();
+
     // Configure button as input with internal pull-up resistor
     pinMode(BUTTON_PIN, INPUT_PULLUP);
     attachInterrupt(BUTTON_PIN, buttonISR, FALLING);  // Detects press
@@ -40,6 +87,8 @@ void setup() {
 }
 
 void loop() {
+    readCommands();
+
     // Handle button press event outside ISR
     if (buttonPressed) {
         buttonPressed = false;  // Reset flag
@@ -48,70 +97,160 @@ void loop() {
             isMeasuring = !isMeasuring;
             lastPressTime = now;
 
-            if (isMeasuring) {
-                Serial.println("ON");
-            } else {
-                Serial.println("OFF");
-            }
+            sendPower(isMeasuring);
         }
     }
 
     if (!isMeasuring) return; // Stop detection when isMeasuring = false
 
+    sendHeartbeat();
+
+#if IR_ENABLED
+    detectIr();  // Also in raw mode, only the accelerometer is streamed
+#endif
+
+    if (rawMode) {
+        streamSamples();
+        return;
+    }
+
     float resultantG = getAcceleration();
 
     // Twitch detection with edge filtering
     if (resultantG > threshold) {
-        if (!twitchActive) {  // Only print "1" once per twitch
-            Serial.println("1");
+        if (!twitchActive) {  // Only report once per twitch
+            sendTwitch(SENSOR_ACCEL);
             twitchActive = true;  // Set twitch as active
         }
-    } else {
-        twitchActive = false;  // Reset when below threshold
+    } else if (resultantG < releaseThreshold) {
+        twitchActive = false;  // Re-arm once below the release level
     }
 
-    delay(100);  // Adjust delay for responsiveness
+    delay(10);  // 10ms sampling keeps twitch-to-serial latency well under 100ms
 }
 
 void checkThreshold() {
     preferences.begin("adxl345", false);
     threshold = preferences.getFloat("threshold", 0);
+    releaseThreshold = preferences.getFloat("release", threshold);
     preferences.end();
 
     if (threshold > 0) {
-        Serial.println("[INFO] Threshold Found: " + String(threshold, 2));
+        sendInfo("[INFO] Threshold Found: " + String(threshold, 2));
     } else {
-        Serial.println("[INFO] No Threshold Found. Recording...");
+        sendInfo("[INFO] No Threshold Found. Recording...");
         recordBaselines();
     }
 }
 
 void recordBaselines() {
-    Serial.println("[INFO] Hold still to record Rest Baseline...");
+    sendInfo("[INFO] Hold still to record Rest Baseline...");
     delay(3000);
     restBaseline = getAverageAcceleration();
 
-    Serial.println("[INFO] Twitch now to record Twitch Baseline...");
+    sendInfo("[INFO] Twitch now to record Twitch Baseline...");
     delay(3000);
     twitchBaseline = getAverageAcceleration();
 
     // Calculate and save threshold
     threshold = (restBaseline + twitchBaseline) / 2;
+    releaseThreshold = threshold;
     
     preferences.begin("adxl345", false);
     preferences.putFloat("restBaseline", restBaseline);
     preferences.putFloat("twitchBaseline", twitchBaseline);
     preferences.putFloat("threshold", threshold);
+    preferences.putFloat("release", releaseThreshold);
     preferences.end();
 
-    Serial.println("[INFO] Threshold Saved!");
-    Serial.print("[INFO] Rest Baseline: "); Serial.println(restBaseline, 2);
-    Serial.print("[INFO] Twitch Baseline: "); Serial.println(twitchBaseline, 2);
-    Serial.print("[INFO] Threshold: "); Serial.println(threshold, 2);
+    sendInfo("[INFO] Threshold Saved!");
+    sendInfo("[INFO] Rest Baseline: " + String(restBaseline, 2));
+    sendInfo("[INFO] Twitch Baseline: " + String(twitchBaseline, 2));
+    sendInfo("[INFO] Threshold: " + String(threshold, 2));
 }
 
-float getAcceleration() {
-    int16_t x, y, z;
+// CRC-16/CCITT-FALSE, must match crc16() in src/protocol.py
+uint16_t crc16(const uint8_t *data, size_t len) {
+    uint16_t crc = 0xFFFF;
+    for (size_t i = 0; i < len; i++) {
+        crc ^= (uint16_t)data[i] << 8;
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+    return crc;
+}
+
+// sync | version | type | length | seq (2) | device ms (4) | payload | crc (2), little endian
+void sendFrame(uint8_t type, const uint8_t *payload, uint8_t len) {
+    uint8_t frame[1 + 9 + 255 + 2];
+    uint32_t now = millis();
+    frame[0] = FRAME_SYNC;
+    frame[1] = FRAME_VERSION;
+    frame[2] = type;
+    frame[3] = len;
+    frame[4] = frameSeq & 0xFF;
+    frame[5] = frameSeq >> 8;
+    for (int i = 0; i < 4; i++) frame[6 + i] = (now >> (8 * i)) & 0xFF;
+    memcpy(frame + 10, payload, len);
+    uint16_t crc = crc16(frame + 1, 9 + len);
+    frame[10 + len] = crc & 0xFF;
+    frame[11 + len] = crc >> 8;
+    Serial.write(frame, 12 + len);
+    frameSeq++;
+}
+
+void sendTwitch(uint8_t sensor) {
+#if BINARY_PROTOCOL
+    // Accelerometer twitches keep the empty payload old hosts expect
+    sendFrame(FRAME_TWITCH, &sensor, sensor == SENSOR_ACCEL ? 0 : 1);
+#else
+    Serial.println(sensor == SENSOR_IR ? "IR" : "1");
+#endif
+}
+
+void detectIr() {
+    float reading = analogRead(IR_PIN);
+    if (irBaseline < 0) irBaseline = reading;
+    float deviation = fabs(reading - irBaseline);
+    if (deviation > IR_THRESHOLD) {
+        if (!irActive) {
+            sendTwitch(SENSOR_IR);
+            irActive = true;
+        }
+    } else {
+        if (deviation < IR_THRESHOLD / 2) irActive = false;
+        irBaseline += IR_BASELINE_ALPHA * (reading - irBaseline);  // Follow ambient light, not twitches
+    }
+}
+
+void sendPower(bool on) {
+#if BINARY_PROTOCOL
+    uint8_t state = on ? 1 : 0;
+    sendFrame(FRAME_POWER, &state, 1);
+#else
+    Serial.println(on ? "ON" : "OFF");
+#endif
+}
+
+void sendHeartbeat() {
+#if BINARY_PROTOCOL
+    unsigned long now = millis();
+    if (now - lastHeartbeat < HEARTBEAT_MS) return;
+    lastHeartbeat = now;
+    sendFrame(FRAME_HEARTBEAT, NULL, 0);
+#endif
+}
+
+void sendInfo(const String &text) {
+#if BINARY_PROTOCOL
+    sendFrame(FRAME_INFO, (const uint8_t *)text.c_str(), min((int)text.length(), 255));
+#else
+    Serial.println(text);
+#endif
+}
+
+void readAxes(int16_t &x, int16_t &y, int16_t &z) {
     Wire.beginTransmission(ADXL345_ADDR);
     Wire.write(0x32);
     Wire.endTransmission(false);
@@ -120,10 +259,32 @@ float getAcceleration() {
     x = Wire.read() | (Wire.read() << 8);
     y = Wire.read() | (Wire.read() << 8);
     z = Wire.read() | (Wire.read() << 8);
+}
 
+float getAcceleration() {
+    int16_t x, y, z;
+    readAxes(x, y, z);
     return sqrt(sq(x / 256.0) + sq(y / 256.0) + sq(z / 256.0));
 }
 
+// Sample at RAW_SAMPLE_RATE and send a frame every SAMPLES_PER_FRAME samples
+void streamSamples() {
+    unsigned long now = micros();
+    if ((long)(now - nextSampleMicros) < 0) return;
+    const uint16_t periodMicros = 1000000UL / RAW_SAMPLE_RATE;
+    nextSampleMicros = ((long)(now - nextSampleMicros) > (long)periodMicros) ? now + periodMicros : nextSampleMicros + periodMicros;
+
+    int16_t axes[3];
+    readAxes(axes[0], axes[1], axes[2]);
+    memcpy(samplePayload + 2 + sampleCount * 6, axes, 6);  // ESP32 is little endian like the frame
+    if (++sampleCount == SAMPLES_PER_FRAME) {
+        samplePayload[0] = periodMicros & 0xFF;
+        samplePayload[1] = periodMicros >> 8;
+        sendFrame(FRAME_SAMPLES, samplePayload, sizeof(samplePayload));
+        sampleCount = 0;
+    }
+}
+
 float getAverageAcceleration() {
     float total = 0;
     for (int i = 0; i < 5; i++) {
@@ -131,4 +292,43 @@ float getAverageAcceleration() {
         delay(200);
     }
     return total / 5;
-}
\ No newline at end of file
+}
+
+// Host commands, one per line: RESET | SET <threshold> <release> | RAW <0|1> | STATUS
+void readCommands() {
+    while (Serial.available()) {
+        char c = Serial.read();
+        if (c == '\n') {
+            handleCommand(commandLine);
+            commandLine = "";
+        } else if (commandLine.length() < 64) {
+            commandLine += c;
+        }
+    }
+}
+
+void handleCommand(String command) {
+    command.trim();
+    if (command == "RESET") {
+        recordBaselines();
+    } else if (command.startsWith("SET ")) {
+        int split = command.indexOf(' ', 4);
+        float newThreshold = command.substring(4, split).toFloat();
+        float newRelease = split > 0 ? command.substring(split + 1).toFloat() : newThreshold;
+        if (newThreshold > 0 && newRelease > 0 && newRelease <= newThreshold) {
+            threshold = newThreshold;
+            releaseThreshold = newRelease;
+            preferences.begin("adxl345", false);
+            preferences.putFloat("threshold", threshold);
+            preferences.putFloat("release", releaseThreshold);
+            preferences.end();
+            sendInfo("[INFO] Threshold set by host: " + String(threshold, 4) + " release " + String(releaseThreshold, 4));
+        }
+    } else if (command == "RAW 1" || command == "RAW 0") {
+        rawMode = command == "RAW 1";
+        sampleCount = 0;
+        sendInfo(rawMode ? "[INFO] Raw sample mode" : "[INFO] Device detection mode");
+    } else if (command == "STATUS") {
+        sendPower(isMeasuring);  // A host that (re)connects learns whether we are measuring
+    }
+}
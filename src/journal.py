@@ -0,0 +1,257 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".liberate", "journal")
+SNAPSHOT_EVERY = 1000  # Records between snapshots, bounds what a restart has to replay
+RESTORED_MESSAGE_CHARS = 500  # A restart brings back at most the end of the message, from a word start
+CLOSE_TIMEOUT_S = 5.0  # close() gives the writer this long to finish a stuck write
+
+# Record: payload length u32 | crc32 of payload u32 | payload, the payload is
+# the JSON list [seq, time, kind, data]. A torn or corrupt record ends the log.
+RECORD = struct.Struct("<II")
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".log"
+
+
+# What a restart brings back, rebuilt by applying journal records in order
+class SessionState:
+    def __init__(self):
+        self.message = ""
+        self.power = False
+        self.keys = 0
+        self.twitches = 0
+        self.sessions = 0
+
+    def apply(self, kind, data):
+        if kind == "key":
+            self.keys += 1
+            if data == '␣':
+                self.message += ' '
+            elif data == '⌫':
+                self.message = self.message[:-1]
+            elif data == '⏎':
+                self.message += '\n'
+            else:
+                self.message += data
+        elif kind == "text":
+            self.message += data
+        elif kind == "power":
+            self.power = bool(data)
+        elif kind == "twitch":
+            self.twitches += 1
+        elif kind == "session":
+            self.sessions += 1
+
+    def trim_message(self, limit=RESTORED_MESSAGE_CHARS):
+        """Keep the end of a message carried over from earlier sessions"""
+        if len(self.message) <= limit:
+            return
+        tail = self.message[-limit:]
+        start = max(tail.find(" "), tail.find("\n"))
+        self.message = tail[start + 1:] if start != -1 else tail
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, values):
+        state = cls()
+        vars(state).update(values)
+        return state
+
+
+def segment_path(directory, first_seq):
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}")
+
+
+def segments(directory):
+    """Segment paths, oldest first"""
+    names = [name for name in os.listdir(directory)
+             if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def read_records(path):
+    """Yield (end offset, seq, time, kind, data) up to the first torn or corrupt record"""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + RECORD.size <= len(data):
+        length, crc = RECORD.unpack_from(data, pos)
+        end = pos + RECORD.size + length
+        payload = data[pos + RECORD.size:end]
+        if end > len(data) or zlib.crc32(payload) != crc:
+            return
+        seq, moment, kind, value = json.loads(payload)
+        pos = end
+        yield pos, seq, moment, kind, value
+
+
+def encode_record(seq, moment, kind, data):
+    payload = json.dumps([seq, moment, kind, data], ensure_ascii=False, separators=(",", ":")).encode()
+    return RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def fsync_directory(directory):
+    """Make renames and new files in directory durable, where the OS allows it"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Windows cannot open directories, its renames are durable enough
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def recover(directory):
+    """(state, last seq, records replayed after the snapshot, path of the last segment, its valid
+    length) from the snapshot plus the log tail"""
+    state, seq = SessionState(), 0
+    snapshot = os.path.join(directory, "snapshot.json")
+    if os.path.exists(snapshot):
+        with open(snapshot) as f:
+            saved = json.load(f)
+        state, seq = SessionState.from_dict(saved["state"]), saved["seq"]
+    last_path, valid, replayed = None, 0, 0
+    for path in segments(directory):
+        last_path, valid = path, 0
+        for end, record_seq, _, kind, data in read_records(path):
+            if record_seq <= seq:
+                valid = end  # Already in the snapshot
+                continue
+            if record_seq != seq + 1:
+                break  # A gap, nothing after it can be trusted
+            state.apply(kind, data)
+            seq = record_seq
+            valid = end
+            replayed += 1
+    return state, seq, replayed, last_path, valid
+
+
+# Append-only session journal, group-committed on its own thread
+#
+# append() only queues, so the scan loop never waits on the disk. The writer
+# takes everything queued, writes it in one go and fsyncs once per batch. Every
+# SNAPSHOT_EVERY records the state goes to snapshot.json and a new segment is
+# started, older segments are deleted. A failed write (the disk is full) is
+# reported and its batch dropped, the writer goes on and flush() still returns.
+class Journal:
+    def __init__(self, directory=JOURNAL_DIR, snapshot_every=SNAPSHOT_EVERY, on_commit=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.on_commit = on_commit  # Called on the writer thread with the last durable seq
+        # Read self.state before the first append(), after that it belongs to the writer
+        self.state, self.seq, self.since_snapshot, path, valid = recover(directory)
+        self.state.trim_message()
+        self.committed_seq = self.seq
+        self.commits = 0
+        self.errors = 0
+        if path is None:
+            path = segment_path(directory, self.seq + 1)
+        self.path = path
+        self.valid = valid  # Length of the segment up to the last durable record
+        self.file = open(path, "ab")
+        if self.file.tell() != valid:
+            self.file.truncate(valid)  # Drop a torn tail left by a crash
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def append(self, kind, data=None):
+        self.queue.put_nowait((time.time(), kind, data))
+
+    def flush(self):
+        """Wait until everything appended so far is on disk"""
+        done = threading.Event()
+        self.queue.put_nowait(done)
+        done.wait()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            waiters = [entry for entry in batch if isinstance(entry, threading.Event)]
+            records = [entry for entry in batch if isinstance(entry, tuple)]
+            if records:
+                try:
+                    self.commit(records)
+                except (OSError, ValueError) as error:  # ValueError: the segment could not be reopened
+                    self.errors += 1
+                    print(f"[WARN] Journal write failed, {len(records)} records lost: {error}")
+                    self.reopen()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                break
+
+    def commit(self, records):
+        data = bytearray()
+        for seq, (moment, kind, value) in enumerate(records, self.seq + 1):
+            data += encode_record(seq, moment, kind, value)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.valid += len(data)
+        for moment, kind, value in records:
+            self.seq += 1
+            self.state.apply(kind, value)
+        self.commits += 1
+        self.committed_seq = self.seq
+        self.since_snapshot += len(records)
+        if self.on_commit is not None:
+            self.on_commit(self.seq)
+        if self.since_snapshot >= self.snapshot_every:
+            try:
+                self.snapshot()
+            except OSError as error:
+                self.errors += 1
+                print(f"[WARN] Journal snapshot failed, retried after the next commit: {error}")
+
+    def snapshot(self):
+        path = os.path.join(self.directory, "snapshot.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"seq": self.seq, "state": self.state.to_dict()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        segment = segment_path(self.directory, self.seq + 1)
+        new_file = open(segment, "ab")
+        self.file.close()
+        self.file, self.path, self.valid = new_file, segment, 0
+        fsync_directory(self.directory)
+        for old in segments(self.directory)[:-1]:
+            os.remove(old)
+        self.since_snapshot = 0
+
+    def reopen(self):
+        """After a failed write: cut the segment back to its last durable record"""
+        try:
+            self.file.close()  # Flushing what is still buffered may fail again
+        except OSError:
+            pass
+        try:
+            self.file = open(self.path, "ab")
+            self.file.truncate(self.valid)
+        except OSError as error:
+            print(f"[WARN] Journal segment could not be reopened: {error}")
+
+    def close(self):
+        self.queue.put_nowait(None)
+        self.thread.join(CLOSE_TIMEOUT_S)
+        if self.thread.is_alive():
+            print("[WARN] Journal writer still busy, closing without it")
+            return
+        self.file.close()
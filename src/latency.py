@@ -0,0 +1,107 @@
+import bisect
+import time
+from collections import deque
+
+# Pipeline stages in the order a twitch passes through them
+STAGES = ("sent", "serial_rx", "signal", "decision", "inject")
+
+# Histogram bucket upper edges in milliseconds, last bucket is open ended
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def now_ns():
+    return time.perf_counter_ns()
+
+
+# Fixed-bucket latency histogram with a bounded window of raw samples for percentiles
+class LatencyHistogram:
+    def __init__(self, max_samples=1000):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=max_samples)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.samples.append(ms)
+        self.total += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def bucket_rows(self):
+        lower = 0
+        for edge, count in zip(BUCKETS_MS + (None,), self.counts):
+            label = f"{lower}-{edge}ms" if edge is not None else f">{lower}ms"
+            yield label, count
+            lower = edge
+
+
+# Per-event stage timestamps for the twitch -> keystroke path
+#
+# "total" is twitch to keystroke. A selection that types nothing (a row, Skip,
+# Speak) ends at "decision" and goes to "no_key" instead.
+class LatencyTracker:
+    def __init__(self, max_records=5000):
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES[1:]}
+        self.histograms["total"] = LatencyHistogram()
+        self.histograms["no_key"] = LatencyHistogram()
+        self.records = deque(maxlen=max_records)
+        self.current = None
+
+    def begin(self, rx_ns, sent_ns=None):
+        """Start tracking a twitch received at rx_ns and mark its signal delivery now"""
+        self.current = {"serial_rx": rx_ns}
+        if sent_ns is not None:
+            self.current["sent"] = sent_ns
+        self.current["signal"] = now_ns()
+        return self.current
+
+    def mark(self, stage):
+        if self.current is not None:
+            self.current[stage] = now_ns()
+
+    def detach(self):
+        """Hand the current record to whoever stamps its last stage, finish(record) takes it back"""
+        record, self.current = self.current, None
+        return record
+
+    def finish(self, event=None):
+        if event is None:
+            event, self.current = self.current, None
+        if event is None:
+            return None
+        previous = None
+        for stage in STAGES:
+            if stage not in event:
+                continue
+            if previous is not None:
+                self.histograms[stage].add((event[stage] - event[previous]) / 1e6)
+            previous = stage
+        first = next(stage for stage in STAGES if stage in event)
+        total = "total" if "inject" in event else "no_key"
+        self.histograms[total].add((event[previous] - event[first]) / 1e6)
+        self.records.append(event)
+        return event
+
+    def summary(self):
+        total = self.histograms["total"]
+        return (f"Latency: p50 {total.percentile(50):.1f}ms  p95 {total.percentile(95):.1f}ms  "
+                f"max {total.max_ms:.1f}ms  (n={total.total})")
+
+    def dump(self, path):
+        """Write every recorded event as CSV followed by the per-stage histograms"""
+        with open(path, "w") as f:
+            f.write(",".join(STAGES) + "\n")
+            for event in self.records:
+                f.write(",".join(str(event.get(stage, "")) for stage in STAGES) + "\n")
+            f.write("\n")
+            for stage, histogram in self.histograms.items():
+                f.write(f"# {stage}: p50={histogram.percentile(50):.3f}ms "
+                        f"p95={histogram.percentile(95):.3f}ms max={histogram.max_ms:.3f}ms\n")
+                for label, count in histogram.bucket_rows():
+                    f.write(f"#   {label}: {count}\n")
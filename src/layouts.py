@@ -0,0 +1,273 @@
+import heapq
+import itertools
+import random
+from collections import Counter
+
+# Relative key frequencies for English typing. Letters follow the usual English
+# letter distribution, space is roughly one character in six. Control keys get
+# estimated usage weights; SOS is weighted like a mid-frequency letter so it
+# never ends up in the slowest corner of a generated layout.
+LETTER_FREQUENCIES = {
+    'E': 12.7, 'T': 9.1, 'A': 8.2, 'O': 7.5, 'I': 7.0, 'N': 6.7, 'S': 6.3, 'H': 6.1,
+    'R': 6.0, 'D': 4.3, 'L': 4.0, 'C': 2.8, 'U': 2.8, 'M': 2.4, 'W': 2.4, 'F': 2.2,
+    'G': 2.0, 'Y': 2.0, 'P': 1.9, 'B': 1.5, 'V': 0.98, 'K': 0.77, 'J': 0.15, 'X': 0.15,
+    'Q': 0.095, 'Z': 0.074,
+}
+KEY_FREQUENCIES = dict(
+    {key: value * 0.8 for key, value in LETTER_FREQUENCIES.items()},
+    **{'␣': 18.0, '.': 1.0, '⏎': 0.3, '⌫': 2.0, 'Speak': 0.3, 'SOS': 2.0},
+    **{digit: 0.05 for digit in '0123456789'},
+)
+
+SKIP = 'Skip'
+
+# The hand-made layout: Speak, SOS and Skip on top, then alphabetical, Skip ending every row
+ALPHABETICAL_LAYOUT = [
+    ['Speak', 'SOS', 'Skip'],
+    ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'Skip'],
+    ['K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'Skip'],
+    ['U', 'V', 'W', 'X', 'Y', 'Z', '1', '2', '3', '4', 'Skip'],
+    ['5', '6', '7', '8', '9', '0', '␣', '⌫', '⏎', '.', 'Skip']
+]
+
+
+def key_for_char(char):
+    """Keyboard key that types char, or None if the layouts have no key for it"""
+    if char == ' ':
+        return '␣'
+    if char == '\n':
+        return '⏎'
+    char = char.upper()
+    return char if char in KEY_FREQUENCIES else None
+
+
+def keys_for_text(text):
+    return [key for key in map(key_for_char, text) if key is not None]
+
+
+def frequencies_from_text(text):
+    return dict(Counter(keys_for_text(text)))
+
+
+def bigrams_from_text(text):
+    keys = keys_for_text(text)
+    return dict(Counter(zip(keys, keys[1:])))
+
+
+def key_positions(keyboard):
+    """Map each key to its (row, col), first occurrence wins"""
+    positions = {}
+    for row_idx, row in enumerate(keyboard):
+        for col_idx, key in enumerate(row):
+            positions.setdefault(key, (row_idx, col_idx))
+    return positions
+
+
+# Row/column scanning cost
+#
+# Selecting (row, col) costs the ticks spent moving the highlight plus two twitches.
+# With resume_row=True row scanning carries on from the row of the previous key, which
+# is what MuscleKeyboard does; otherwise it restarts at the top row after every key.
+def grid_ticks(keyboard, previous_row, target, resume_row=True):
+    row, col = target
+    start = previous_row if resume_row else 0
+    return (row - start) % len(keyboard) + col
+
+
+def expected_ticks(keyboard, frequencies, bigrams=None, resume_row=True):
+    """Expected scan ticks per key press under a unigram (or bigram, if given) model"""
+    positions = key_positions(keyboard)
+    if bigrams and resume_row:
+        total = sum(count for (a, b), count in bigrams.items() if a in positions and b in positions)
+        cost = sum(count * grid_ticks(keyboard, positions[a][0], positions[b], True)
+                   for (a, b), count in bigrams.items() if a in positions and b in positions)
+        return cost / total if total else 0.0
+    total = sum(count for key, count in frequencies.items() if key in positions)
+    return sum(count * grid_ticks(keyboard, 0, positions[key], False)
+               for key, count in frequencies.items() if key in positions) / total
+
+
+def build_frequency_layout(frequencies=None, max_cols=11, skip_column=True):
+    """Row/column layout where frequent keys sit in the cells reached in the fewest ticks
+
+    Cells are ranked by row + col ticks from the top-left and the most frequent keys
+    are dealt into the cheapest ones, which is optimal when scanning restarts at the
+    top row. 'Skip' is appended to every row like the hand-made layout.
+    """
+    frequencies = KEY_FREQUENCIES if frequencies is None else frequencies
+    keys = sorted(frequencies, key=lambda key: (-frequencies[key], key))
+    rows_needed = len(keys)  # Upper bound, triangular fill never needs more
+    cells = sorted(((r, c) for r in range(rows_needed) for c in range(max_cols)),
+                   key=lambda cell: (cell[0] + cell[1], cell[0]))[:len(keys)]
+    keyboard = [[] for _ in range(max(r for r, _ in cells) + 1)]
+    for (row, col), key in sorted(zip(cells, keys)):
+        keyboard[row].append(key)
+    if skip_column:
+        keyboard = [row + [SKIP] if len(row) > 1 else row for row in keyboard]
+    return keyboard
+
+
+def optimize_layout(keyboard, bigrams, iterations=20000, seed=0):
+    """Hill-climb by swapping keys to cut expected ticks under a bigram model (resumed rows)"""
+    import numpy as np  # Only needed here, the GUI should not load it at startup
+    keyboard = [list(row) for row in keyboard]
+    cells = [(r, c) for r, row in enumerate(keyboard) for c, key in enumerate(row) if key != SKIP]
+    keys = [keyboard[r][c] for r, c in cells]
+    index = {key: i for i, key in enumerate(keys)}
+    counts = np.zeros((len(keys), len(keys)))
+    for (a, b), count in bigrams.items():
+        if a in index and b in index:
+            counts[index[a], index[b]] += count
+    rows = np.array([r for r, _ in cells])
+    cols = np.array([c for _, c in cells])
+    slot = np.arange(len(keys))  # slot[key] -> cell holding it
+
+    def cost():
+        r, c = rows[slot], cols[slot]
+        return (counts * ((r[None, :] - r[:, None]) % len(keyboard) + c[None, :])).sum()
+
+    rng = random.Random(seed)
+    best = cost()
+    for _ in range(iterations):
+        a, b = rng.sample(range(len(keys)), 2)
+        slot[a], slot[b] = slot[b], slot[a]
+        candidate = cost()
+        if candidate < best:
+            best = candidate
+        else:
+            slot[a], slot[b] = slot[b], slot[a]
+    for key, cell in zip(keys, slot):
+        r, c = cells[cell]
+        keyboard[r][c] = key
+    return keyboard
+
+
+# n-ary Huffman scanning
+#
+# The keys are leaves of an n-ary tree. Each level highlights its children in turn
+# (heaviest first) and a twitch descends into the highlighted one, so a key costs
+# the sum of child positions along its path in ticks plus one twitch per level.
+class HuffmanNode:
+    def __init__(self, weight, key=None, children=()):
+        self.weight = weight
+        self.key = key
+        self.children = list(children)
+
+    @property
+    def is_leaf(self):
+        return self.key is not None
+
+    def keys(self):
+        if self.is_leaf:
+            return [self.key]
+        return [key for child in self.children for key in child.keys()]
+
+    def label(self, limit=6):
+        keys = self.keys()
+        text = " ".join(keys[:limit])
+        return text + " …" if len(keys) > limit else text
+
+
+def build_huffman_tree(frequencies=None, branching=4):
+    frequencies = KEY_FREQUENCIES if frequencies is None else frequencies
+    counter = itertools.count()  # Tie breaker so heapq never compares nodes
+    heap = [(weight, next(counter), HuffmanNode(weight, key)) for key, weight in sorted(frequencies.items())]
+    # Pad with empty leaves so every merge takes exactly `branching` nodes
+    while (len(heap) - 1) % (branching - 1):
+        heap.append((0, next(counter), None))
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        group = [heapq.heappop(heap) for _ in range(branching)]
+        children = [node for _, _, node in group if node is not None]
+        children.sort(key=lambda node: -node.weight)
+        weight = sum(node.weight for node in children)
+        heapq.heappush(heap, (weight, next(counter), HuffmanNode(weight, children=children)))
+    return heap[0][2]
+
+
+def huffman_paths(root):
+    """Map each key to the child indices picked on the way down"""
+    paths = {}
+    stack = [(root, [])]
+    while stack:
+        node, path = stack.pop()
+        if node.is_leaf:
+            paths[node.key] = path
+        for index, child in enumerate(node.children):
+            stack.append((child, path + [index]))
+    return paths
+
+
+# Scanning state machine over a Huffman tree, used for the "huffman" layout mode.
+# Below the root a 'Skip' item follows the children so a wrong pick can be undone.
+class HuffmanScanner:
+    def __init__(self, root):
+        self.root = root
+        self.back = HuffmanNode(0, SKIP)
+        self.node = root
+        self.index = 0
+
+    def items(self):
+        if self.node is self.root:
+            return self.node.children
+        return self.node.children + [self.back]
+
+    def highlighted(self):
+        return self.items()[self.index]
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self.items())
+
+    def select(self):
+        """Descend into the highlighted item, returning its key once a leaf is reached"""
+        item = self.highlighted()
+        if item.is_leaf:
+            self.reset()
+            return item.key
+        self.node = item
+        self.index = 0
+        return None
+
+    def reset(self):
+        self.node = self.root
+        self.index = 0
+
+
+# Offline simulator: expected cost and chars/min of a layout for a text
+def simulate_grid(keyboard, text, dwell_ms=1000, reaction_ms=400, resume_row=True):
+    positions = key_positions(keyboard)
+    ticks = twitches = keys = 0
+    row = 0
+    for key in keys_for_text(text):
+        if key not in positions:
+            continue
+        target = positions[key]
+        ticks += grid_ticks(keyboard, row, target, resume_row)
+        twitches += 2
+        keys += 1
+        row = target[0] if resume_row else 0
+    return simulation_report(keys, ticks, twitches, dwell_ms, reaction_ms)
+
+
+def simulate_huffman(root, text, dwell_ms=1000, reaction_ms=400):
+    paths = huffman_paths(root)
+    ticks = twitches = keys = 0
+    for key in keys_for_text(text):
+        if key not in paths:
+            continue
+        ticks += sum(paths[key])
+        twitches += len(paths[key])
+        keys += 1
+    return simulation_report(keys, ticks, twitches, dwell_ms, reaction_ms)
+
+
+def simulation_report(keys, ticks, twitches, dwell_ms, reaction_ms):
+    # Each tick waits out a full dwell, each twitch lands reaction_ms after its item lights up
+    total_ms = ticks * dwell_ms + twitches * reaction_ms
+    return {
+        "keys": keys,
+        "ticks_per_char": ticks / keys if keys else 0.0,
+        "twitches_per_char": twitches / keys if keys else 0.0,
+        "ms_per_char": total_ms / keys if keys else 0.0,
+        "chars_per_min": 60000 * keys / total_ms if total_ms else 0.0,
+    }
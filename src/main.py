@@ -1,24 +1,92 @@
+import json
 import sys
-import serial
 import time
-import pyautogui
-import pyttsx3
-from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton, QVBoxLayout
+from collections import deque
+from transport import ReconnectingTransport
+from speech import SpeechWorker
+from highlight import HighlightRenderer, PointerOverlay
+from latency import LatencyTracker, now_ns
+from protocol import Event, command_reset, command_raw_mode
+from scan_timing import AdaptiveScanTiming
+from scan_scheduler import HighlightHistory, ScanScheduler
+from layouts import ALPHABETICAL_LAYOUT, SKIP, build_frequency_layout, build_huffman_tree
+from scan_engine import ScanEngine
+from planner import ScanPlanner
+from prediction import PREDICTION_KEYS, Predictor, load_index
+from injection import InjectionWorker
+from morse import MorseDecoder
+from pointer import PointerScanner
+from mobility import DRIVE_ITEMS, DriveScanner, MobilityClient, mobility_event
+from event_bus import EventBus
+from device import DevicePipeline
+from acquisition import AcquisitionClient
+from journal import Journal
+from sos import FIRST_ALERT_BUDGET_MS, AlarmChannel, EmailChannel, SosDispatcher, SpokenChannel, WebhookChannel
+from telemetry import STATS, timed
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton, QVBoxLayout, QShortcut
 from PyQt5.QtCore import QTimer, QThread, pyqtSignal
-from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtGui import QColor, QKeySequence, QPainter
+
+# Scanning layout: "alphabetical", "frequency" (frequent keys in the cheapest cells,
+# scanning restarts at the top after each key) or "huffman" (a tree of key groups,
+# one row of HUFFMAN_BRANCHING groups plus Skip). Compare them with
+# benchmarks/compare_layouts.py
+LAYOUT = "alphabetical"
+HUFFMAN_BRANCHING = 4
+PREDICTION = True  # Row of word predictions on top of the grid layouts
+INJECTION_BACKEND = "auto"  # "auto", "xdotool", "pyautogui" or "null" to type nowhere
+AUTOTYPE_TEXT = ""  # Demo: typed by the scan itself at startup, in the fewest ticks
+MORSE_POLL_MS = 20  # How often Morse mode checks whether a pause has ended a letter
+TELEMETRY = False  # Collect timings from startup, otherwise from the first Ctrl+D (diagnostics window)
+
+# Sensor channels -> actions ("select", "back" or "speak"). A rule fires once the weights
+# of its channels that twitched within 100ms add up to 1, so {"accel": 0.5, "ir": 0.5}
+# needs both sensors to agree. Compare rules with benchmarks/sensor_fusion.py
+IR_SENSOR = False  # A TCRT5000 is wired and IR_ENABLED set in interface.ino, its twitches go back
+SENSOR_RULES = [("select", {"accel": 1.0})]
+if IR_SENSOR:
+    SENSOR_RULES.append(("back", {"ir": 1.0}))
+SENSOR_OFFSETS_MS = {"ir": 0}  # Added to a channel's twitch times to line it up with the accelerometer
+SENSOR_ACTIONS = ("select", "back", "speak")
+
+# SOS goes out on every channel at once: a local alarm, the spoken message and, when
+# set, a webhook and an e-mail. Both are off until configured; to try them against the
+# local stand-ins of benchmarks/sos_dispatch.py --serve, set "http://127.0.0.1:8025/sos"
+# and ("127.0.0.1", 8026, "liberate@localhost", ["caregiver@localhost"])
+SOS_MESSAGE = "SOS - EMERGENCY HELP NEEDED"
+SOS_WEBHOOK_URL = ""  # Caregiver webhook URL, "" for none
+SOS_EMAIL = None  # (SMTP host, port, from, [to, ...]), None for none
 
 # Define keyboard layout with Speak, SOS, and Skip button
-keyboard = [
-    ['Speak', 'SOS', 'Skip'],
-    ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'Skip'],
-    ['K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'Skip'],
-    ['U', 'V', 'W', 'X', 'Y', 'Z', '1', '2', '3', '4', 'Skip'],
-    ['5', '6', '7', '8', '9', '0', '␣', '⌫', '⏎', '.', 'Skip']
-]
-
-# Define serial port (Update this based on your system)
-SERIAL_PORT = "COM3" 
+if LAYOUT == "frequency":
+    keyboard = build_frequency_layout()
+elif LAYOUT == "huffman":
+    keyboard = [[''] * (HUFFMAN_BRANCHING + 1)]  # Relabelled for every level of the tree
+else:
+    keyboard = ALPHABETICAL_LAYOUT
+if PREDICTION and LAYOUT != "huffman":
+    keyboard = [list(PREDICTION_KEYS) + ['Skip']] + keyboard
+
+# Device to read: "auto" finds an ESP32 on USB serial, otherwise a port name like "COM3"
+# or a URL: serial:///dev/ttyUSB0, rfcomm://AA:BB:CC:DD:EE:FF/1 (Bluetooth serial),
+# tcp://192.168.4.1:3333, pty:///dev/pts/5 (src/esp32_sim.py) or loopback://
+DEVICE = "auto"
 BAUD_RATE = 115200
+# "process": the device is read and twitches detected in a process of its own
+# (src/acquisition.py), so nothing the GUI does can delay them; "thread": on a
+# thread of this process. Compare them with benchmarks/acquisition_stress.py
+ACQUISITION = "process"
+# Wheelchair drive controller, any device URL as above (pty:///dev/pts/N for
+# src/drive_sim.py); None leaves out Drive Mode. Its control loop runs in a process
+# of its own, fed by the device reader, see src/mobility.py and
+# benchmarks/mobility_watchdog.py
+MOBILITY_DEVICE = None
+
+# Calibration profile for the current user (~/.liberate/profiles/<name>.json)
+PROFILE_NAME = "default"
+CALIBRATION_REST_MS = 10000
+CALIBRATION_CUES = 10
+CALIBRATION_CUE_INTERVAL_MS = 2500
 
 # Power Indicator Widget
 class PowerIndicator(QWidget):
@@ -39,44 +107,222 @@ class PowerIndicator(QWidget):
 
 # Serial Reader Thread
 class SerialThread(QThread):
-    data_received = pyqtSignal(str)
+    events_ready = pyqtSignal()  # Something was published on self.bus
+    calibration_finished = pyqtSignal(object)  # Fitted parameters, None if there was too little data
 
     def __init__(self):
         super().__init__()
-        self.ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        time.sleep(2)
+        # Opened and reopened on this thread, so the GUI never waits for the device
+        self.link = ReconnectingTransport(DEVICE, BAUD_RATE, on_status=self.link_status)
+        # Twitches become actions here, consumers get (protocol.Event, host receive ns, host event ns)
+        # from the bus, the event time by the device clock where the device sent one
+        self.device = DevicePipeline(self.send_command, SENSOR_RULES, SENSOR_OFFSETS_MS, PROFILE_NAME,
+                                     on_calibrated=self.calibration_finished.emit, on_samples=self.observe)
+        self.mobility = MobilityClient(MOBILITY_DEVICE, self.mobility_changed) if MOBILITY_DEVICE else None
+        self.bus = EventBus()
         self.running = True
 
     def run(self):
+        # Calibration and DSP pull in numpy, loading them here keeps it off the startup path
+        self.device.load_profile()
+        if self.mobility is not None:
+            self.mobility.start()
+        # Blocks inside read() until bytes arrive instead of spinning on in_waiting
         while self.running:
-            if self.ser.in_waiting:
-                line = self.ser.readline().decode().strip()
-                self.data_received.emit(line)
+            chunk = self.link.read_chunk()
+            rx_ns = now_ns()
+            for event in self.device.feed(chunk, rx_ns) if chunk else ():
+                event_ns = self.device.clock.host_ns(event.device_ms, rx_ns)
+                self.observe(event, rx_ns, event_ns)
+                if event.kind != "heartbeat":  # Only the watchdog wants those
+                    self.bus.publish((event, rx_ns, event_ns))
+
+    def observe(self, event, rx_ns, event_ns=None):
+        if self.mobility is not None:
+            self.mobility.observe(event, rx_ns, event_ns)
+
+    def mobility_changed(self, motion, reason):
+        rx_ns = now_ns()  # On the MobilityClient's thread
+        self.bus.publish((mobility_event(motion, reason), rx_ns, rx_ns))
+
+    def link_status(self, state, url):
+        if state == "connected":
+            self.device.connected()
+        rx_ns = now_ns()
+        event = Event("link", None, None, f"{state} {url}".encode())
+        self.observe(event, rx_ns)
+        self.bus.publish((event, rx_ns, rx_ns))
+
+    def stats(self):
+        stats = {"frames": self.device.decoder.stats(), "fusion": self.device.fusion.stats()}
+        if self.mobility is not None:
+            stats["mobility"] = self.mobility.stats()
+        return stats
+
+    def request_calibration(self, action):
+        """Queue a calibration step from the GUI: "rest", "twitch", "cue" or "fit"""
+        self.device.request_calibration(action)
+
+    def send_command(self, command):
+        self.link.write(command)  # Dropped while there is no device
+
+    def drive(self, motion):
+        if self.mobility is not None:
+            self.mobility.drive(motion)
 
     def stop(self):
         self.running = False
-        self.ser.close()
+        self.link.cancel()
+        self.wait()
+        if self.mobility is not None:
+            self.mobility.close()
+        self.link.close()
+
+
+# The GUI's side of the acquisition process: wakes the GUI when the ring has events
+class AcquisitionThread(QThread):
+    events_ready = pyqtSignal()
+    calibration_finished = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.client = AcquisitionClient(DEVICE, BAUD_RATE, SENSOR_RULES, SENSOR_OFFSETS_MS, PROFILE_NAME,
+                                        drive_url=MOBILITY_DEVICE)
+        self.armed = True  # At most one events_ready queued, as with a bus subscription
+
+    def run(self):
+        # Starts the process here, then sleeps on its doorbell
+        while self.client.wait():
+            if self.armed:
+                self.armed = False
+                self.events_ready.emit()
+
+    def drain(self):
+        """Yield (protocol.Event, host receive ns, host event ns) from the ring, GUI thread only"""
+        self.armed = True
+        if self.client.stopped.is_set():
+            return  # A wakeup still queued after closing
+        for event, rx_ns, event_ns, _ in self.client.drain():
+            if event.kind == "calibrated":
+                self.calibration_finished.emit(json.loads(event.payload))
+            else:
+                yield event, rx_ns, event_ns
+
+    def backlog(self):
+        """Bytes waiting in the ring"""
+        return self.client.ring.backlog()
+
+    @property
+    def dropped(self):
+        return self.client.ring.dropped
+
+    def send_command(self, command):
+        self.client.send_command(command)
+
+    def request_calibration(self, action):
+        self.client.request_calibration(action)
+
+    def drive(self, motion):
+        self.client.drive(motion)
+
+    def stats(self):
+        return self.client.stats()
+
+    def stop(self):
+        self.client.stop()
+        self.wait()
+        self.client.close()
 
 # Main GUI Class
 class MuscleKeyboard(QWidget):
+    sos_update = pyqtSignal(str, str, str)  # SOS channel, state, detail, from the dispatcher threads
+
     def __init__(self):
         super().__init__()
-        self.current_row = 0
-        self.current_col = 0
-        self.selecting_row = True
-        self.typed_message = ""
-        self.speech_engine = pyttsx3.init()
+        tree = build_huffman_tree(branching=HUFFMAN_BRANCHING) if LAYOUT == "huffman" else None
+        self.engine = ScanEngine(keyboard, tree, restart_at_top=LAYOUT == "frequency")
+        self.planner = ScanPlanner(keyboard, tree, restart_at_top=LAYOUT == "frequency")
+        self.autotype = deque()  # Keys still to be typed by play_text()
+        # Message and power state survive a crash or restart, replayed from the journal
+        self.journal = Journal()
+        self.typed_message = self.journal.state.message
+        self.restored_power = self.journal.state.power
+        self.journal.append("session")
         self.buttons = []
+        self.latency = LatencyTracker()
+        self.calibrating = False
+        self.calibration_cues = 0
+        self.scan_timing = AdaptiveScanTiming()
+        self.highlight_ns = now_ns()
+        self.highlights = HighlightHistory()  # Recent items of the current row, for late twitches
+        self.predictor = None  # Created by start_services()
+        self.prediction_buttons = []
+        self.morse = None  # MorseDecoder while in Morse mode, twitches are keyed instead of scanning
+        self.pointer = None  # PointerScanner while in pointer mode, the scan subdivides the screen
+        self.pointer_overlay = None  # Created on the first switch to pointer mode
+        self.drive = None  # DriveScanner while in drive mode, the scan picks wheelchair motions
+        self.driving = None  # Motion the mobility process reports running, the scan is parked on it
+        self.diagnostics = None  # Created on the first Ctrl+D
+        self.sos = None  # SosDispatcher, created by start_services()
+        self.sos_states = {}
+        STATS.enabled = TELEMETRY
+        # Subsystems that start after the window, shown until each reports in
+        self.readiness = {"Device": "connecting", "Speech": "starting", "Keys": "starting"}
+        if PREDICTION and LAYOUT != "huffman":
+            self.readiness["Predictions"] = "loading"
+        if MOBILITY_DEVICE:
+            self.readiness["Drive"] = "stopped"
+
+        # Speech and key injection set up their engines on their own threads
+        self.speech = SpeechWorker()
+        self.speech.ready.connect(lambda ok: self.set_ready("Speech", "ready" if ok else "unavailable"))
+        self.injector = InjectionWorker(INJECTION_BACKEND)  # Keys are typed into other apps from a worker
+        self.injector.ready.connect(lambda name: self.set_ready("Keys", name.replace("Backend", "").lower()))
+        self.injector.injected.connect(self.keys_injected)
 
         self.initUI()
         
-        self.serial_thread = SerialThread()
-        self.serial_thread.data_received.connect(self.handle_serial_data)
-        self.serial_thread.start()
+        if ACQUISITION == "process":
+            self.acquisition = AcquisitionThread()
+            self.events = self.acquisition
+        else:
+            self.acquisition = SerialThread()
+            self.events = self.acquisition.bus.subscribe(notify=self.acquisition.events_ready.emit)
+        self.acquisition.events_ready.connect(self.drain_events)
+        self.acquisition.calibration_finished.connect(self.calibration_finished)
+
+        # Scanning starts with the window, everything else once it is on screen
+        self.scheduler = ScanScheduler(self.move_selection, self)
+        self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, self.engine.first_item))
+        self.morse_timer = QTimer(self)
+        self.morse_timer.timeout.connect(self.poll_morse)
+        self.play_text(AUTOTYPE_TEXT)
+        QTimer.singleShot(0, self.start_services)
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.move_selection)
-        self.timer.start(1000)
+    def start_services(self):
+        self.acquisition.start()
+        self.speech.start()
+        self.injector.start()
+        self.start_sos()
+        if "Predictions" in self.readiness:
+            self.predictor = Predictor(load_index())  # Only slow the first time, when it builds the index
+            self.update_predictions()
+            self.set_ready("Predictions", "ready")
+
+    def start_sos(self):
+        if self.sos is not None:
+            return
+        channels = [AlarmChannel(), SpokenChannel(SOS_MESSAGE)]
+        if SOS_WEBHOOK_URL:
+            channels.append(WebhookChannel(SOS_WEBHOOK_URL))
+        if SOS_EMAIL:
+            channels.append(EmailChannel(*SOS_EMAIL))
+        self.sos_update.connect(self.show_sos_update)
+        self.sos = SosDispatcher(channels, on_update=self.sos_update.emit)  # Channels get ready on their threads
+
+    def set_ready(self, name, state):
+        self.readiness[name] = state
+        self.status_label.setText("  |  ".join(f"{name}: {state}" for name, state in self.readiness.items()))
 
     def initUI(self):
         self.setWindowTitle("Liberate - Muscle-Controlled Keyboard")
@@ -86,103 +332,526 @@ class MuscleKeyboard(QWidget):
         self.setLayout(main_layout)
 
         self.power_indicator = PowerIndicator()
+        self.power_indicator.set_power_status(self.restored_power)  # Until the device answers STATUS
         main_layout.addWidget(self.power_indicator)
 
-        self.display_label = QLabel("Message: ", self)
+        self.display_label = QLabel(f"Message: {self.typed_message}", self)
         main_layout.addWidget(self.display_label)
 
+        self.status_label = QLabel(self)
+        main_layout.addWidget(self.status_label)
+
+        self.sos_label = QLabel(self)
+        self.sos_label.setStyleSheet("background-color: red; color: white; font-weight: bold")
+        self.sos_label.setVisible(False)
+        main_layout.addWidget(self.sos_label)
+        self.sos_ack_button = QPushButton("Help Is Here (Stop SOS)")
+        self.sos_ack_button.clicked.connect(self.acknowledge_sos)
+        self.sos_ack_button.setVisible(False)
+        main_layout.addWidget(self.sos_ack_button)
+        self.set_ready("Device", self.readiness["Device"])
+
         self.layout = QGridLayout()
         main_layout.addLayout(self.layout)
 
+        base_colors = {}
         for row_idx, row in enumerate(keyboard):
             button_row = []
             for col_idx, key in enumerate(row):
                 button = QPushButton(key)
                 if key in ["Speak", "SOS"]:
-                    button.setStyleSheet("background-color: lightblue;")
+                    base_colors[(row_idx, col_idx)] = "lightblue"
+                if key in PREDICTION_KEYS:
+                    self.prediction_buttons.append(button)
                 self.layout.addWidget(button, row_idx, col_idx)
                 button_row.append(button)
             self.buttons.append(button_row)
+        self.highlighter = HighlightRenderer(self.buttons, base_colors)
+        self.highlighter.reset()
+        self.relabel_tree()
+        self.update_predictions()
+
+        self.drive_buttons = []
+        if MOBILITY_DEVICE:
+            drive_layout = QGridLayout()
+            main_layout.addLayout(drive_layout)
+            for col_idx, label in enumerate(DRIVE_ITEMS):
+                button = QPushButton(label)
+                button.setVisible(False)  # Shown in drive mode
+                drive_layout.addWidget(button, 0, col_idx)
+                self.drive_buttons.append(button)
+            self.drive_highlighter = HighlightRenderer([self.drive_buttons])
 
         self.reset_button = QPushButton("Reset Baseline")
         self.reset_button.clicked.connect(self.reset_baseline)
         main_layout.addWidget(self.reset_button)
 
+        self.calibrate_button = QPushButton("Calibrate")
+        self.calibrate_button.clicked.connect(self.start_calibration)
+        main_layout.addWidget(self.calibrate_button)
+
+        self.morse_button = QPushButton("Morse Mode")
+        self.morse_button.clicked.connect(self.toggle_morse)
+        main_layout.addWidget(self.morse_button)
+
+        self.pointer_button = QPushButton("Pointer Mode")
+        self.pointer_button.clicked.connect(self.toggle_pointer)
+        main_layout.addWidget(self.pointer_button)
+
+        if MOBILITY_DEVICE:
+            self.drive_button = QPushButton("Drive Mode")
+            self.drive_button.clicked.connect(self.toggle_drive)
+            main_layout.addWidget(self.drive_button)
+
+        self.latency_label = QLabel(self.latency.summary(), self)
+        main_layout.addWidget(self.latency_label)
+
+        self.dump_latency_button = QPushButton("Dump Latency")
+        self.dump_latency_button.clicked.connect(self.dump_latency)
+        main_layout.addWidget(self.dump_latency_button)
+
+        QShortcut(QKeySequence("Ctrl+D"), self).activated.connect(self.show_diagnostics)
+
         self.update_highlight()
 
+    def show_diagnostics(self):
+        if self.diagnostics is None:
+            from diagnostics import DiagnosticsPanel
+            self.diagnostics = DiagnosticsPanel({
+                "Frames": lambda: self.acquisition.stats().get("frames"),
+                "Fusion": lambda: self.acquisition.stats().get("fusion"),
+                "Ring": lambda: self.acquisition.stats().get("ring", "not used, acquisition on a thread"),
+                "Mobility": lambda: self.acquisition.stats().get("mobility", "off"),
+                "Journal": lambda: f"seq {self.journal.committed_seq}, {self.journal.commits} commits, "
+                                   f"{self.journal.errors} errors",
+            })
+        self.diagnostics.show()
+        self.diagnostics.raise_()
+
+    @timed("update_highlight")
     def update_highlight(self):
-        for row_idx, row in enumerate(self.buttons):
-            for col_idx, button in enumerate(row):
-                if self.selecting_row and row_idx == self.current_row:
-                    button.setStyleSheet("background-color: yellow;")
-                elif not self.selecting_row and row_idx == self.current_row and col_idx == self.current_col:
-                    button.setStyleSheet("background-color: orange;")
-                else:
-                    button.setStyleSheet("")
+        if self.pointer is not None:
+            self.pointer_overlay.render(self.pointer)
+        elif self.drive is not None:
+            self.drive_highlighter.render(0, self.drive.index, False)
+        elif self.engine.tree is not None:
+            self.highlighter.render(0, self.engine.current_col, False)
+        else:
+            self.highlighter.render(self.engine.current_row, self.engine.current_col, self.engine.selecting_row)
+        self.highlight_ns = now_ns()
+        self.highlights.shown(self.highlight_ns, self.scanner().position())
+
+    def scanner(self):
+        """What the scan ticks move: the pointer or drive scanner in those modes, the keyboard otherwise"""
+        if self.pointer is not None:
+            return self.pointer
+        return self.drive if self.drive is not None else self.engine
+
+    def relabel_tree(self):
+        """Show the groups of the current tree level, only done when the level changes"""
+        if self.engine.tree is None:
+            return
+        items = self.engine.tree.items()
+        for col_idx, button in enumerate(self.buttons[0]):
+            button.setText(items[col_idx].label() if col_idx < len(items) else '')
+            button.setVisible(col_idx < len(items))
+
+    def play_text(self, text):
+        """Type text hands-free along the planner's shortest path, for demos and macros"""
+        self.autotype.extend(self.planner.keys_for_text(text))
 
+    def start_scan_timer(self, ms):
+        self.scheduler.start(ms, self.highlight_ns)  # The dwell counts from when the item was shown
+
+    @timed("move_selection")
     def move_selection(self):
-        if self.selecting_row:
-            self.current_row = (self.current_row + 1) % len(keyboard)
-        else:
-            self.current_col = (self.current_col + 1) % len(keyboard[self.current_row])
+        if self.pointer is not None or self.drive is not None:
+            self.scanner().advance()
+            self.update_highlight()
+            self.start_scan_timer(self.scan_timing.dwell(False))
+            return
+        if self.autotype and self.planner.on_path(self.engine, self.autotype[0]):
+            self.confirm_selection()
+            return
+        self.engine.advance()
         self.update_highlight()
+        self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row))
 
+    @timed("confirm_selection")
     def confirm_selection(self):
-        if self.selecting_row:
-            self.selecting_row = False
-            self.current_col = 0
-        else:
-            selected_key = keyboard[self.current_row][self.current_col]
-            if selected_key == 'Skip':
-                self.selecting_row = True
-            elif selected_key == 'Speak':
-                self.speak_message()
-                self.selecting_row = True
-            elif selected_key == 'SOS':
-                self.sos_alert()
-                self.selecting_row = True
-            else:
-                self.type_key(selected_key)
-                self.selecting_row = True
+        self.latency.mark("decision")
+        selected_key = self.engine.confirm()
+        self.journal.append("select", selected_key)
+        STATS.count("selections")
+        if self.autotype and selected_key == self.autotype[0]:
+            self.autotype.popleft()
+        if selected_key is not None:
+            self.activate_key(selected_key)
+        self.relabel_tree()
+        self.highlights.clear()
         self.update_highlight()
+        self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, first_item=True))
 
+    def confirm_pointer(self):
+        self.injector.pointer(self.pointer.confirm())  # The pointer moves on the injection worker
+        STATS.count("pointer_selections")
+        self.highlights.clear()
+        self.update_highlight()
+        self.start_scan_timer(self.scan_timing.dwell(False, first_item=True))
+
+    def confirm_drive(self):
+        label = self.drive.highlighted()
+        if label == "Exit":
+            self.toggle_drive()
+            return
+        motion = label.lower()
+        self.acquisition.drive(motion)  # Selecting the running motion again renews its deadman
+        self.journal.append("drive", motion)
+        if self.driving is None:
+            # The scan parks once the controller reports the motion running, a refused one scans on
+            self.drive.first_item = True
+            self.highlights.clear()
+            self.update_highlight()
+            self.start_scan_timer(self.scan_timing.dwell(False, first_item=True))
+
+    def set_driving(self, motion):
+        """Park the scan on a running motion, so the next select renews it, and scan again once it stopped"""
+        if self.drive is None:
+            self.driving = None
+        elif motion is not None:
+            self.driving = motion
+            self.scheduler.stop()
+            self.drive.rewind((DRIVE_ITEMS.index(motion.title()), True))
+            self.highlights.clear()
+            self.update_highlight()
+        elif self.driving is not None:
+            self.driving = None
+            self.highlights.clear()
+            self.update_highlight()
+            self.start_scan_timer(self.scan_timing.dwell(False, first_item=True))
+
+    def activate_key(self, key):
+        if key == 'Speak':
+            self.speak_message()
+        elif key == 'SOS':
+            self.sos_alert()
+        elif key in PREDICTION_KEYS:
+            self.accept_prediction(PREDICTION_KEYS.index(key))
+        elif key != SKIP:
+            self.type_key(key)
+
+    @timed("type_key")
     def type_key(self, key):
+        latency = self.latency.detach()  # The injection worker stamps "inject" once the key is typed
         if key == '␣':
             self.typed_message += ' '
-            pyautogui.press('space')
+            self.injector.press('space', latency)
         elif key == '⌫':
             self.typed_message = self.typed_message[:-1]
-            pyautogui.press('backspace')
+            self.injector.press('backspace', latency)
         elif key == '⏎':
             self.typed_message += '\n'
-            pyautogui.press('enter')
+            self.injector.press('enter', latency)
         else:
             self.typed_message += key
-            pyautogui.write(key)
+            self.injector.write(key, latency)
+        self.journal.append("key", key)
+        STATS.count("keys")
         self.display_label.setText(f"Message: {self.typed_message}")
+        if self.predictor is not None:
+            self.predictor.type_key(key)
+            self.update_predictions()
+
+    def keys_injected(self, records):
+        """Latency records back from the injection worker, "inject" stamped once the keys were typed"""
+        for record in records:
+            self.latency.finish(record)
+        if self.morse is None:  # Morse mode shows its pattern there
+            self.show_latency()
 
+    def show_latency(self):
+        self.latency_label.setText(
+            f"{self.latency.summary()}  |  {self.scan_timing.chars_per_minute():.1f} chars/min")
+
+    def accept_prediction(self, slot):
+        suffix = self.predictor.accept(slot)
+        if suffix is None:
+            return  # Empty slot
+        self.typed_message += suffix + ' '
+        self.injector.write(suffix + ' ', self.latency.detach())
+        self.journal.append("text", suffix + ' ')
+        self.display_label.setText(f"Message: {self.typed_message}")
+        self.update_predictions()
+
+    def update_predictions(self):
+        if self.predictor is None:
+            return
+        predictions = self.predictor.predictions()
+        for slot, button in enumerate(self.prediction_buttons):
+            button.setText(predictions[slot] if slot < len(predictions) else '')
+
+    @timed("speak_message")
     def speak_message(self):
         if self.typed_message:
-            self.speech_engine.say(self.typed_message)
-            self.speech_engine.runAndWait()
+            self.speech.say(self.typed_message)
 
+    # SOS: nothing here may block, the user keeps scanning and typing while help is called
     def sos_alert(self):
-        pyautogui.alert("SOS Alert Triggered!")
+        self.start_sos()  # SOS selected before start_services() ran
+        alert = self.sos.trigger(SOS_MESSAGE)
+        self.journal.append("sos", alert.id)
+        QApplication.beep()
+        self.sos_states = {}
+        self.sos_label.setText("SOS: calling for help...")
+        self.sos_label.setVisible(True)
+        self.sos_ack_button.setVisible(True)
+        QTimer.singleShot(FIRST_ALERT_BUDGET_MS, lambda: self.check_sos(alert))
+
+    def check_sos(self, alert):
+        if alert.first_alert_ms() is None:
+            STATS.count("sos_over_budget")
+            print(f"[WARN] No SOS channel out after {FIRST_ALERT_BUDGET_MS}ms, failures: {alert.failures}")
+            QApplication.beep()
+
+    def show_sos_update(self, name, state, detail):
+        if not self.sos.active():
+            return
+        self.sos_states[name] = state
+        self.sos_label.setText("SOS: " + "  |  ".join(f"{name} {state}" for name, state in self.sos_states.items()))
+        if state != "sent":
+            print(f"[WARN] SOS {name} {state}: {detail}")
+
+    def acknowledge_sos(self):
+        self.sos.acknowledge()
+        self.journal.append("sos_ack")
+        self.sos_label.setVisible(False)
+        self.sos_ack_button.setVisible(False)
+
+    # Morse mode: a twitch is a dot, a quick double twitch a dash, pauses end letters and words
+    def toggle_morse(self):
+        if self.morse is None:
+            if self.pointer is not None:
+                self.toggle_pointer()
+            if self.drive is not None:
+                self.toggle_drive()
+            self.morse = MorseDecoder(self.activate_key)
+            self.scheduler.stop()
+            self.highlighter.reset()
+            self.morse_timer.start(MORSE_POLL_MS)
+            self.morse_button.setText("Scan Mode")
+            self.show_morse()
+        else:
+            self.morse = None
+            self.morse_timer.stop()
+            self.morse_button.setText("Morse Mode")
+            self.latency_label.setText(self.latency.summary())
+            self.update_highlight()
+            self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, self.engine.first_item))
+
+    # Pointer mode: the same scan and twitches drive the mouse through an overlay
+    def toggle_pointer(self):
+        if self.pointer is None:
+            if self.morse is not None:
+                self.toggle_morse()
+            if self.drive is not None:
+                self.toggle_drive()
+            geometry = QApplication.primaryScreen().virtualGeometry()
+            screen = (geometry.x(), geometry.y(), geometry.width(), geometry.height())
+            self.pointer = PointerScanner(screen)
+            if self.pointer_overlay is None:
+                self.pointer_overlay = PointerOverlay(screen)
+            self.pointer_overlay.show()
+            self.highlighter.reset()  # No keyboard highlight meanwhile
+            self.pointer_button.setText("Keyboard Mode")
+        else:
+            self.pointer = None
+            self.pointer_overlay.hide()
+            self.pointer_button.setText("Pointer Mode")
+        self.highlights.clear()
+        self.update_highlight()
+        self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, first_item=True))
+
+    # Drive mode: the scan picks a motion, which runs while select twitches keep renewing it.
+    # Every stop (back twitch, deadman, silent device) is made by the mobility process,
+    # fed from where the device is read; this only follows its state
+    def toggle_drive(self):
+        if self.drive is None:
+            if self.morse is not None:
+                self.toggle_morse()
+            if self.pointer is not None:
+                self.toggle_pointer()
+            self.drive = DriveScanner()
+            for button in self.drive_buttons:
+                button.setVisible(True)
+            self.drive_highlighter.reset()
+            self.highlighter.reset()  # No keyboard highlight meanwhile
+            self.drive_button.setText("Keyboard Mode")
+        else:
+            self.acquisition.drive("stop")
+            self.drive = None
+            self.driving = None
+            for button in self.drive_buttons:
+                button.setVisible(False)
+            self.drive_button.setText("Drive Mode")
+        self.highlights.clear()
+        self.update_highlight()
+        self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, first_item=True))
+
+    def poll_morse(self):
+        self.morse.poll(now_ns() / 1e6)
+        self.show_morse()
+
+    def show_morse(self):
+        self.latency_label.setText(f"Morse: {self.morse.pattern()}  |  {self.morse.wpm:.0f} wpm")
 
     def reset_baseline(self):
-        self.serial_thread.ser.write(b"RESET\n")
+        self.acquisition.send_command(command_reset())
         self.display_label.setText("Baseline Reset Requested...")
 
-    def handle_serial_data(self, line):
-        if line == "1":
-            self.confirm_selection()
-        elif line == "ON":
-            self.power_indicator.set_power_status(True)
-        elif line == "OFF":
-            self.power_indicator.set_power_status(False)
+    # Calibration: rest recording, then cued twitches, then a fit where the device is read
+    def start_calibration(self):
+        if self.calibrating:
+            return
+        self.calibrating = True
+        self.calibration_cues = 0
+        self.calibrate_button.setEnabled(False)
+        self.acquisition.send_command(command_raw_mode(True))
+        self.acquisition.request_calibration("rest")
+        self.display_label.setText("Calibrating: hold still...")
+        QTimer.singleShot(CALIBRATION_REST_MS, self.calibration_cue)
+
+    def calibration_cue(self):
+        if self.calibration_cues == 0:
+            self.acquisition.request_calibration("twitch")
+        if self.calibration_cues == CALIBRATION_CUES:
+            self.acquisition.request_calibration("fit")
+            self.display_label.setText("Calibrating: fitting...")
+            # Old firmware never streams samples, so nothing answers the fit request
+            QTimer.singleShot(CALIBRATION_CUE_INTERVAL_MS, self.calibration_timeout)
+            return
+        self.calibration_cues += 1
+        self.acquisition.request_calibration("cue")
+        self.display_label.setText(f"Calibrating: twitch now! ({self.calibration_cues}/{CALIBRATION_CUES})")
+        QTimer.singleShot(CALIBRATION_CUE_INTERVAL_MS, self.calibration_cue)
+
+    def calibration_finished(self, params):
+        if not self.calibrating:
+            return
+        self.calibrating = False
+        self.calibrate_button.setEnabled(True)
+        if params is None:
+            self.display_label.setText("Calibration failed: not enough data, try again")
+        else:
+            self.display_label.setText(
+                f"Calibrated: threshold {params['rms_threshold']:.3f}g "
+                f"(hit rate {params['rms_tpr']:.0%}, false alarms {params['rms_fpr']:.0%})")
+
+    def calibration_timeout(self):
+        if not self.calibrating:
+            return
+        self.calibrating = False
+        self.calibrate_button.setEnabled(True)
+        # No raw samples: fall back to the firmware's own baseline recording
+        self.acquisition.send_command(command_raw_mode(False))
+        self.reset_baseline()
+
+    def dump_latency(self):
+        path = time.strftime("latency-%Y%m%d-%H%M%S.csv")
+        self.latency.dump(path)
+        self.display_label.setText(f"Latency written to {path}")
+
+    def drain_events(self):
+        STATS.gauge("event_backlog", self.events.backlog())
+        STATS.gauge("events_dropped", self.events.dropped)
+        for event, rx_ns, event_ns in self.events.drain():
+            self.handle_serial_data(event, rx_ns, event_ns)
+
+    @timed("handle_serial_data")
+    def handle_serial_data(self, event, rx_ns, event_ns):
+        if STATS.enabled:
+            STATS.record("event_delay", (now_ns() - rx_ns) / 1e6)  # Receive to GUI thread, the signal backlog
+            STATS.count(f"event_{event.kind}")
+        if event.kind in SENSOR_ACTIONS and self.calibrating:
+            return
+        if event.kind in SENSOR_ACTIONS:
+            self.journal.append("twitch", event.kind)
+        if event.kind in SENSOR_ACTIONS and self.speech.speaking:
+            # Any action while speaking only cuts the speech off (barge-in)
+            self.speech.interrupt()
+        elif event.kind == "select":
+            # When the twitch happened by the device clock, not when it got through to here
+            twitch_ns = event_ns
+            if self.morse is not None:
+                self.morse.twitch(twitch_ns / 1e6)
+                self.show_morse()
+            else:
+                shown_ns, position = self.highlights.at(twitch_ns, (self.highlight_ns, self.scanner().position()))
+                if position != self.scanner().position():
+                    # The scan moved on while the event was on its way, select what the user saw
+                    self.scanner().rewind(position)
+                    STATS.count("late_twitches")
+                if self.pointer is not None:
+                    self.confirm_pointer()
+                    return
+                if self.drive is not None:
+                    self.confirm_drive()
+                    return
+                selecting_row, first_item = self.engine.selecting_row, self.engine.first_item
+                key = self.engine.highlighted_key()
+                reaction_ms = (twitch_ns - shown_ns) / 1e6
+                self.latency.begin(rx_ns)
+                self.confirm_selection()
+                self.latency.finish()
+                self.scan_timing.record_selection(selecting_row, first_item, reaction_ms, key)
+                self.show_latency()
+        elif event.kind == "back":
+            if self.morse is not None:
+                self.activate_key('⌫')
+            elif self.drive is not None:
+                self.acquisition.drive("stop")  # Stopped already where the device is read
+                self.set_driving(None)
+            elif self.pointer is not None:
+                self.pointer.back()
+                self.highlights.clear()
+                self.update_highlight()
+                self.start_scan_timer(self.scan_timing.dwell(False, first_item=True))
+            else:
+                self.engine.back()
+                self.relabel_tree()
+                self.highlights.clear()
+                self.update_highlight()
+                self.start_scan_timer(self.scan_timing.dwell(self.engine.selecting_row, first_item=True))
+        elif event.kind == "speak":
+            self.speak_message()
+        elif event.kind == "link":
+            state, url = event.payload.decode().split(" ", 1)
+            self.set_ready("Device", f"{state} {url}" if state == "connected" else state)
+            if state != "connected":
+                self.power_indicator.set_power_status(False)
+        elif event.kind == "mobility":
+            motion, reason = event.payload.decode().split(" ", 1)
+            self.set_ready("Drive", motion if motion != "stop" else f"stopped ({reason})")
+            if motion == "stop":
+                self.journal.append("drive", f"stop {reason}")
+            self.set_driving(None if motion == "stop" else motion)
+        elif event.kind == "power":
+            self.power_indicator.set_power_status(event.payload == b"\x01")
+            self.journal.append("power", event.payload == b"\x01")
+        elif event.kind == "info":
+            print(event.payload.decode(errors="ignore"))
 
     def closeEvent(self, event):
-        self.serial_thread.stop()
+        self.acquisition.stop()
+        self.speech.stop()
+        self.injector.stop()
+        self.scan_timing.close()
+        self.journal.close()
+        if self.sos is not None:
+            self.sos.close()
+        if self.diagnostics is not None:
+            self.diagnostics.close()
+        if self.pointer_overlay is not None:
+            self.pointer_overlay.close()
         event.accept()
 
 if __name__ == "__main__":
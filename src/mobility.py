@@ -0,0 +1,338 @@
+import json
+import os
+import selectors
+import struct
+import subprocess
+import sys
+import threading
+from collections import Counter
+
+from latency import LatencyHistogram, now_ns
+from protocol import DRIVE, Event, encode_frame
+from transport import MAX_BACKOFF, MIN_BACKOFF, open_transport
+
+CONTROL_HZ = 50  # Drive frames per second, also while nothing changes
+HOLD_S = 2.0  # Deadman: motion stops unless a select twitch renews it within this long
+HEARTBEAT_TIMEOUT_S = 0.35  # Motion stops when the twitch device was silent this long (it beats every 100ms)
+RT_PRIORITY = 10  # SCHED_FIFO priority of the mobility process, where the OS grants one
+STATS_INTERVAL_S = 1.0  # How often the mobility process reports its stats
+
+SPEED = 300  # mm/s
+TURN_RATE = 600  # mrad/s, counter-clockwise positive
+# Motions the user can pick: (linear, angular)
+MOTIONS = {
+    "stop": (0, 0),
+    "forward": (SPEED, 0),
+    "reverse": (-SPEED // 2, 0),
+    "left": (0, TURN_RATE),
+    "right": (0, -TURN_RATE),
+}
+DRIVE_PAYLOAD = struct.Struct("<hh")  # linear mm/s, angular mrad/s
+
+# Drive mode scan items, the highlight parks on a motion while it runs
+DRIVE_ITEMS = ("Forward", "Left", "Right", "Reverse", "Exit")
+
+
+def drive_frame(seq, motion):
+    return encode_frame(DRIVE, seq, now_ns() // 1_000_000, DRIVE_PAYLOAD.pack(*MOTIONS[motion]))
+
+
+def mobility_event(motion, reason):
+    """The event a host publishes for a state change, payload "<motion> <reason>\""""
+    return Event("mobility", None, None, f"{motion} {reason}".encode())
+
+
+def raise_priority():
+    """Real-time scheduling for this process, False where it is not supported or not allowed
+    (needs root or CAP_SYS_NICE)"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+# Wheelchair drive: a fixed-rate command loop in a process of its own, with a deadman and a watchdog
+#
+# Motion only ever starts from drive() and stops by itself: when no select twitch
+# renewed it within HOLD_S (deadman), when the twitch device sent nothing for
+# HEARTBEAT_TIMEOUT_S (watchdog), on a back twitch, or when the device switches off or
+# its link goes. serve() is the whole process: one thread waiting on its input pipe
+# until the next tick is due, so no other thread can hold the GIL a drive frame needs.
+# The inputs are forwarded by MobilityClient straight from the thread reading the
+# device, never through the GUI. The current motion goes out every tick and a change
+# goes out as soon as it is seen, so a stop is on the wire within a tick of its cause.
+# The drive link is any transport URL (drive_sim.py serves a pty); the drive controller
+# has to stop by itself when frames stop coming, which covers this process dying.
+class MobilityController:
+    def __init__(self, url, rate_hz=CONTROL_HZ, hold_s=HOLD_S, heartbeat_timeout_s=HEARTBEAT_TIMEOUT_S):
+        self.url = url
+        self.period_ns = int(1e9 / rate_hz)
+        self.hold_ns = int(hold_s * 1e9)
+        self.heartbeat_timeout_ns = int(heartbeat_timeout_s * 1e9)
+        self.motion = "stop"
+        self.reason = "idle"
+        self.renewed_ns = 0  # Last drive() or select twitch
+        self.device_ns = None  # Last anything from the twitch device
+        self.changed_ns = None  # When a change not yet on the wire was due
+        self.changes = []  # (motion, reason) not yet reported to the host
+        self.transport = None
+        self.retry_ns = 0
+        self.backoff = MIN_BACKOFF
+        self.seq = 0
+        self.realtime = False
+        self.lateness = LatencyHistogram()  # Tick start after its deadline, ms
+        self.reaction = LatencyHistogram()  # Change due -> its frame written, ms
+        self.stops = Counter()
+
+    def drive(self, motion, rx_ns):
+        """Start or renew a motion, or "stop". Refused while the device is silent"""
+        if motion == "stop":
+            if self.motion != "stop":
+                self.set_motion("stop", "user", rx_ns)
+        elif motion not in MOTIONS:
+            print(f"[WARN] Unknown motion {motion!r}")
+        elif self.device_ns is None or rx_ns - self.device_ns > self.heartbeat_timeout_ns:
+            self.set_motion("stop", "no device", rx_ns)  # Also when stopped already: the GUI waits for an answer
+        else:
+            self.renewed_ns = rx_ns
+            if motion != self.motion:
+                self.set_motion(motion, "user", rx_ns)
+
+    def observe(self, kind, rx_ns, event_ns=None):
+        """What the twitch device sent: "seen" (any frame), "select", "back", "off", or "lost" for its link"""
+        if kind == "lost":
+            if self.motion != "stop":
+                self.set_motion("stop", "link lost", rx_ns)
+            return
+        self.device_ns = rx_ns if self.device_ns is None else max(self.device_ns, rx_ns)
+        if self.motion == "stop":
+            return
+        if kind == "select":
+            self.renewed_ns = max(self.renewed_ns, rx_ns if event_ns is None else event_ns)
+        elif kind == "back":
+            self.set_motion("stop", "back", rx_ns)
+        elif kind == "off":
+            self.set_motion("stop", "device off", rx_ns)
+
+    def handle(self, line):
+        """One line from the host: "drive <motion>" or "<kind> <rx_ns> [<event_ns>]" for observe()"""
+        command, *args = line.split()
+        if command == "drive":
+            self.drive(args[0], now_ns())
+        elif args:
+            self.observe(command, *map(int, args))
+
+    def set_motion(self, motion, reason, due_ns):
+        self.motion = motion
+        self.reason = reason
+        if self.changed_ns is None:
+            self.changed_ns = due_ns
+        if motion == "stop":
+            self.stops[reason] += 1
+        self.changes.append((motion, reason))
+
+    def serve(self, inbox, outbox):
+        """Run until inbox closes: lines for handle() come in on it, "change <motion> <reason>"
+        and "stats <json>" lines go out on outbox"""
+        self.realtime = raise_priority()
+        selector = selectors.DefaultSelector()
+        selector.register(inbox, selectors.EVENT_READ)
+        buffer = b""
+        next_ns = next_stats_ns = now_ns()
+        connected = True
+        while connected:
+            if selector.select(max(0, next_ns - now_ns()) / 1e9):
+                data = os.read(inbox, 4096)
+                connected = bool(data)
+                *lines, buffer = (buffer + data).split(b"\n")
+                for line in lines:
+                    self.handle(line.decode())
+            tick_ns = now_ns()
+            due = tick_ns >= next_ns
+            if due:
+                self.lateness.add((tick_ns - next_ns) / 1e6)
+                next_ns += self.period_ns
+                if next_ns <= tick_ns:
+                    next_ns = tick_ns + self.period_ns  # Missed ticks are not made up
+            self.check(tick_ns)
+            if due or self.changed_ns is not None:
+                self.send()
+            report = [f"change {motion} {reason}" for motion, reason in self.changes]
+            self.changes = []
+            if tick_ns >= next_stats_ns:
+                next_stats_ns = tick_ns + int(STATS_INTERVAL_S * 1e9)
+                report.append("stats " + json.dumps(self.stats()))
+            if report:
+                try:
+                    os.write(outbox, ("\n".join(report) + "\n").encode())
+                except OSError:
+                    connected = False  # The host is gone
+        if self.motion != "stop":
+            self.set_motion("stop", "closed", now_ns())
+        self.send()
+        selector.close()
+        if self.transport is not None:
+            self.transport.close()
+
+    def check(self, tick_ns):
+        if self.motion == "stop":
+            return
+        if tick_ns - self.device_ns > self.heartbeat_timeout_ns:
+            self.set_motion("stop", "heartbeat", self.device_ns + self.heartbeat_timeout_ns)
+        elif tick_ns - self.renewed_ns > self.hold_ns:
+            self.set_motion("stop", "deadman", self.renewed_ns + self.hold_ns)
+
+    def send(self):
+        changed_ns, self.changed_ns = self.changed_ns, None
+        frame = drive_frame(self.seq, self.motion)
+        self.seq += 1
+        if self.write(frame) and changed_ns is not None:
+            self.reaction.add((now_ns() - changed_ns) / 1e6)
+
+    def write(self, frame):
+        """Send on the drive link, (re)opening it at most once per backoff. False while there is none"""
+        if self.transport is None:
+            rx_ns = now_ns()
+            if rx_ns < self.retry_ns:
+                return False
+            try:
+                # A TCP link can block here for its connect timeout, only while there is no link to send on
+                self.transport = open_transport(self.url)
+            except (OSError, ValueError) as error:
+                if self.backoff == MIN_BACKOFF:
+                    print(f"[WARN] Drive controller unavailable: {error}")
+                self.retry_ns = rx_ns + int(self.backoff * 1e9)
+                self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+                return False
+            self.backoff = MIN_BACKOFF
+        try:
+            self.transport.write(frame)
+        except OSError:
+            transport, self.transport = self.transport, None
+            try:
+                transport.close()
+            except OSError:
+                pass
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "motion": self.motion,
+            "reason": self.reason,
+            "link": self.transport is not None,
+            "realtime": self.realtime,
+            "ticks": self.lateness.total,
+            "tick_late_p99_ms": round(self.lateness.percentile(99), 3),
+            "tick_late_max_ms": round(self.lateness.max_ms, 3),
+            "reaction_max_ms": round(self.reaction.max_ms, 3),
+            "stops": dict(self.stops),
+        }
+
+
+# The host's end of the mobility process: forwards the device's events and the GUI's commands
+#
+# observe() and drive() write one line to the process's stdin, a single os.write that
+# stays whole below PIPE_BUF, so the device and command threads need no lock. A thread
+# reads the process's output: on_change(motion, reason) is called on it for every state
+# change as it comes, and it keeps the latest stats.
+class MobilityClient:
+    def __init__(self, url, on_change=None):
+        self.url = url
+        self.on_change = on_change
+        self.process = None
+        self.closing = False
+        self.last_stats = {}
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.url],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def command(self, line):
+        process = self.process
+        if process is None:
+            return
+        try:
+            os.write(process.stdin.fileno(), line.encode() + b"\n")
+        except (OSError, ValueError):
+            pass  # The process is gone, the drive controller stops by itself
+
+    def drive(self, motion):
+        """A MOTIONS name, from any thread"""
+        self.command(f"drive {motion}")
+
+    def observe(self, event, rx_ns, event_ns=None):
+        """Everything from the twitch device (heartbeats, sample frames, actions and link
+        changes), on the thread reading it"""
+        if event.kind == "link":
+            if not event.payload.startswith(b"connected"):
+                self.command(f"lost {rx_ns}")
+        elif event.kind == "select":
+            self.command(f"select {rx_ns} {rx_ns if event_ns is None else event_ns}")
+        elif event.kind == "back":
+            self.command(f"back {rx_ns}")
+        elif event.kind == "power" and event.payload == b"\x00":
+            self.command(f"off {rx_ns}")
+        else:
+            self.command(f"seen {rx_ns}")
+
+    def read(self):
+        for line in self.process.stdout:
+            kind, _, rest = line.decode().strip().partition(" ")
+            if kind == "change":
+                self.changed(*rest.split(" ", 1))
+            elif kind == "stats":
+                self.last_stats = json.loads(rest)
+        if not self.closing:
+            print(f"[WARN] Mobility process exited with {self.process.wait()}")
+            self.changed("stop", "controller exited")
+
+    def changed(self, motion, reason):
+        if self.on_change is not None and not self.closing:  # The host may be gone after close()
+            self.on_change(motion, reason)
+
+    def stats(self):
+        return dict(self.last_stats)
+
+    def close(self):
+        """Stop the motors and end the process"""
+        self.closing = True
+        process = self.process
+        if process is None:
+            return
+        process.stdin.close()  # It sends a last stop frame and exits
+        try:
+            process.wait(2.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+# The drive mode scan: one row of DRIVE_ITEMS, with the interface of ScanEngine the GUI uses
+class DriveScanner:
+    def __init__(self):
+        self.items = DRIVE_ITEMS
+        self.index = 0
+        self.first_item = True
+
+    def highlighted(self):
+        return self.items[self.index]
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self.items)
+        self.first_item = False
+
+    def position(self):
+        return self.index, self.first_item
+
+    def rewind(self, position):
+        self.index, self.first_item = position
+
+
+if __name__ == "__main__":
+    # The mobility process, started by MobilityClient with the drive controller URL
+    outbox = sys.stdout.fileno()
+    sys.stdout = sys.stderr  # Warnings must not end up among the state lines
+    MobilityController(sys.argv[1]).serve(sys.stdin.fileno(), outbox)
@@ -0,0 +1,125 @@
+# Morse input from twitch timestamps
+#
+# A twitch has no duration, so a dot is a single twitch and a dash is a quick
+# double twitch. Everything else is rhythm, in multiples of the user's unit:
+#
+#   dash pair gap 1u | element gap 3u | letter gap 7u | word gap 15u
+#
+# The unit follows the user: every classified gap nudges the estimate.
+MORSE_CODE = {
+    'A': '.-', 'B': '-...', 'C': '-.-.', 'D': '-..', 'E': '.', 'F': '..-.', 'G': '--.', 'H': '....',
+    'I': '..', 'J': '.---', 'K': '-.-', 'L': '.-..', 'M': '--', 'N': '-.', 'O': '---', 'P': '.--.',
+    'Q': '--.-', 'R': '.-.', 'S': '...', 'T': '-', 'U': '..-', 'V': '...-', 'W': '.--', 'X': '-..-',
+    'Y': '-.--', 'Z': '--..', '1': '.----', '2': '..---', '3': '...--', '4': '....-', '5': '.....',
+    '6': '-....', '7': '--...', '8': '---..', '9': '----.', '0': '-----', '.': '.-.-.-',
+    '⌫': '........',  # Prosign HH (error)
+    '⏎': '.-.-',  # Prosign AA (new line)
+    'Speak': '...-.-',  # Prosign SK (end of work)
+    'SOS': '...---...',
+}
+MAX_ELEMENTS = 9
+
+# Decoding tree in heap order: the root is 1, a dot goes to 2i and a dash to 2i + 1.
+# Index 0 marks a code that has left the tree and stays there.
+TREE = [None] * (2 << MAX_ELEMENTS)
+for _key, _code in MORSE_CODE.items():
+    _index = 1
+    for _element in _code:
+        _index = 2 * _index + (_element == '-')
+    TREE[_index] = _key
+
+PAIR, ELEMENT, LETTER, WORD = range(4)
+GAP_UNITS = (1, 3, 7, 15)
+# Gap classes from gap / unit, quantised to 1/TABLE_STEPS of a unit. Class
+# boundaries sit at the geometric mean of neighbouring gap lengths.
+TABLE_STEPS = 16
+_BOUNDS = [(GAP_UNITS[i] * GAP_UNITS[i + 1]) ** 0.5 for i in range(3)]
+GAP_TABLE = bytes(sum(step / TABLE_STEPS >= bound for bound in _BOUNDS)
+                  for step in range(int(_BOUNDS[-1] * TABLE_STEPS) + 1))
+
+DEFAULT_UNIT_MS = 300
+MIN_UNIT_MS = 80
+MAX_UNIT_MS = 1500
+UNIT_ALPHA = 0.15  # Weight of each new gap in the unit estimate
+
+
+# Incremental decoder, keys are handed to on_key as soon as their gap has passed
+#
+# State is a tree index and a few numbers, no objects are created per twitch.
+class MorseDecoder:
+    def __init__(self, on_key, unit_ms=DEFAULT_UNIT_MS):
+        self.on_key = on_key
+        self.unit_ms = float(unit_ms)
+        self.index = 1  # Position in TREE of the elements so far
+        self.pending = False  # A twitch that is a dot unless a second one follows quickly
+        self.last_ms = None  # Time of the last twitch
+        self.letter_done = False  # A key was emitted since the last twitch
+        self.space_done = False
+        self.unknown = 0  # Codes with no key
+
+    @property
+    def wpm(self):
+        """Words per minute by the PARIS convention"""
+        return 1200 / self.unit_ms
+
+    def classify(self, gap_ms):
+        step = int(gap_ms * TABLE_STEPS / self.unit_ms)
+        return GAP_TABLE[step] if step < len(GAP_TABLE) else WORD
+
+    def adapt(self, gap_ms, units):
+        unit = self.unit_ms + UNIT_ALPHA * (gap_ms / units - self.unit_ms)
+        self.unit_ms = min(MAX_UNIT_MS, max(MIN_UNIT_MS, unit))
+
+    def add(self, dash):
+        self.index = 2 * self.index + dash if self.index < len(TREE) // 2 else 0
+
+    def twitch(self, time_ms):
+        if self.last_ms is None:
+            self.last_ms = time_ms
+            self.pending = True
+            return
+        gap = time_ms - self.last_ms
+        self.poll(time_ms)
+        kind = self.classify(gap)
+        if self.pending and kind == PAIR:
+            self.add(1)
+            self.pending = False
+            self.adapt(gap, GAP_UNITS[PAIR])
+        else:
+            if kind == ELEMENT or kind == LETTER:
+                self.adapt(gap, GAP_UNITS[kind])
+            self.pending = True
+        self.last_ms = time_ms
+        self.letter_done = self.space_done = False
+
+    def poll(self, now_ms):
+        """Emit whatever the silence since the last twitch has completed"""
+        if self.last_ms is None:
+            return
+        kind = self.classify(now_ms - self.last_ms)
+        if self.pending and kind >= ELEMENT:
+            self.add(0)
+            self.pending = False
+        if kind >= LETTER and not self.pending and self.index != 1:
+            key = TREE[self.index]
+            self.index = 1
+            if key is None:
+                self.unknown += 1
+            else:
+                self.letter_done = True
+                self.on_key(key)
+        if kind == WORD and self.letter_done and not self.space_done:
+            self.space_done = True
+            self.on_key('␣')
+
+    def pattern(self):
+        """Elements entered so far, for display"""
+        if self.index == 0:
+            return "?"
+        code = bin(self.index)[3:].replace('0', '·').replace('1', '−')
+        return code + ('•' if self.pending else '')
+
+    def reset(self):
+        self.index = 1
+        self.pending = False
+        self.last_ms = None
@@ -0,0 +1,131 @@
+import heapq
+import itertools
+
+from layouts import SKIP, key_for_char, key_positions
+from scan_engine import ScanEngine
+
+
+# Key index and shortest scan paths for a layout, built once per layout
+#
+# Every highlight state of the layout is explored through a scratch ScanEngine: a
+# tick moves to the next state, a twitch either types a key or moves into a row,
+# group or back out through Skip. A reverse Dijkstra per key then gives the fewest
+# ticks (and, among those, twitches) from every state, so paths that leave through
+# Skip and come back instead of waiting for a wrap-around are found too.
+class ScanPlanner:
+    def __init__(self, keyboard, tree=None, restart_at_top=False):
+        self.keyboard = keyboard
+        self.tree = tree
+        self.engine = ScanEngine(keyboard, tree, restart_at_top)  # Scratch engine for exploring
+        self.positions = key_positions(keyboard)  # key -> (row, col)
+        self.advance_to = {}  # state -> state after a tick
+        self.confirm_to = {}  # state -> (key typed or None, state after a twitch)
+        self.explore(self.state(self.engine))
+        keys = {key for key, _ in self.confirm_to.values() if key not in (None, SKIP)}
+        self.distance = {key: self.distances(key) for key in keys}  # key -> state -> (ticks, twitches)
+        self.char_keys = {}  # Text character -> key, for autotype and macros
+        for key in keys:
+            if len(key) == 1:
+                self.char_keys[key] = key
+                self.char_keys[key.lower()] = key
+        self.char_keys.update({char: key_for_char(char) for char in " \n" if key_for_char(char) in keys})
+
+    def state(self, engine):
+        if engine.tree is not None:
+            return engine.tree.node, engine.tree.index
+        # The column does not matter while rows are scanned, the engine resets it
+        return engine.current_row, 0 if engine.selecting_row else engine.current_col, engine.selecting_row
+
+    def set_state(self, state):
+        engine = self.engine
+        if engine.tree is not None:
+            engine.tree.node, engine.tree.index = state
+            engine.sync_tree()
+        else:
+            engine.current_row, engine.current_col, engine.selecting_row = state
+
+    def explore(self, start):
+        stack = [start]
+        while stack:
+            state = stack.pop()
+            if state in self.advance_to:
+                continue
+            self.set_state(state)
+            self.engine.advance()
+            self.advance_to[state] = self.state(self.engine)
+            self.set_state(state)
+            key = self.engine.confirm()
+            self.confirm_to[state] = (key, self.state(self.engine))
+            stack += [self.advance_to[state], self.confirm_to[state][1]]
+
+    def distances(self, target):
+        """Fewest (ticks, twitches) from every state until target is typed"""
+        previous = {}  # Reverse edges: state -> [(state before, cost)]
+        for state, after in self.advance_to.items():
+            previous.setdefault(after, []).append((state, (1, 0)))
+        counter = itertools.count()  # Tie breaker so heapq never compares states
+        heap = []
+        for state, (key, after) in self.confirm_to.items():
+            if key == target:
+                heap.append(((0, 1), next(counter), state))
+            elif key in (None, SKIP):
+                previous.setdefault(after, []).append((state, (0, 1)))
+        heapq.heapify(heap)
+        distance = {}
+        while heap:
+            cost, _, state = heapq.heappop(heap)
+            if state in distance:
+                continue
+            distance[state] = cost
+            for before, (ticks, twitches) in previous.get(state, ()):
+                if before not in distance:
+                    heapq.heappush(heap, ((cost[0] + ticks, cost[1] + twitches), next(counter), before))
+        return distance
+
+    def keys_for_text(self, text):
+        """Keys typing text, characters the layout has no key for are left out"""
+        return [self.char_keys[char] for char in text if char in self.char_keys]
+
+    def legs(self, engine, key):
+        """Ticks to wait before each twitch on the shortest way from engine's highlight to key"""
+        return self.legs_from(self.state(engine), key)[0]
+
+    def ticks(self, engine, key):
+        return sum(self.legs(engine, key))
+
+    def on_path(self, engine, key):
+        """Whether a twitch now is the next step towards key"""
+        return self.twitch_next(self.state(engine), key)
+
+    def twitch_next(self, state, key):
+        typed, after = self.confirm_to[state]
+        distance = self.distance[key]
+        if typed == key or state not in distance:
+            # Inside a row without Skip the only way out is typing one of its keys
+            return True
+        ticks, twitches = distance[state]
+        return typed in (None, SKIP) and distance.get(after) == (ticks, twitches - 1)
+
+    def legs_from(self, state, key):
+        """(legs, state after typing key) starting from a highlight state"""
+        legs = []
+        ticks = 0
+        while True:
+            typed, after = self.confirm_to[state]
+            if self.twitch_next(state, key):
+                legs.append(ticks)
+                if typed == key:
+                    return legs, after
+                ticks, state = 0, after
+            else:
+                ticks += 1
+                state = self.advance_to[state]
+
+    def plan_text(self, engine, text):
+        """[(key, legs)] typing text from engine's current state in the fewest ticks"""
+        state = self.state(engine)
+        plan = []
+        for key in self.keys_for_text(text):
+            legs, state = self.legs_from(state, key)
+            plan.append((key, legs))
+        return plan
@@ -0,0 +1,124 @@
+POINTER_GRID = 3  # Each selection narrows the region to one cell of a GRID x GRID split
+ACTION_BOX = (96, 40)  # Size of the action boxes drawn next to the pointer
+ACTION_GAP = 24  # Between the pointer and the boxes
+ACTIONS = ("Click", "Double", "Right", "Drag", "Scroll ↑", "Scroll ↓", "Cancel")
+DRAG_ACTIONS = ("Drop", "Cancel")
+ACT = "Act"
+SCROLL_CLICKS = 3
+
+
+def split(start, length, parts):
+    """Integer edges splitting [start, start + length) into up to parts non-empty spans"""
+    edges = sorted({start + length * part // parts for part in range(parts + 1)})
+    return [(low, high - low) for low, high in zip(edges, edges[1:])]
+
+
+# Cursor control by recursive subdivision, scanned like the keyboard
+#
+# The region (first the whole screen) is split into a grid and its cells are
+# scanned one at a time; selecting one moves the pointer to its centre and makes
+# it the new region, so any pixel is POINTER_GRID cells per level and
+# log_GRID(screen size) selections away. "Act" (or a region down to one pixel)
+# switches to the actions at the pointer. Cells and boxes are (x, y, width, height)
+# in screen coordinates, confirm() returns the pointer operations to queue on the
+# injection worker: ("move", x, y), ("click", button, count), ("down", button),
+# ("up", button) and ("scroll", clicks).
+class PointerScanner:
+    def __init__(self, screen, grid=POINTER_GRID, point=None):
+        self.screen = screen  # (x, y, width, height)
+        self.grid = grid
+        self.point = point  # Where the pointer was last moved, None before the first move
+        self.dragging = False  # The button is held down for a drag
+        self.selections = 0
+        self.restart()
+
+    def restart(self):
+        """Back to the whole screen, after an action"""
+        self.regions = [self.screen]
+        self.acting = False
+        self.build()
+
+    def build(self):
+        if self.acting:
+            labels = DRAG_ACTIONS if self.dragging else ACTIONS
+            self.items = list(zip(labels, self.boxes(len(labels))))
+        else:
+            x, y, width, height = self.regions[-1]
+            self.items = [("", (cell_x, cell_y, cell_width, cell_height))
+                          for cell_y, cell_height in split(y, height, self.grid)
+                          for cell_x, cell_width in split(x, width, self.grid)]
+            if self.point is not None:
+                self.items.append((ACT, self.boxes(1)[0]))
+        self.index = 0
+        self.first_item = True
+
+    def boxes(self, count):
+        """count action boxes in a row under (or over) the pointer, kept on screen"""
+        screen_x, screen_y, screen_width, screen_height = self.screen
+        box_width, box_height = ACTION_BOX
+        point_x, point_y = self.point
+        row_width = count * box_width
+        x = min(max(point_x - row_width // 2, screen_x), screen_x + screen_width - row_width)
+        y = point_y + ACTION_GAP
+        if y + box_height > screen_y + screen_height:
+            y = point_y - ACTION_GAP - box_height
+        return [(x + index * box_width, y, box_width, box_height) for index in range(count)]
+
+    def highlighted(self):
+        return self.items[self.index]
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self.items)
+        self.first_item = False
+
+    def position(self):
+        """Everything advance() changes, for rewind()"""
+        return self.index, self.first_item
+
+    def rewind(self, position):
+        self.index, self.first_item = position
+
+    def confirm(self):
+        """Select the highlighted item, returns the pointer operations it asks for"""
+        label, (x, y, width, height) = self.highlighted()
+        self.selections += 1
+        if not self.acting and label != ACT:
+            self.regions.append((x, y, width, height))
+            self.point = (x + width // 2, y + height // 2)
+            self.acting = width == 1 and height == 1  # Nothing left to narrow down
+            self.build()
+            return [("move",) + self.point]
+        if label == ACT:
+            self.acting = True
+            self.build()
+            return []
+        operations = {
+            "Click": [("click", "left", 1)],
+            "Double": [("click", "left", 2)],
+            "Right": [("click", "right", 1)],
+            "Drag": [("down", "left")],
+            "Drop": [("up", "left")],
+            "Scroll ↑": [("scroll", SCROLL_CLICKS)],
+            "Scroll ↓": [("scroll", -SCROLL_CLICKS)],
+        }.get(label, [])
+        if label.startswith("Scroll"):
+            self.first_item = True  # Stays on the actions, scrolling again is one selection
+            return operations
+        if label == "Drag":
+            self.dragging = True
+        elif label == "Drop":
+            self.dragging = False
+        if label == "Cancel":
+            self.acting = False
+            self.build()
+        else:
+            self.restart()
+        return operations
+
+    def back(self):
+        """Leave the actions, or zoom back out one level"""
+        if self.acting:
+            self.acting = False
+        elif len(self.regions) > 1:
+            self.regions.pop()
+        self.build()
@@ -0,0 +1,246 @@
+import heapq
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import Counter, deque
+
+# Word prediction: a trie with the top completions stored at every node, plus
+# per-word next-word lists from a bigram model, both in one memory-mapped file.
+# Typing a letter moves one node down the trie, so a lookup costs a child search
+# and reading a few word ids regardless of the vocabulary size.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+WORD_LIST = os.path.join(DATA_DIR, "words.txt")  # Most frequent first
+PHRASES = os.path.join(DATA_DIR, "phrases.txt")  # Everyday sentences for the bigram model
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".liberate", "prediction.idx")
+
+TOP_K = 8  # Completions stored per trie node
+NEXT_K = 16  # Next-word candidates stored per word
+RANK_SCALE = 100000  # Word list counts follow Zipf's law: RANK_SCALE / rank
+PHRASE_WEIGHT = 500  # Count added per word occurrence in the phrases
+HISTORY = 256  # Keys that can be undone with backspace
+
+PREDICTION_SLOTS = 4
+PREDICTION_KEYS = tuple(f"Word{i + 1}" for i in range(PREDICTION_SLOTS))
+SENTENCE_BREAKS = ('.', '⏎')
+
+# File layout, all little-endian:
+#   header
+#   u32 string offsets[words + 1], word strings (ASCII, most frequent word first)
+#   u32 next offsets[words + 2], u32 next word ids (the extra list is for sentence starts)
+#   trie nodes, children before parents, the root last
+MAGIC = b"LBPX"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII")  # magic, version, top_k, words, next offsets, root
+NODE = struct.Struct("<iBB")  # word id (-1 if none), children, completions
+# followed by the child letters, u32 child offsets and u32 completion word ids
+
+
+def tokenize(text):
+    """Upper-case words, with None at sentence breaks"""
+    return [None if token in ".?!\n" else token for token in re.findall(r"[A-Z]+|[.?!\n]", text.upper())]
+
+
+class TrieNode:
+    def __init__(self):
+        self.children = {}
+        self.word_id = -1
+        self.top = []
+
+
+def build_index(path=INDEX_PATH, word_list=WORD_LIST, phrases=(PHRASES,)):
+    counts = Counter()
+    with open(word_list) as f:
+        ranked = [word for word in tokenize(f.read()) if word]
+    for rank, word in enumerate(dict.fromkeys(ranked)):
+        counts[word] += RANK_SCALE // (rank + 1)
+    bigrams = Counter()
+    for phrase_path in phrases:
+        with open(phrase_path) as f:
+            tokens = tokenize(f.read())
+        counts.update({word: PHRASE_WEIGHT * n for word, n in Counter(t for t in tokens if t).items()})
+        tokens.insert(0, None)
+        bigrams.update((a, b) for a, b in zip(tokens, tokens[1:]) if b)
+
+    # Word ids are frequency ranks, so the smallest ids are always the best candidates
+    words = sorted(counts, key=lambda word: (-counts[word], word))
+    ids = {word: i for i, word in enumerate(words)}
+    following = [[] for _ in range(len(words) + 1)]  # Sentence starts follow the id after the last word
+    for (a, b), count in bigrams.items():
+        following[ids.get(a, len(words))].append((-count, ids[b]))
+
+    root = TrieNode()
+    for word_id, word in enumerate(words):
+        node = root
+        for char in word:
+            node = node.children.setdefault(char, TrieNode())
+        node.word_id = word_id
+
+    strings = b"".join(word.encode("ascii") for word in words)
+    string_offsets = [0]
+    for word in words:
+        string_offsets.append(string_offsets[-1] + len(word))
+    next_ids = [[word_id for _, word_id in sorted(candidates)[:NEXT_K]] for candidates in following]
+    next_offsets = [0]
+    for candidates in next_ids:
+        next_offsets.append(next_offsets[-1] + len(candidates))
+
+    data = bytearray(HEADER.size)
+    data += struct.pack(f"<{len(string_offsets)}I", *string_offsets) + strings
+    next_offset = len(data)
+    data += struct.pack(f"<{len(next_offsets)}I", *next_offsets)
+    data += struct.pack(f"<{next_offsets[-1]}I", *(word_id for ids_ in next_ids for word_id in ids_))
+
+    def write(node):
+        offsets = [write(child) for _, child in sorted(node.children.items())]
+        own = [node.word_id] if node.word_id >= 0 else []
+        node.top = heapq.nsmallest(TOP_K, own + [i for child in node.children.values() for i in child.top])
+        offset = len(data)
+        data.extend(NODE.pack(node.word_id, len(offsets), len(node.top)))
+        data.extend("".join(sorted(node.children)).encode("ascii"))
+        data.extend(struct.pack(f"<{len(offsets)}I{len(node.top)}I", *offsets, *node.top))
+        return offset
+
+    root_offset = write(root)
+    HEADER.pack_into(data, 0, MAGIC, VERSION, TOP_K, len(words), next_offset, root_offset)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write then rename so a running app never maps a half-written index
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def load_index(path=INDEX_PATH, sources=(WORD_LIST, PHRASES)):
+    """Map the index, rebuilding it first if it is missing or older than its sources"""
+    if not os.path.exists(path) or any(os.path.getmtime(source) > os.path.getmtime(path) for source in sources):
+        build_index(path, sources[0], sources[1:])
+    return PredictionIndex(path)
+
+
+# Read-only view of an index file, pages are only touched when a lookup needs them
+class PredictionIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.top_k, self.word_count, self.next_offset, self.root = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} prediction index")
+        self.strings_offset = HEADER.size + 4 * (self.word_count + 1)
+
+    def word(self, word_id):
+        start, end = struct.unpack_from("<II", self.mm, HEADER.size + 4 * word_id)
+        return self.mm[self.strings_offset + start:self.strings_offset + end].decode("ascii")
+
+    def child(self, node, char):
+        """Offset of the child of node for char, None if no word continues with it"""
+        _, children, _ = NODE.unpack_from(self.mm, node)
+        letters = node + NODE.size
+        index = self.mm.find(char.encode("ascii"), letters, letters + children) if char.isascii() else -1
+        if index < 0:
+            return None
+        return struct.unpack_from("<I", self.mm, letters + children + 4 * (index - letters))[0]
+
+    @property
+    def sentence_start(self):
+        """Pseudo word id whose next words are the usual sentence openers"""
+        return self.word_count
+
+    def word_id(self, node):
+        return NODE.unpack_from(self.mm, node)[0]
+
+    def completions(self, node):
+        """Ids of the most frequent words below node, most frequent first"""
+        _, children, top = NODE.unpack_from(self.mm, node)
+        return struct.unpack_from(f"<{top}I", self.mm, node + NODE.size + 5 * children)
+
+    def next_words(self, word_id):
+        start, end = struct.unpack_from("<II", self.mm, self.next_offset + 4 * word_id)
+        ids_offset = self.next_offset + 4 * (self.word_count + 2)
+        return struct.unpack_from(f"<{end - start}I", self.mm, ids_offset + 4 * start)
+
+    def lookup(self, word):
+        node = self.root
+        for char in word:
+            node = self.child(node, char)
+            if node is None:
+                return -1
+        return self.word_id(node)
+
+    def close(self):
+        self.mm.close()
+
+
+# Prediction state for the text being typed, updated one key at a time
+class Predictor:
+    def __init__(self, index, slots=PREDICTION_SLOTS):
+        self.index = index
+        self.slots = slots
+        self.history = deque(maxlen=HISTORY)  # State before each key, popped by backspace
+        self.node = index.root  # Trie node of the current prefix, None once it left the vocabulary
+        self.prefix = ""
+        self.previous = index.sentence_start  # Id of the word before the prefix, -1 if it is unknown
+        self.candidates = None
+
+    def type_key(self, key):
+        if key == '⌫':
+            if self.history:
+                self.node, self.prefix, self.previous = self.history.pop()
+            else:
+                self.node, self.prefix, self.previous = self.index.root, "", self.index.sentence_start
+        else:
+            self.history.append((self.node, self.prefix, self.previous))
+            if key in SENTENCE_BREAKS:
+                self.node, self.prefix, self.previous = self.index.root, "", self.index.sentence_start
+            elif key == '␣':
+                if self.prefix:  # Repeated spaces keep the context
+                    self.previous = self.index.word_id(self.node) if self.node is not None else -1
+                self.node, self.prefix = self.index.root, ""
+            else:
+                self.prefix += key
+                if self.node is not None:
+                    self.node = self.index.child(self.node, key)
+        self.candidates = None
+
+    def predictions(self):
+        """Up to `slots` words completing the prefix, bigram followers of the previous word first"""
+        if self.candidates is not None:
+            return self.candidates
+        candidates = []
+        if self.node is not None:
+            ids = self.index.next_words(self.previous) if self.previous >= 0 else ()
+            for word_id in ids + self.index.completions(self.node):
+                word = self.index.word(word_id)
+                # Offering the prefix itself saves nothing over typing a space
+                if word.startswith(self.prefix) and word != self.prefix and word not in candidates:
+                    candidates.append(word)
+                    if len(candidates) == self.slots:
+                        break
+        self.candidates = candidates
+        return candidates
+
+    def accept(self, slot):
+        """Complete the word with a prediction, returns the letters still to type (a space follows)"""
+        predictions = self.predictions()
+        if slot >= len(predictions):
+            return None
+        suffix = predictions[slot][len(self.prefix):]
+        for char in suffix:
+            self.type_key(char)
+        self.type_key('␣')
+        return suffix
+
+
+if __name__ == "__main__":
+    # Rebuild the index, e.g. after editing the word list: prediction.py [words] [phrases...] [--out path]
+    args = sys.argv[1:]
+    out = INDEX_PATH
+    if "--out" in args:
+        out = args.pop(args.index("--out") + 1)
+        args.remove("--out")
+    build_index(out, args[0] if args else WORD_LIST, args[1:] or (PHRASES,))
+    index = PredictionIndex(out)
+    print(f"{index.word_count} words, {len(index.mm)} bytes written to {out}")
@@ -0,0 +1,230 @@
+import struct
+from collections import namedtuple
+
+# Binary frame layout (little endian), see sendFrame() in interface/interface.ino:
+#
+#   0xA5 | version u8 | type u8 | length u8 | seq u16 | device_ms u32 | payload | crc16 u16
+#
+# The CRC is CRC-16/CCITT-FALSE over everything from version to the end of the payload.
+SYNC = 0xA5
+VERSION = 1
+HEADER = struct.Struct("<BBBHI")  # version, type, length, seq, device_ms
+CRC = struct.Struct("<H")
+FRAME_OVERHEAD = 1 + HEADER.size + CRC.size
+MAX_TEXT_LINE = 256
+BOOT_BANNER = b"System Booting..."  # Printed by setup() in interface.ino on every start
+BOOT_WINDOW_MS = 10000  # A frame behind the last one is a rebooted device only this soon after boot ...
+BOOT_WINDOW_SEQ = 1000  # ... and with this low a seq, any other is a repeat
+
+# Frame types
+TWITCH = 0x01
+POWER = 0x02
+INFO = 0x03
+HEARTBEAT = 0x04  # Every 100ms while measuring, the mobility watchdog stops the wheelchair without them
+SAMPLES = 0x10  # Raw accelerometer block, see dsp.decode_samples()
+DRIVE = 0x20  # Host -> wheelchair drive controller, see mobility.py
+
+# Event kinds handed to the GUI
+KIND_NAMES = {TWITCH: "twitch", POWER: "power", INFO: "info", HEARTBEAT: "heartbeat", SAMPLES: "samples",
+              DRIVE: "drive"}
+
+# Sensor that saw a twitch, the one byte payload of a TWITCH frame. Old firmware
+# sends no payload, its twitches come from the accelerometer.
+SENSOR_ACCEL = 0
+SENSOR_IR = 1
+SENSOR_NAMES = {SENSOR_ACCEL: "accel", SENSOR_IR: "ir"}
+
+# seq and device_ms are None for events decoded from text lines
+Event = namedtuple("Event", ["kind", "seq", "device_ms", "payload"])
+
+# Events for the plain text lines printed by old firmware
+TEXT_EVENTS = {
+    b"1": Event("twitch", None, None, b""),
+    b"IR": Event("twitch", None, None, bytes([SENSOR_IR])),
+    b"ON": Event("power", None, None, b"\x01"),
+    b"OFF": Event("power", None, None, b"\x00"),
+}
+
+
+def twitch_sensor(event):
+    """Channel name of a twitch event"""
+    if not event.payload:
+        return "accel"
+    return SENSOR_NAMES.get(event.payload[0], f"sensor{event.payload[0]}")
+
+
+def make_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+CRC_TABLE = make_crc_table()
+
+
+def crc16(data, crc=0xFFFF):
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_frame(frame_type, seq, device_ms, payload=b""):
+    body = HEADER.pack(VERSION, frame_type, len(payload), seq & 0xFFFF, device_ms & 0xFFFFFFFF) + payload
+    return bytes([SYNC]) + body + CRC.pack(crc16(body))
+
+
+# Host -> device commands are plain text lines, parsed by handleCommand() in interface.ino
+def command_reset():
+    return b"RESET\n"
+
+
+def command_set_threshold(threshold, release):
+    return f"SET {threshold:.4f} {release:.4f}\n".encode()
+
+
+def command_raw_mode(enabled):
+    return b"RAW 1\n" if enabled else b"RAW 0\n"
+
+
+def command_status():
+    """Ask for a POWER event with the current measuring state"""
+    return b"STATUS\n"
+
+
+# Detects lost and repeated frames from the 16 bit sequence number
+#
+# A device that reboots on a port that stays open numbers its frames from 0 again,
+# which would read as repeats of everything seen before. Its boot banner restarts
+# the count; without it (the banner was lost) a frame behind the last one restarts
+# the count only when its seq and device clock are both inside the boot window.
+# Any other frame behind the last one by seq or device clock is a repeat.
+class SequenceTracker:
+    def __init__(self):
+        self.last_seq = None
+        self.last_ms = None
+        self.dropped = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def accept(self, seq, device_ms=None):
+        """Return False for a frame that was already seen"""
+        if self.last_seq is not None and self.restarted(seq, device_ms):
+            self.restart()
+        if self.last_seq is None:
+            self.last_seq = seq
+            self.last_ms = device_ms
+            return True
+        gap = (seq - self.last_seq) & 0xFFFF
+        if gap == 0 or gap >= 0x8000 or self.older(device_ms):
+            self.duplicates += 1
+            return False
+        self.dropped += gap - 1
+        self.last_seq = seq
+        self.last_ms = device_ms
+        return True
+
+    def older(self, device_ms):
+        """True for a device time before the last frame's, millis() only wraps after 49 days"""
+        if device_ms is None or self.last_ms is None:
+            return False
+        return 0 < (self.last_ms - device_ms) & 0xFFFFFFFF < 0x80000000
+
+    def restarted(self, seq, device_ms):
+        if device_ms is None or device_ms >= BOOT_WINDOW_MS or seq >= BOOT_WINDOW_SEQ:
+            return False
+        behind = (self.last_seq - seq) & 0xFFFF
+        return self.older(device_ms) or 0 < behind < 0x8000
+
+    def restart(self):
+        """The device started over, seen from a frame or its boot banner"""
+        if self.last_seq is not None:
+            self.restarts += 1
+        self.reset()
+
+    def reset(self):
+        self.last_seq = None
+        self.last_ms = None
+
+
+# Incremental decoder for a byte stream mixing binary frames and old-style text lines
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.sequence = SequenceTracker()
+        self.crc_errors = 0
+        self.frames = 0
+
+    def feed(self, data):
+        """Append received bytes and return every complete event decoded so far"""
+        self.buffer += data
+        events = []
+        view = memoryview(self.buffer)
+        pos = 0
+        end = len(self.buffer)
+        while pos < end:
+            if view[pos] == SYNC:
+                if end - pos < 1 + HEADER.size:
+                    break
+                version, frame_type, length, seq, device_ms = HEADER.unpack_from(view, pos + 1)
+                frame_end = pos + FRAME_OVERHEAD + length
+                if version != VERSION:
+                    pos += 1  # Not a frame start, resynchronise on the next byte
+                    continue
+                if frame_end > end:
+                    break
+                crc_start = frame_end - CRC.size
+                if crc16(view[pos + 1:crc_start]) != CRC.unpack_from(view, crc_start)[0]:
+                    self.crc_errors += 1
+                    pos = self.resync(pos, frame_end)
+                    continue
+                self.frames += 1
+                if self.sequence.accept(seq, device_ms):
+                    kind = KIND_NAMES.get(frame_type, "unknown")  # From newer firmware
+                    payload = bytes(view[crc_start - length:crc_start]) if length else b""
+                    events.append(Event(kind, seq, device_ms, payload))
+                pos = frame_end
+            else:
+                # Text fallback: a line runs to the newline, or is cut short by a frame start
+                newline = self.buffer.find(b"\n", pos)
+                sync = self.buffer.find(SYNC, pos, newline if newline != -1 else end)
+                if sync != -1:
+                    pos = sync
+                    continue
+                if newline == -1:
+                    if end - pos > MAX_TEXT_LINE:
+                        pos = end
+                    break
+                line = bytes(view[pos:newline]).strip()
+                if line == BOOT_BANNER:
+                    self.sequence.restart()  # The frames after it number from 0 again
+                if line:
+                    events.append(TEXT_EVENTS.get(line) or Event("info", None, None, line))
+                pos = newline + 1
+        view.release()
+        if pos:
+            del self.buffer[:pos]
+        return events
+
+    def resync(self, pos, frame_end):
+        """Where to go on after a corrupt frame at pos, emitting nothing from its bytes
+
+        Past its declared end, where the next frame or text line starts unless the
+        length byte was the one corrupted; a frame header before that may start the
+        next frame.
+        """
+        start = bytes([SYNC, VERSION])
+        sync = self.buffer.find(start, pos + 1, frame_end + 1)
+        return frame_end if sync == -1 else sync
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "dropped": self.sequence.dropped,
+            "duplicates": self.sequence.duplicates,
+            "restarts": self.sequence.restarts,
+            "crc_errors": self.crc_errors,
+        }
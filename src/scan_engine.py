@@ -0,0 +1,82 @@
+from layouts import HuffmanScanner
+
+
+# Scanning state machine without any widgets, driven by the GUI timer or by the simulator
+#
+# Grid layouts scan rows, then the keys of the picked row. With a Huffman tree the
+# highlight walks the groups of the current tree level instead; groups count as
+# row selections and keys as column selections, like in the scan timing.
+class ScanEngine:
+    def __init__(self, keyboard, tree=None, restart_at_top=False):
+        self.keyboard = keyboard
+        self.tree = HuffmanScanner(tree) if tree is not None else None
+        self.restart_at_top = restart_at_top  # Row scanning starts over from the top after a key
+        self.current_row = 0
+        self.current_col = 0
+        self.selecting_row = True
+        self.first_item = True  # Highlight is on the first item after a selection
+        self.steps = 0
+        self.sync_tree()
+
+    def sync_tree(self):
+        if self.tree is not None:
+            self.selecting_row = not self.tree.highlighted().is_leaf
+            self.current_col = self.tree.index
+
+    def advance(self):
+        """Move the highlight on by one item, called once per scan tick"""
+        if self.tree is not None:
+            self.tree.advance()
+        elif self.selecting_row:
+            self.current_row = (self.current_row + 1) % len(self.keyboard)
+        else:
+            self.current_col = (self.current_col + 1) % len(self.keyboard[self.current_row])
+        self.first_item = False
+        self.steps += 1
+        self.sync_tree()
+
+    def confirm(self):
+        """Select the highlighted item, returns the selected key or None for a row or group"""
+        key = None
+        if self.tree is not None:
+            key = self.tree.select()
+        elif self.selecting_row:
+            self.selecting_row = False
+            self.current_col = 0
+        else:
+            key = self.keyboard[self.current_row][self.current_col]
+            self.selecting_row = True
+            if self.restart_at_top:
+                self.current_row = 0
+        self.first_item = True
+        self.sync_tree()
+        return key
+
+    def back(self):
+        """Leave the current row or tree group without typing, like selecting Skip"""
+        if self.tree is not None:
+            self.tree.reset()
+        elif not self.selecting_row:
+            self.selecting_row = True
+            if self.restart_at_top:
+                self.current_row = 0
+        self.first_item = True
+        self.sync_tree()
+
+    def position(self):
+        """Everything advance() changes, for rewind()"""
+        return self.current_row, self.current_col, self.first_item, self.tree.index if self.tree is not None else None
+
+    def rewind(self, position):
+        """Put the highlight back on an earlier item of the same row or tree level"""
+        self.current_row, self.current_col, self.first_item, index = position
+        if self.tree is not None:
+            self.tree.index = index
+        self.sync_tree()
+
+    def highlighted_key(self):
+        """Key under the highlight, None while a row or group is highlighted"""
+        if self.tree is not None:
+            item = self.tree.highlighted()
+            return item.key if item.is_leaf else None
+        return None if self.selecting_row else self.keyboard[self.current_row][self.current_col]
@@ -0,0 +1,138 @@
+from collections import deque
+
+from PyQt5.QtCore import Qt, QTimer
+
+from latency import now_ns
+from telemetry import STATS
+
+TIMER_SLACK_MS = 1  # A wakeup this close to the deadline counts as on time
+MAX_CATCHUP_MS = 5  # Lateness a tick makes up for by starting the next item's dwell early
+SYNC_WINDOW_S = 30  # Device frames the clock offset is estimated from, short enough to follow crystal drift
+HIGHLIGHT_HISTORY = 4  # Items remembered for attributing late twitches
+
+
+# Scan ticks on monotonic deadlines
+#
+# A re-armed QTimer drifts: the next interval starts after the tick's own work, and
+# the default coarse timers may fire up to 5% early or late. Here a dwell counts from
+# a deadline on now_ns(), with a precise single-shot timer that is re-armed for the
+# rest when it wakes early. The next item's dwell counts from when the tick was due,
+# so wakeup delays and highlight work do not add up. Only up to MAX_CATCHUP_MS is
+# made up for: after a longer stall of the GUI thread the item that was kept on
+# screen counts as shown late, rather than the next one being cut short.
+class ScanScheduler:
+    def __init__(self, on_tick, parent=None):
+        self.on_tick = on_tick
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.fire)
+        self.deadline_ns = None
+        self.tick_deadline_ns = None  # When the running tick was due, while on_tick() runs
+        self.lateness_ms = 0.0  # Of the last tick
+        self.early_wakeups = 0
+
+    def start(self, dwell_ms, shown_ns=None):
+        """Tick dwell_ms after shown_ns, when the current item appeared (default now)"""
+        anchor = now_ns() if shown_ns is None else shown_ns
+        if self.tick_deadline_ns is not None:
+            anchor -= min(anchor - self.tick_deadline_ns, MAX_CATCHUP_MS * 1_000_000)
+        self.deadline_ns = anchor + int(dwell_ms * 1_000_000)
+        self.arm()
+
+    def arm(self):
+        remaining_ns = self.deadline_ns - now_ns()
+        self.timer.start(max(0, -(-remaining_ns // 1_000_000)))  # Rounded up to whole ms
+
+    def fire(self):
+        if self.deadline_ns is None:
+            return
+        late_ns = now_ns() - self.deadline_ns
+        if late_ns < -TIMER_SLACK_MS * 1_000_000:
+            self.early_wakeups += 1
+            self.arm()
+            return
+        self.tick_deadline_ns, self.deadline_ns = self.deadline_ns, None
+        self.lateness_ms = late_ns / 1e6
+        STATS.record("timer_lateness", max(0.0, self.lateness_ms))
+        try:
+            self.on_tick()
+        finally:
+            self.tick_deadline_ns = None
+
+    def stop(self):
+        self.deadline_ns = None
+        self.timer.stop()
+
+    def is_active(self):
+        return self.deadline_ns is not None
+
+
+# Maps the device's millisecond stamps onto now_ns()
+#
+# Every frame gives receive time - device time = clock offset + transfer delay. The
+# smallest value in the window is the one that waited least, so it is taken as the
+# offset (a sliding minimum, O(1) per frame). Times are clamped to the receive time.
+# A stamp older than the newest one means the device restarted with its clock at 0
+# (frames arrive in order), and the estimate starts over.
+class ClockSync:
+    def __init__(self, window_s=SYNC_WINDOW_S):
+        self.window_ns = int(window_s * 1e9)
+        self.samples = deque()  # (rx_ns, offset_ns), offsets increasing from the front
+        self.last_ms = None  # Newest device time, unwrapped
+        self.offset_ns = None
+
+    def reset(self):
+        self.samples.clear()
+        self.last_ms = None
+        self.offset_ns = None
+
+    def unwrap(self, device_ms):
+        """device_ms (a wrapping u32) as a count that keeps growing, near the newest one seen"""
+        if self.last_ms is None:
+            return device_ms
+        delta = (device_ms - self.last_ms) & 0xFFFFFFFF
+        return self.last_ms + (delta - (1 << 32) if delta >= 1 << 31 else delta)
+
+    def observe(self, device_ms, rx_ns):
+        unwrapped = self.unwrap(device_ms)
+        if self.last_ms is not None and unwrapped < self.last_ms:
+            self.reset()
+            unwrapped = device_ms
+        device_ms = self.last_ms = unwrapped
+        offset_ns = rx_ns - device_ms * 1_000_000
+        samples = self.samples
+        while samples and samples[-1][1] >= offset_ns:
+            samples.pop()
+        samples.append((rx_ns, offset_ns))
+        while samples[0][0] < rx_ns - self.window_ns:
+            samples.popleft()
+        self.offset_ns = samples[0][1]
+
+    def host_ns(self, device_ms, rx_ns):
+        """Host time of a device stamp received at rx_ns, rx_ns itself without a stamp or sync"""
+        if device_ms is None or self.offset_ns is None:
+            return rx_ns
+        return min(rx_ns, self.unwrap(device_ms) * 1_000_000 + self.offset_ns)
+
+
+# When each recent item lit up, so a twitch goes to the item the user saw when they
+# moved rather than the one highlighted once the event reaches the GUI thread
+class HighlightHistory:
+    def __init__(self, maxlen=HIGHLIGHT_HISTORY):
+        self.entries = deque(maxlen=maxlen)  # (shown_ns, ScanEngine.position())
+
+    def shown(self, shown_ns, position):
+        self.entries.append((shown_ns, position))
+
+    def clear(self):
+        """Forget earlier items, after a selection they are in another row or tree level"""
+        self.entries.clear()
+
+    def at(self, time_ns, current):
+        """(shown_ns, position) of the item on screen at time_ns, the oldest known one before
+        that, or current (what is on screen now) when nothing was recorded since clear()"""
+        for entry in reversed(self.entries):
+            if entry[0] <= time_ns:
+                return entry
+        return self.entries[0] if self.entries else current
@@ -0,0 +1,125 @@
+import os
+import time
+from collections import deque
+from statistics import NormalDist
+
+# Scan statistics, one CSV row per selection or correction
+SCAN_STATS_LOG = os.path.join(os.path.expanduser("~"), ".liberate", "scan-stats.csv")
+
+MIN_DWELL_MS = 300
+MAX_DWELL_MS = 3000
+TARGET_LATE_RATE = 0.01  # Share of twitches allowed to come after the highlight moved on
+LATE_FRACTION = 0.5  # A mis-selection sooner than this share of the median reaction was meant for the item before
+MIN_SAMPLES = 10  # Reactions per mode before the dwell is adapted
+HISTORY = 120  # Recent selections per mode used for the reaction fit
+MAX_STEP = 0.1  # Largest relative dwell change per selection
+
+MODES = ("row", "col", "first")  # "first" is the first item after a row/column switch
+
+
+# Learns the user's reaction times and tunes the row, column and first-item dwell
+#
+# A mode's dwell is the reaction time only TARGET_LATE_RATE of twitches exceed, from a
+# log-normal fit of its recent correct reactions (median and MAD, so stray twitches
+# barely move it). A mis-selection within LATE_FRACTION of the median reaction was a
+# late twitch for the item before, it counts as a reaction with the dwell added back.
+class AdaptiveScanTiming:
+    def __init__(self, dwell_ms=1000, log_path=SCAN_STATS_LOG, target_late=TARGET_LATE_RATE):
+        self.dwell_ms = {mode: float(dwell_ms) for mode in MODES}
+        self.dwell_ms["first"] = dwell_ms * 1.5  # Give the user time to reorient after a switch
+        self.history = {mode: deque(maxlen=HISTORY) for mode in MODES}  # [reaction_ms, error]
+        self.late_z = NormalDist().inv_cdf(1 - target_late)  # Dwell in standard deviations of log reaction
+        # (history entry, mode) of the last key selection, and of the row selection just before
+        # this one. A ⌫ for the next key, or Skip as the next selection, marks them as mis-selections
+        self.last_key = None
+        self.last_row = None
+        self.typed_chars = 0
+        self.started = None
+        self.log = None
+        if log_path is not None:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            new = not os.path.exists(log_path)
+            self.log = open(log_path, "a", buffering=1)
+            if new:
+                self.log.write("time,event,mode,key,reaction_ms,dwell_ms,chars_per_min\n")
+
+    @staticmethod
+    def mode(selecting_row, first_item):
+        if first_item:
+            return "first"
+        return "row" if selecting_row else "col"
+
+    def dwell(self, selecting_row, first_item=False):
+        """Milliseconds the highlight should stay on the next item"""
+        return int(self.dwell_ms[self.mode(selecting_row, first_item)])
+
+    def record_selection(self, selecting_row, first_item, reaction_ms, key=None, now=None):
+        """A twitch selected the highlighted item reaction_ms after it lit up"""
+        now = time.time() if now is None else now
+        if self.started is None:
+            self.started = now
+        mode = self.mode(selecting_row, first_item)
+        entry = [max(0.0, reaction_ms), False]
+        self.history[mode].append(entry)
+
+        last_row, self.last_row = self.last_row, None
+        if selecting_row:
+            self.last_row = (entry, mode)
+        elif key == "Skip":
+            if last_row is not None:
+                self.correction(last_row, now)  # Skipping straight out of a row: it was the wrong one
+        elif key == "⌫":
+            if self.last_key is not None:
+                self.correction(self.last_key, now)
+                self.typed_chars = max(0, self.typed_chars - 1)
+            self.last_key = None
+        elif key is not None:
+            self.last_key = (entry, mode)
+            if key not in ("Speak", "SOS"):
+                self.typed_chars += 1
+
+        self.write_log(now, "selection", mode, key, reaction_ms)
+        self.adapt(mode)
+
+    def correction(self, selection, now):
+        entry, mode = selection
+        entry[1] = True
+        self.write_log(now, "correction", mode, None, entry[0])
+        self.adapt(mode)
+
+    def error_rate(self, mode):
+        history = self.history[mode]
+        return sum(error for _, error in history) / len(history) if history else 0.0
+
+    def adapt(self, mode):
+        import numpy as np  # Loaded with the first adjustment instead of at startup
+        history = self.history[mode]
+        reactions = [reaction for reaction, error in history if not error]
+        if len(reactions) < MIN_SAMPLES:
+            return
+        current = self.dwell_ms[mode]
+        late_ms = np.median(reactions) * LATE_FRACTION
+        reactions += [reaction + current for reaction, error in history if error and reaction < late_ms]
+        logs = np.log(np.maximum(reactions, 1.0))
+        center = np.median(logs)
+        spread = 1.4826 * np.median(np.abs(logs - center))
+        target = np.exp(center + self.late_z * spread)
+        step = np.clip(target - current, -MAX_STEP * current, MAX_STEP * current)
+        self.dwell_ms[mode] = float(np.clip(current + step, MIN_DWELL_MS, MAX_DWELL_MS))
+
+    def chars_per_minute(self, now=None):
+        if self.started is None:
+            return 0.0
+        minutes = ((time.time() if now is None else now) - self.started) / 60
+        return self.typed_chars / minutes if minutes > 0 else 0.0
+
+    def write_log(self, now, event, mode, key, reaction_ms):
+        if self.log is None:
+            return
+        key = "" if key is None else {"␣": "space", "⌫": "backspace", "⏎": "enter", ",": "comma"}.get(key, key)
+        self.log.write(f"{now:.3f},{event},{mode},{key},{reaction_ms:.1f},"
+                       f"{self.dwell_ms[mode]:.1f},{self.chars_per_minute(now):.2f}\n")
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
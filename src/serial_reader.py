@@ -0,0 +1,81 @@
+import os
+import selectors
+
+# Seconds a blocking read may wait before re-checking the stop flag
+READ_TIMEOUT = 0.5
+
+
+# Line reader for the ESP32 serial stream
+class LineReader:
+    """Blocks until bytes arrive and splits them into lines in its own buffer"""
+
+    def __init__(self, port, timeout=READ_TIMEOUT):
+        self.port = port
+        self.buffer = bytearray()
+        self.port.timeout = timeout
+
+    def read_chunk(self):
+        """Wait for the next chunk of bytes, empty if the timeout passed first"""
+        # read() sleeps in the OS until at least one byte arrives or the timeout passes
+        return self.port.read(self.port.in_waiting or 1)
+
+    def read_lines(self):
+        """Wait for the next chunk of bytes and return every complete line in it"""
+        chunk = self.read_chunk()
+        if not chunk:
+            return []
+        self.buffer += chunk
+        return self.split_lines()
+
+    def split_lines(self):
+        lines = []
+        start = 0
+        end = self.buffer.find(b"\n", start)
+        while end != -1:
+            line = self.buffer[start:end].decode(errors="ignore").strip()
+            if line:
+                lines.append(line)
+            start = end + 1
+            end = self.buffer.find(b"\n", start)
+        if start:
+            del self.buffer[:start]
+        return lines
+
+    def cancel(self):
+        """Wake a read() that is blocked in another thread"""
+        cancel_read = getattr(self.port, "cancel_read", None)
+        if cancel_read is not None:
+            cancel_read()
+
+
+# Same framing for a raw file descriptor (pty or pipe) using fd-readiness wakeups
+class FdLineReader(LineReader):
+    def __init__(self, fd, timeout=READ_TIMEOUT):
+        self.fd = fd
+        self.buffer = bytearray()
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(fd, selectors.EVENT_READ)
+        # Self-pipe so cancel() can interrupt select() from another thread
+        self.wake_r, self.wake_w = os.pipe()
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+
+    def read_chunk(self):
+        chunk = b""
+        for key, _ in self.selector.select(self.timeout):
+            if key.fd == self.wake_r:
+                os.read(self.wake_r, 64)
+                continue
+            try:
+                chunk = os.read(self.fd, 4096)
+            except OSError:
+                chunk = b""
+        return chunk
+
+    def cancel(self):
+        os.write(self.wake_w, b"x")
+
+    def close(self):
+        self.selector.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
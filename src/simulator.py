@@ -0,0 +1,310 @@
+import math
+import random
+
+from layouts import SKIP, keys_for_text
+from morse import DEFAULT_UNIT_MS, GAP_UNITS, LETTER, MORSE_CODE, WORD, MorseDecoder
+from planner import ScanPlanner
+from prediction import PREDICTION_KEYS, Predictor
+from scan_engine import ScanEngine
+
+WORD_BREAKS = ('␣', '.', '⏎')
+
+
+# Simulated milliseconds, time only moves when the simulation moves it
+class VirtualClock:
+    def __init__(self):
+        self.ms = 0.0
+
+    def advance_to(self, ms):
+        self.ms = max(self.ms, ms)
+
+    def seconds(self):
+        return self.ms / 1000
+
+
+# Constant dwell with the same interface as AdaptiveScanTiming
+class FixedTiming:
+    def __init__(self, dwell_ms=1000, first_dwell_ms=None):
+        self.dwell_ms = dwell_ms
+        self.first_dwell_ms = dwell_ms if first_dwell_ms is None else first_dwell_ms
+
+    def dwell(self, selecting_row, first_item=False):
+        return self.first_dwell_ms if first_item else self.dwell_ms
+
+    def record_selection(self, selecting_row, first_item, reaction_ms, key=None, now=None):
+        pass
+
+
+# Synthetic user: log-normal reaction times, extra time to reorient after a
+# selection, twitches the sensor misses and spurious twitches at random times
+class SyntheticUser:
+    def __init__(self, reaction_ms=450, reaction_sigma=0.25, reorient_ms=150, miss_rate=0.02,
+                 false_twitches_per_min=0.5, seed=0):
+        self.reaction_ms = reaction_ms
+        self.reaction_sigma = reaction_sigma
+        self.reorient_ms = reorient_ms
+        self.miss_rate = miss_rate
+        self.false_twitches_per_min = false_twitches_per_min
+        self.rng = random.Random(seed)
+
+    def reaction(self, first_item):
+        reaction = self.rng.lognormvariate(math.log(self.reaction_ms), self.reaction_sigma)
+        return reaction + (self.reorient_ms if first_item else 0)
+
+    def missed(self):
+        return self.rng.random() < self.miss_rate
+
+    def next_false_twitch(self, now_ms):
+        if self.false_twitches_per_min <= 0:
+            return math.inf
+        return now_ms + self.rng.expovariate(self.false_twitches_per_min / 60000)
+
+
+# Types texts through a ScanEngine in virtual time and counts what it cost
+#
+# The user wants the row (or tree group) holding the next key, Skip out of a wrong
+# row and backspace after a wrong key. A twitch lands reaction time after the item
+# lit up, on whatever item is highlighted by then, so slow reactions are errors.
+class Simulator:
+    def __init__(self, keyboard, user, timing, tree=None, restart_at_top=False, index=None,
+                 max_ms_per_char=60000):
+        self.keyboard = keyboard
+        self.user = user
+        self.timing = timing
+        self.tree = tree
+        self.restart_at_top = restart_at_top
+        self.index = index  # PredictionIndex, used when the keyboard has prediction keys
+        self.max_ms_per_char = max_ms_per_char
+        self.clock = VirtualClock()
+        self.engine = ScanEngine(keyboard, tree, restart_at_top)
+        self.planner = ScanPlanner(keyboard, tree, restart_at_top)
+        self.available = set(self.planner.char_keys.values())
+        self.next_false_twitch = user.next_false_twitch(0)
+        self.totals = {"sentences": 0, "chars": 0, "time_ms": 0.0, "steps": 0, "twitches": 0, "errors": 0,
+                       "false_twitches": 0, "stray_actions": 0, "gave_up": 0}
+
+    # What the user is after
+    def next_key(self):
+        if self.correct < len(self.typed):
+            return '⌫'
+        if self.predictor is not None:
+            start = len(self.typed) - len(self.predictor.prefix)
+            end = start
+            while end < len(self.target) and self.target[end] not in WORD_BREAKS:
+                end += 1
+            word = "".join(self.target[start:end])
+            predictions = self.predictor.predictions()
+            if word in predictions and (end == len(self.target) or self.target[end] == '␣'):
+                return PREDICTION_KEYS[predictions.index(word)]
+        return self.target[self.correct]
+
+    def wants(self, key):
+        """Whether the highlighted item is the one to twitch on next, on the way to key"""
+        return self.planner.on_path(self.engine, key)
+
+    def apply(self, key):
+        if key is None or key == SKIP:
+            return
+        if key in PREDICTION_KEYS:
+            if self.predictor is None:
+                return
+            suffix = self.predictor.accept(PREDICTION_KEYS.index(key))
+            if suffix is not None:
+                for char in list(suffix) + ['␣']:
+                    self.append(char)
+        elif key in ('Speak', 'SOS'):
+            self.totals["stray_actions"] += 1
+        elif key == '⌫':
+            if self.typed:
+                self.typed.pop()
+                self.correct = min(self.correct, len(self.typed))
+            if self.predictor is not None:
+                self.predictor.type_key(key)
+        else:
+            self.append(key)
+            if self.predictor is not None:
+                self.predictor.type_key(key)
+
+    def append(self, key):
+        self.typed.append(key)
+        if self.correct == len(self.typed) - 1 and self.correct < len(self.target) and \
+                self.target[self.correct] == key:
+            self.correct += 1
+
+    def type_text(self, text):
+        self.target = [key for key in keys_for_text(text) if key in self.available]
+        self.typed = []
+        self.correct = 0
+        self.predictor = None
+        if self.index is not None and PREDICTION_KEYS[0] in self.planner.positions:
+            self.predictor = Predictor(self.index)
+        engine, user, timing, clock = self.engine, self.user, self.timing, self.clock
+        started, steps = clock.ms, engine.steps
+        deadline = started + self.max_ms_per_char * max(1, len(self.target))
+        pending = None  # Absolute time of a twitch the user has already started
+
+        while self.typed != self.target:
+            if clock.ms > deadline:
+                self.totals["gave_up"] += 1
+                break
+            shown = clock.ms
+            dwell = timing.dwell(engine.selecting_row, engine.first_item)
+            wanted = self.next_key()
+            if pending is None and self.wants(wanted) and not user.missed():
+                pending = shown + user.reaction(engine.first_item)
+            twitch = pending if pending is not None else math.inf
+            spurious = self.next_false_twitch < min(twitch, shown + dwell)
+            if spurious:
+                twitch = self.next_false_twitch
+                self.next_false_twitch = user.next_false_twitch(twitch)
+                self.totals["false_twitches"] += 1
+            if twitch >= shown + dwell:
+                clock.advance_to(shown + dwell)
+                engine.advance()
+                continue
+
+            if not spurious:
+                pending = None
+            selecting_row, first_item = engine.selecting_row, engine.first_item
+            highlighted = engine.highlighted_key()
+            if not self.wants(wanted):
+                self.totals["errors"] += 1
+            clock.advance_to(twitch)
+            self.apply(engine.confirm())
+            timing.record_selection(selecting_row, first_item, twitch - shown, highlighted, now=clock.seconds())
+            self.totals["twitches"] += 1
+
+        self.totals["sentences"] += 1
+        self.totals["chars"] += len(self.target)
+        self.totals["time_ms"] += clock.ms - started
+        self.totals["steps"] += engine.steps - steps
+
+    def run(self, texts):
+        for text in texts:
+            self.type_text(text)
+        return self.report()
+
+    def report(self):
+        totals = dict(self.totals)
+        chars = max(1, totals["chars"])
+        totals.update({
+            "ms_per_char": totals["time_ms"] / chars,
+            "chars_per_min": 60000 * totals["chars"] / totals["time_ms"] if totals["time_ms"] else 0.0,
+            "steps_per_char": totals["steps"] / chars,
+            "twitches_per_char": totals["twitches"] / chars,
+            "error_rate": totals["errors"] / totals["twitches"] if totals["twitches"] else 0.0,
+        })
+        return totals
+
+
+# Synthetic Morse user: keys in a rhythm of unit_ms with log-normal jitter on every
+# gap, optionally drifting slower (or faster) with each key
+class MorseUser(SyntheticUser):
+    def __init__(self, unit_ms=250, rhythm_sigma=0.15, drift=0.0, miss_rate=0.02, false_twitches_per_min=0.5,
+                 seed=0):
+        super().__init__(miss_rate=miss_rate, false_twitches_per_min=false_twitches_per_min, seed=seed)
+        self.unit_ms = unit_ms
+        self.rhythm_sigma = rhythm_sigma
+        self.drift = drift
+
+    def gap(self, units):
+        return units * self.unit_ms * self.rng.lognormvariate(0, self.rhythm_sigma)
+
+    def keyed(self):
+        self.unit_ms *= 1 + self.drift
+
+
+# Types texts through a MorseDecoder in virtual time, with the same report as Simulator
+#
+# The user watches the decoded text and keys ⌫ after every wrong key.
+class MorseSimulator:
+    def __init__(self, user, unit_ms=DEFAULT_UNIT_MS, max_ms_per_char=60000):
+        self.user = user
+        self.max_ms_per_char = max_ms_per_char
+        self.clock = VirtualClock()
+        self.decoder = MorseDecoder(self.apply, unit_ms)
+        self.next_false_twitch = user.next_false_twitch(0)
+        self.totals = {"sentences": 0, "chars": 0, "time_ms": 0.0, "steps": 0, "twitches": 0, "errors": 0,
+                       "keys": 0, "false_twitches": 0, "stray_actions": 0, "gave_up": 0}
+
+    def apply(self, key):
+        self.totals["keys"] += 1
+        if key != self.wanted:
+            self.totals["errors"] += 1
+        if key in ('Speak', 'SOS'):
+            self.totals["stray_actions"] += 1
+        elif key == '⌫':
+            if self.typed:
+                self.typed.pop()
+                self.correct = min(self.correct, len(self.typed))
+        else:
+            self.typed.append(key)
+            if self.correct == len(self.typed) - 1 and self.correct < len(self.target) and \
+                    self.target[self.correct] == key:
+                self.correct += 1
+
+    def wait(self, ms):
+        """Stay still for ms, spurious twitches still reach the decoder"""
+        until = self.clock.ms + ms
+        while self.next_false_twitch < until:
+            self.clock.advance_to(self.next_false_twitch)
+            self.decoder.twitch(self.clock.ms)
+            self.totals["false_twitches"] += 1
+            self.next_false_twitch = self.user.next_false_twitch(self.clock.ms)
+        self.clock.advance_to(until)
+        self.decoder.poll(self.clock.ms)
+
+    def twitch(self):
+        self.totals["twitches"] += 1
+        if not self.user.missed():
+            self.decoder.twitch(self.clock.ms)
+
+    def key(self, key):
+        user = self.user
+        for position, element in enumerate(MORSE_CODE[key]):
+            if position:
+                self.wait(user.gap(3))
+            self.twitch()
+            if element == '-':
+                self.wait(user.gap(1))
+                self.twitch()
+        self.wait(user.gap(7))
+        user.keyed()
+
+    def type_text(self, text):
+        self.target = [key for key in keys_for_text(text) if key in MORSE_CODE or key == '␣']
+        self.typed = []
+        self.correct = 0
+        started = self.clock.ms
+        deadline = started + self.max_ms_per_char * max(1, len(self.target))
+        while self.typed != self.target:
+            if self.clock.ms > deadline:
+                self.totals["gave_up"] += 1
+                break
+            self.wanted = '⌫' if self.correct < len(self.typed) else self.target[self.correct]
+            if self.wanted == '␣':
+                self.wait(self.user.gap(GAP_UNITS[WORD] - GAP_UNITS[LETTER]))
+            else:
+                self.key(self.wanted)
+        self.decoder.reset()  # Sentences are separate, drop anything half keyed
+        self.totals["sentences"] += 1
+        self.totals["chars"] += len(self.target)
+        self.totals["time_ms"] += self.clock.ms - started
+
+    def run(self, texts):
+        for text in texts:
+            self.type_text(text)
+        return self.report()
+
+    def report(self):
+        totals = dict(self.totals)
+        chars = max(1, totals["chars"])
+        totals.update({
+            "ms_per_char": totals["time_ms"] / chars,
+            "chars_per_min": 60000 * totals["chars"] / totals["time_ms"] if totals["time_ms"] else 0.0,
+            "steps_per_char": 0.0,
+            "twitches_per_char": totals["twitches"] / chars,
+            "error_rate": totals["errors"] / totals["keys"] if totals["keys"] else 0.0,
+            "unit_ms": self.decoder.unit_ms,
+        })
+        return totals
@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import queue
+import shutil
+import smtplib
+import struct
+import subprocess
+import sys
+import threading
+import urllib.request
+import wave
+import zlib
+from email.message import EmailMessage
+
+from latency import now_ns
+
+SOS_DIR = os.path.join(os.path.expanduser("~"), ".liberate", "sos")
+FIRST_ALERT_BUDGET_MS = 250  # Trigger to the first channel going out, checked by benchmarks/sos_dispatch.py
+RETRIES = 3
+RETRY_BACKOFF_S = 0.5  # Doubled after every failed attempt
+ALARM_REPEAT_S = 5.0  # The alarm sounds again this often until the alert is acknowledged
+ALARM_MAX_S = 300.0  # ... for at most this long
+
+
+def write_alarm(path, seconds=1.5, rate=22050):
+    """Two-tone siren as a 16-bit mono WAV"""
+    frames = bytearray()
+    for index in range(int(seconds * rate)):
+        t = index / rate
+        frequency = 880 if int(t * 4) % 2 == 0 else 660
+        frames += struct.pack("<h", int(20000 * math.sin(2 * math.pi * frequency * t)))
+    with wave.open(path + ".tmp", "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+    os.replace(path + ".tmp", path)
+
+
+def audio_player():
+    """Command that plays a WAV file, None when there is none"""
+    for player in ("paplay", "aplay", "afplay"):
+        path = shutil.which(player)
+        if path is not None:
+            return [path]
+    return None
+
+
+# Channels: send() delivers one alert or raises, blocking for at most timeout
+# seconds. It calls alert.mark(name) the moment the alert is out (a sound starts,
+# a server accepted it). prepare() does the slow work ahead of any emergency.
+# Everything runs on the channel's own dispatcher thread.
+class SoundChannel:
+    def __init__(self, name, timeout=10.0, player=None, repeat_s=None):
+        self.name = name
+        self.timeout = timeout
+        self.player = player  # Command list, found at prepare() by default
+        self.repeat_s = repeat_s
+        self.path = None
+
+    def prepare(self):
+        if self.player is None:
+            self.player = audio_player()
+
+    def send(self, alert):
+        if self.path is None or not os.path.exists(self.path):
+            raise OSError(f"{self.name}: nothing to play yet")
+        if sys.platform == "win32" and self.player is None:
+            import winsound
+            alert.mark(self.name)
+            winsound.PlaySound(self.path, winsound.SND_FILENAME)
+            return
+        if self.player is None:
+            raise OSError("no audio player found")
+        process = subprocess.Popen(self.player + [self.path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        alert.mark(self.name)
+        try:
+            code = process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            raise
+        if code != 0:
+            raise OSError(f"{self.player[0]} exited with {code}")
+
+
+# Local siren, repeated until someone acknowledges
+class AlarmChannel(SoundChannel):
+    def __init__(self, directory=SOS_DIR, **kwargs):
+        kwargs.setdefault("repeat_s", ALARM_REPEAT_S)
+        super().__init__("alarm", **kwargs)
+        self.path = os.path.join(directory, "alarm.wav")
+
+    def prepare(self):
+        super().prepare()
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_alarm(self.path)
+
+
+# The alert message spoken from a file rendered at startup, so it plays at once and
+# never waits behind (or is cut off like) the user's own speech
+class SpokenChannel(SoundChannel):
+    def __init__(self, message, directory=SOS_DIR, **kwargs):
+        super().__init__("spoken", **kwargs)
+        self.message = message
+        self.path = os.path.join(directory, f"spoken-{zlib.crc32(message.encode()):08x}.wav")
+
+    def prepare(self):
+        super().prepare()
+        if os.path.exists(self.path):
+            return  # Rendered by an earlier run
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # In a child process, the speech worker owns this process's pyttsx3 engine
+        script = ("import sys, pyttsx3; engine = pyttsx3.init(); "
+                  "engine.save_to_file(sys.argv[1], sys.argv[2]); engine.runAndWait()")
+        try:
+            subprocess.run([sys.executable, "-c", script, self.message, self.path + ".tmp"],
+                           timeout=60, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            os.replace(self.path + ".tmp", self.path)
+        except (OSError, subprocess.SubprocessError) as error:
+            print(f"[WARN] Spoken SOS unavailable: {error}")
+
+
+# JSON POST to a caregiver's phone bridge or home automation, any 2xx is a delivery
+class WebhookChannel:
+    def __init__(self, url, timeout=5.0):
+        self.name = "webhook"
+        self.url = url
+        self.timeout = timeout
+        self.repeat_s = None
+
+    def prepare(self):
+        pass
+
+    def send(self, alert):
+        body = json.dumps({"event": "sos", "message": alert.message, "id": alert.id}).encode()
+        request = urllib.request.Request(self.url, body, {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass  # urlopen raises for anything but 2xx
+        alert.mark(self.name)
+
+
+class EmailChannel:
+    def __init__(self, host, port, sender, recipients, timeout=10.0):
+        self.name = "email"
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.timeout = timeout
+        self.repeat_s = None
+
+    def prepare(self):
+        pass
+
+    def send(self, alert):
+        message = EmailMessage()
+        message["Subject"] = "SOS from Liberate"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(alert.message)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+        alert.mark(self.name)
+
+
+# One emergency, from the trigger until someone acknowledges it
+class Alert:
+    def __init__(self, alert_id, message):
+        self.id = alert_id
+        self.message = message
+        self.triggered_ns = now_ns()
+        self.first_ns = {}  # channel name -> when it first went out
+        self.delivered = set()
+        self.failures = {}  # channel name -> failed attempts
+        self.pending = 0  # Channels still queued or delivering it
+        self.acknowledged = threading.Event()
+
+    def mark(self, name):
+        self.first_ns.setdefault(name, now_ns())
+
+    def first_alert_ms(self):
+        """Trigger to the first channel going out, None before that"""
+        if not self.first_ns:
+            return None
+        return (min(self.first_ns.values()) - self.triggered_ns) / 1e6
+
+
+# Fires every channel at once, each from its own thread
+#
+# The threads are started (and the channels prepared) ahead of time, so a trigger
+# only queues the alert: it never blocks the caller and the first channel goes out
+# within a player or socket start. Failed channels retry with a backoff, repeating
+# channels (the alarm) go on until acknowledge(). A trigger once every channel is done
+# with an unacknowledged alert (gave up, or the alarm ran out) starts a new one.
+# on_update(name, state, detail) is called from the channel threads with "sent",
+# "failed" or "gave up".
+class SosDispatcher:
+    def __init__(self, channels, on_update=None, retries=RETRIES, backoff_s=RETRY_BACKOFF_S):
+        self.channels = channels
+        self.on_update = on_update
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.alert = None  # The current or last alert
+        self.alerts = 0
+        self.lock = threading.Lock()  # Guards Alert.pending
+        self.queues = [queue.Queue() for _ in channels]
+        self.threads = [threading.Thread(target=self.run, args=(channel, channel_queue), daemon=True)
+                        for channel, channel_queue in zip(channels, self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def update(self, name, state, detail=""):
+        if self.on_update is not None:
+            self.on_update(name, state, detail)
+
+    def trigger(self, message):
+        """Start alerting, a trigger while a channel still delivers the current alert returns it"""
+        with self.lock:
+            if self.active() and self.alert.pending:
+                return self.alert
+            self.alerts += 1
+            self.alert = Alert(self.alerts, message)
+            self.alert.pending = len(self.queues)
+        for channel_queue in self.queues:
+            channel_queue.put_nowait(self.alert)
+        return self.alert
+
+    def acknowledge(self):
+        if self.alert is not None:
+            self.alert.acknowledged.set()
+
+    def active(self):
+        return self.alert is not None and not self.alert.acknowledged.is_set()
+
+    def run(self, channel, channel_queue):
+        try:
+            channel.prepare()
+        except Exception as error:
+            print(f"[WARN] SOS channel {channel.name} could not prepare: {error}")
+        while True:
+            alert = channel_queue.get()
+            if alert is None:
+                break
+            try:
+                self.deliver(channel, alert)
+            finally:
+                with self.lock:
+                    alert.pending -= 1
+
+    def deliver(self, channel, alert):
+        attempt, wait_s = 0, self.backoff_s
+        started_ns = now_ns()
+        while not alert.acknowledged.is_set():
+            try:
+                channel.send(alert)
+            except Exception as error:
+                attempt += 1
+                alert.failures[channel.name] = attempt
+                if attempt > self.retries:
+                    self.update(channel.name, "gave up", str(error))
+                    return
+                self.update(channel.name, "failed", str(error))
+                alert.acknowledged.wait(wait_s)
+                wait_s *= 2
+                continue
+            if channel.name not in alert.delivered:
+                alert.delivered.add(channel.name)
+                self.update(channel.name, "sent")
+            if channel.repeat_s is None or now_ns() - started_ns > ALARM_MAX_S * 1e9:
+                return
+            attempt, wait_s = 0, self.backoff_s
+            alert.acknowledged.wait(channel.repeat_s)
+
+    def close(self):
+        self.acknowledge()
+        for channel_queue in self.queues:
+            channel_queue.put_nowait(None)
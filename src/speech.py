@@ -0,0 +1,85 @@
+import queue
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from telemetry import STATS
+
+# Utterances waiting behind the one being spoken; the oldest is dropped when full
+MAX_QUEUED_UTTERANCES = 4
+
+
+# Text-to-speech worker thread, keeps runAndWait() off the GUI thread
+class SpeechWorker(QThread):
+    speech_started = pyqtSignal(str)
+    speech_finished = pyqtSignal(str, bool)  # text, False if it was interrupted
+    ready = pyqtSignal(bool)  # The engine is up, False if it could not be started
+
+    def __init__(self, max_queued=MAX_QUEUED_UTTERANCES):
+        super().__init__()
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.engine = None
+        self.speaking = False
+        self.interrupted = False
+
+    def say(self, text):
+        """Queue text to be spoken, dropping the oldest utterance if the queue is full"""
+        while True:
+            try:
+                self.queue.put_nowait(text)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def interrupt(self):
+        """Barge-in: cut off the current utterance, keep the queue"""
+        if self.speaking:
+            self.interrupted = True
+
+    def cancel(self):
+        """Drop everything queued and cut off the current utterance"""
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.interrupt()
+
+    def run(self):
+        # The engine belongs to this thread, it is never touched from the GUI thread.
+        # pyttsx3 is imported here too, it takes a while and the window should not wait
+        try:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            self.engine.connect('started-word', self.on_word)
+        except Exception as error:
+            print(f"[WARN] Text to speech unavailable: {error}")
+            self.engine = None
+        self.ready.emit(self.engine is not None)
+        while True:
+            text = self.queue.get()
+            if text is None:
+                break
+            if self.engine is None:
+                continue
+            self.interrupted = False
+            self.speaking = True
+            self.speech_started.emit(text)
+            started = time.perf_counter_ns()
+            self.engine.say(text)
+            self.engine.runAndWait()
+            STATS.record("speech_utterance", (time.perf_counter_ns() - started) / 1e6)
+            self.speaking = False
+            self.speech_finished.emit(text, not self.interrupted)
+
+    def on_word(self, name, location, length):
+        # Interrupts are checked at word boundaries from inside the engine loop
+        if self.interrupted:
+            self.engine.stop()
+
+    def stop(self):
+        self.cancel()
+        self.say(None)
+        self.wait()
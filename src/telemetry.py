@@ -0,0 +1,133 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from latency import LatencyHistogram
+
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of the sampling profiler
+
+
+# Process-wide counters, gauges and timing histograms
+#
+# Everything is off until enabled: a timed() method then costs one flag check,
+# so the instrumentation can stay in the scan loop. Workers record from their own
+# threads, the GIL keeps the individual updates whole.
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def record(self, name, ms):
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(ms)
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+
+    def report(self):
+        """Plain text table of everything recorded so far"""
+        lines = [f"{'timing':<24} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            lines.append(f"{name:<24} {histogram.total:>7} {histogram.percentile(50):>6.2f}ms "
+                         f"{histogram.percentile(95):>6.2f}ms {histogram.percentile(99):>6.2f}ms "
+                         f"{histogram.max_ms:>6.2f}ms")
+        if self.counters:
+            lines.append("")
+            lines += [f"{name:<24} {count:>7}" for name, count in sorted(self.counters.items())]
+        if self.gauges:
+            lines.append("")
+            lines += [f"{name:<24} {value:>7}" for name, value in sorted(self.gauges.items())]
+        return "\n".join(lines)
+
+
+STATS = Stats()
+
+
+def timed(name):
+    """Decorator recording the duration of every call under name while STATS is enabled"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STATS.record(name, (time.perf_counter_ns() - started) / 1e6)
+        return wrapper
+    return decorate
+
+
+# cProfile of the calling thread (the GUI thread), written as a pstats file
+class CallProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self, path):
+        self.profile.disable()
+        self.profile.dump_stats(path)
+
+
+# Samples the stacks of every thread from a background thread and writes them in
+# collapsed form ("thread;outer;inner count" per line) for flamegraph tools.
+# Sees the serial, speech and injection threads too, at a few % CPU.
+class SamplingProfiler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self, path):
+        self.stopped.set()
+        self.thread.join()
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+PROFILERS = {"cprofile": CallProfiler, "sampling": SamplingProfiler}
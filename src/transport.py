@@ -0,0 +1,331 @@
+import os
+import selectors
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from protocol import BOOT_BANNER, FrameDecoder, command_status
+from serial_reader import READ_TIMEOUT, FdLineReader, LineReader
+
+BAUD_RATE = 115200
+CONNECT_TIMEOUT = 3.0
+MIN_BACKOFF = 0.25  # Seconds between connection attempts, doubled up to MAX_BACKOFF
+MAX_BACKOFF = 5.0
+PROBE_TIMEOUT = 2.5  # A discovered port has this long to show it is the device, an ESP32 reset on open included
+
+# USB serial bridges found on ESP32 boards: CP210x, CH340/CH9102, FTDI and the S2/S3 native USB
+ESP32_USB_IDS = {(0x10C4, 0xEA60), (0x1A86, 0x7523), (0x1A86, 0x55D4), (0x0403, 0x6001), (0x303A, None)}
+
+
+# Transports: one device connection each, with the LineReader interface
+#
+# read_chunk() blocks for at most READ_TIMEOUT and returns b"" when nothing came,
+# cancel() wakes it from another thread. A lost connection raises OSError from
+# read_chunk() or write(), which ReconnectingTransport turns into a reconnect.
+# For an event loop watching many devices (hub.py), fileno() is what to select on
+# and read_nowait() reads what is there once it is readable.
+# Backend libraries are imported on first use, on the reading thread.
+class SerialTransport(LineReader):
+    def __init__(self, port, baud_rate=BAUD_RATE):
+        try:
+            import serial
+        except ImportError:
+            raise OSError("pyserial is not installed")
+        super().__init__(serial.Serial(port, baud_rate), READ_TIMEOUT)
+
+    def fileno(self):
+        return self.port.fileno()  # POSIX only, pyserial has no descriptor on Windows
+
+    def read_nowait(self):
+        return self.port.read(self.port.in_waiting)
+
+    def write(self, data):
+        self.port.write(data)
+
+    def close(self):
+        self.port.close()
+
+
+# Socket device: TCP (an ESP32 on WiFi, or a local test server) or Bluetooth RFCOMM
+class SocketTransport:
+    def __init__(self, sock, timeout=READ_TIMEOUT):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.wake_r, self.wake_w = socket.socketpair()  # cancel() wakes select() through this
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+
+    @classmethod
+    def tcp(cls, host, port):
+        return cls(socket.create_connection((host, port), timeout=CONNECT_TIMEOUT))
+
+    @classmethod
+    def rfcomm(cls, address, channel=1):
+        if not hasattr(socket, "BTPROTO_RFCOMM"):
+            raise OSError("Bluetooth sockets are not supported by this Python build")
+        sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect((address, channel))
+        except OSError:
+            sock.close()
+            raise
+        return cls(sock)
+
+    def read_chunk(self):
+        chunk = b""
+        for key, _ in self.selector.select(self.timeout):
+            if key.fileobj is self.wake_r:
+                self.wake_r.recv(64)
+                continue
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionResetError("device closed the connection")
+        return chunk
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read_nowait(self):
+        try:
+            chunk = self.sock.recv(4096)
+        except BlockingIOError:
+            return b""
+        if not chunk:
+            raise ConnectionResetError("device closed the connection")
+        return chunk
+
+    def write(self, data):
+        self.sock.sendall(data)  # Commands are a few bytes, they always fit the send buffer
+
+    def cancel(self):
+        self.wake_w.send(b"x")
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+        self.wake_r.close()
+        self.wake_w.close()
+
+
+# Pty slave by path, e.g. the one printed by esp32_sim.py
+class PtyTransport(FdLineReader):
+    def __init__(self, path):
+        import termios, tty  # POSIX only
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(fd, termios.TCSANOW)  # The default TCSAFLUSH would throw away queued events
+        super().__init__(fd)
+
+    def read_chunk(self):
+        for key, _ in self.selector.select(self.timeout):
+            if key.fd == self.wake_r:
+                os.read(self.wake_r, 64)
+                continue
+            chunk = os.read(self.fd, 4096)  # EIO once the master side is closed
+            if not chunk:
+                raise ConnectionResetError("pty closed")
+            return chunk
+        return b""
+
+    def fileno(self):
+        return self.fd
+
+    def read_nowait(self):
+        chunk = os.read(self.fd, 4096)
+        if not chunk:
+            raise ConnectionResetError("pty closed")
+        return chunk
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+    def close(self):
+        super().close()
+        os.close(self.fd)
+
+
+# In-process pty pair driven by an Esp32Simulator, for trying the GUI without hardware
+class LoopbackTransport(PtyTransport):
+    def __init__(self):
+        from esp32_sim import Esp32Simulator
+        self.device = Esp32Simulator(binary=True)
+        self.device.heartbeats()  # As a measuring device does, so Drive Mode can be tried too
+        super().__init__(self.device.port_name)
+
+    def close(self):
+        super().close()
+        self.device.close()
+
+
+def open_transport(url, baud_rate=BAUD_RATE):
+    """Open a device URL: serial:///dev/ttyUSB0 (or a bare port name like COM3),
+    tcp://host:port, rfcomm://AA:BB:CC:DD:EE:FF/channel, pty:///dev/pts/N or loopback://"""
+    if "://" not in url:
+        return SerialTransport(url, baud_rate)
+    scheme, rest = url.split("://", 1)
+    if scheme == "serial":
+        return SerialTransport(rest, baud_rate)
+    if scheme == "pty":
+        return PtyTransport(rest)
+    if scheme == "loopback":
+        return LoopbackTransport()
+    if scheme == "tcp":
+        parsed = urlparse(url)
+        return SocketTransport.tcp(parsed.hostname, parsed.port)
+    if scheme == "rfcomm":
+        address, _, channel = rest.partition("/")
+        return SocketTransport.rfcomm(address, int(channel or 1))
+    raise ValueError(f"Unknown device URL: {url}")
+
+
+def from_device(event):
+    """True for an event only our firmware sends: a frame with a good CRC, a known text line or the banner"""
+    return event.seq is not None or event.kind != "info" or event.payload == BOOT_BANNER
+
+
+def discover():
+    """Device URLs worth trying, ESP32 USB bridges first then any other USB serial port"""
+    try:
+        from serial.tools import list_ports
+    except ImportError:
+        return []
+    esp32, other = [], []
+    for port in list_ports.comports():
+        if port.vid is None:
+            continue  # Built-in UARTs never have the device on them
+        if (port.vid, port.pid) in ESP32_USB_IDS or (port.vid, None) in ESP32_USB_IDS:
+            esp32.append(f"serial://{port.device}")
+        else:
+            other.append(f"serial://{port.device}")
+    return esp32 + other
+
+
+# The device link used by SerialThread: finds the device, reconnects after it is lost
+#
+# Never raises and never blocks for longer than a read timeout, one backoff wait or,
+# with "auto", PROBE_TIMEOUT per port, so the GUI starts at once and attaches
+# whenever the device turns up. A discovered port is only taken once something on
+# it speaks our protocol: other USB serial gadgets are closed and skipped.
+# on_status(state, url) is called on the reading thread with "connected", "lost"
+# or "waiting".
+class ReconnectingTransport:
+    def __init__(self, url="auto", baud_rate=BAUD_RATE, on_status=None):
+        self.url = url
+        self.baud_rate = baud_rate
+        self.on_status = on_status
+        self.transport = None
+        self.probing = None  # A discovered port being probed, cancel() wakes it too
+        self.lock = threading.Lock()  # cancel() against the reader swapping or closing the transport
+        self.received = b""  # What the probe read, handed out by the next read_chunk()
+        self.connected_url = None
+        self.backoff = MIN_BACKOFF
+        self.cancelled = threading.Event()
+        self.waiting = False
+        self.connects = 0
+
+    def status(self, state, url):
+        if self.on_status is not None:
+            self.on_status(state, url)
+
+    def connect(self):
+        candidates = discover() if self.url == "auto" else [self.url]
+        for url in candidates:
+            try:
+                transport = open_transport(url, self.baud_rate)
+            except OSError:
+                continue
+            if self.url == "auto" and not self.probe(transport):
+                try:
+                    transport.close()
+                except OSError:
+                    pass
+                continue
+            with self.lock:
+                self.transport = transport
+            self.connected_url = url
+            self.backoff = MIN_BACKOFF
+            self.waiting = False
+            self.connects += 1
+            self.status("connected", url)
+            return True
+        if not self.waiting:
+            self.waiting = True
+            self.status("waiting", self.url)
+        self.cancelled.wait(self.backoff)
+        self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+        return False
+
+    def probe(self, transport):
+        """True once the port shows it is the device, within PROBE_TIMEOUT"""
+        with self.lock:
+            if self.cancelled.is_set():
+                return False
+            self.probing = transport
+        decoder = FrameDecoder()
+        received = bytearray()
+        deadline = time.monotonic() + PROBE_TIMEOUT
+        try:
+            transport.write(command_status())  # Answered with a POWER frame, measuring or not
+            while not self.cancelled.is_set() and time.monotonic() < deadline:
+                chunk = transport.read_chunk()
+                received += chunk
+                if any(from_device(event) for event in decoder.feed(chunk)):
+                    self.received = bytes(received)
+                    return True
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.probing = None
+        return False
+
+    def drop(self, report=True):
+        with self.lock:
+            transport, self.transport = self.transport, None
+        if transport is None:
+            return
+        try:
+            transport.close()
+        except OSError:
+            pass
+        if report:
+            self.status("lost", self.connected_url)
+
+    def read_chunk(self):
+        if self.transport is None and (self.cancelled.is_set() or not self.connect()):
+            return b""
+        if self.received:
+            received, self.received = self.received, b""
+            return received
+        try:
+            return self.transport.read_chunk()
+        except OSError:
+            self.drop()
+            return b""
+
+    def write(self, data):
+        """Send to the device, False when there is no connection to send on"""
+        transport = self.transport
+        if transport is None:
+            return False
+        try:
+            transport.write(data)
+        except OSError:
+            return False  # The reading thread notices the loss and reconnects
+        return True
+
+    def cancel(self):
+        """Stop for good: wake the reader and stop reconnecting"""
+        self.cancelled.set()
+        with self.lock:
+            for transport in (self.transport, self.probing):
+                if transport is not None:
+                    transport.cancel()
+
+    def close(self):
+        self.cancelled.set()
+        self.drop(report=False)